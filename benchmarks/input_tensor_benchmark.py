@@ -0,0 +1,72 @@
+"""Compare model input tensor write strategies.
+
+Old path: copy the template image, expand it to a batch array,
+optionally convert and normalize it, then call Interpreter.set_tensor().
+New path: write pixels straight into the interpreter input buffer
+with normalization done in place.
+
+Usage: python benchmarks/input_tensor_benchmark.py [--runs N]
+"""
+import argparse
+import os
+import sys
+import timeit
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from PIL import Image
+from tflite_runtime.interpreter import Interpreter
+
+from src.pipeline.pose_base import write_image_to_tensor
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model", type=str,
+                    default='ai_models/tflite-model-maker-falldetect-model.tflite',
+                    help='Path to a TFLite model with an image input tensor')
+parser.add_argument("--image", type=str, default='Images/fall_img_1.png',
+                    help='Path to a sample image')
+parser.add_argument("--runs", type=int, default=1000,
+                    help='Number of timed runs per strategy')
+p = parser.parse_args()
+
+interpreter = Interpreter(model_path=p.model)
+interpreter.allocate_tensors()
+input_details = interpreter.get_input_details()[0]
+_, height, width, _ = input_details['shape']
+image = Image.open(p.image).convert('RGB').resize((int(width), int(height)))
+
+
+def old_uint8():
+    template_input = np.expand_dims(image.copy(), axis=0)
+    interpreter.set_tensor(input_details['index'], template_input)
+
+
+def new_uint8():
+    input_tensor = interpreter.tensor(input_details['index'])
+    write_image_to_tensor(tensor=input_tensor()[0], image=image)
+
+
+# floating point models normalize pixels; use an array of the same shape
+# as a float32 input tensor buffer
+float_tensor = np.zeros((1, int(height), int(width), 3), np.float32)
+
+
+def old_float32():
+    template_input = np.expand_dims(image.copy(), axis=0)
+    template_input = (np.float32(template_input) - 127.5) / 127.5
+    float_tensor[...] = template_input
+
+
+def new_float32():
+    write_image_to_tensor(tensor=float_tensor[0], image=image,
+                          mean=127.5, std=127.5)
+
+
+print(f"Input tensor: {width}x{height}, {p.runs} runs")
+for name, old, new in (('uint8', old_uint8, new_uint8),
+                       ('float32', old_float32, new_float32)):
+    old_time = timeit.timeit(old, number=p.runs) / p.runs
+    new_time = timeit.timeit(new, number=p.runs) / p.runs
+    print(f"{name:8s} set_tensor copy: {old_time*1e6:8.1f} us  "
+          f"in-place write: {new_time*1e6:8.1f} us  "
+          f"speedup: {old_time/new_time:.2f}x")
@@ -0,0 +1,57 @@
+"""Compare PoseNet heatmap decoding strategies.
+
+Loop: the former joint by joint decoder, with np.max, np.argwhere
+and a sigmoid per joint.
+Vectorized: decode_heatmaps, one argmax over all joints with
+gathered offsets and scores.
+
+Usage: python benchmarks/posenet_decode_benchmark.py [--runs N]
+"""
+import argparse
+import os
+import sys
+import timeit
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+
+from src.pipeline.posenet_model import decode_heatmaps, output_stride
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--runs", type=int, default=1000,
+                    help='Number of timed runs per strategy')
+p = parser.parse_args()
+
+
+def loop_decode(heatmap_data, offset_data, tensor_height):
+    joint_num = heatmap_data.shape[-1]
+    pose_kps = np.zeros((joint_num, 3), np.float32)
+    for i in range(joint_num):
+        joint_heatmap = heatmap_data[..., i]
+        max_val_pos = np.squeeze(
+            np.argwhere(joint_heatmap == np.max(joint_heatmap)))
+        remap_pos = np.array(max_val_pos/8*tensor_height, dtype=np.int32)
+        pose_kps[i, 0] = int(remap_pos[0] + offset_data[max_val_pos[0],
+                             max_val_pos[1], i])
+        pose_kps[i, 1] = int(remap_pos[1] + offset_data[max_val_pos[0],
+                             max_val_pos[1], i+joint_num])
+        pose_kps[i, 2] = 1 / (1 + np.exp(-np.max(joint_heatmap)))
+    return pose_kps
+
+
+rng = np.random.default_rng(0)
+print(f"{p.runs} runs")
+for tensor, grid in ((257, 9), (513, 33)):
+    heatmaps = rng.normal(0, 4, (grid, grid, 17)).astype(np.float32)
+    offsets = rng.normal(0, 8, (grid, grid, 34)).astype(np.float32)
+    stride = (output_stride(tensor, grid),) * 2
+    print(f"Input tensor: {tensor}x{tensor}, heatmap: {grid}x{grid}")
+    loop_time = timeit.timeit(
+        lambda: loop_decode(heatmaps, offsets, tensor),
+        number=p.runs) / p.runs
+    print(f"  Loop:       {loop_time*1e6:8.1f} us")
+    vector_time = timeit.timeit(
+        lambda: decode_heatmaps(heatmaps, offsets, stride),
+        number=p.runs) / p.runs
+    print(f"  Vectorized: {vector_time*1e6:8.1f} us  "
+          f"speedup: {loop_time/vector_time:.2f}x")
@@ -0,0 +1,82 @@
+"""Compare YUV 4:2:0 camera frame to model input tensor strategies.
+
+RGB path: convert the whole NV12 frame to an RGB PIL image
+(chroma upsampling, YCbCr merge and conversion), then letterbox it
+into the input tensor.
+YUV path: resize the Y and chroma planes, then convert only
+the resized pixels to RGB, straight into the input tensor.
+Reduced path: YuvImage.decode at reduced scale followed by a letterbox,
+as done by FallDetector to allow rotated retries.
+
+Usage: python benchmarks/yuv_input_benchmark.py [--runs N]
+"""
+import argparse
+import os
+import sys
+import timeit
+sys.path.append(os.path.abspath('.'))
+
+import numpy as np
+from PIL import Image
+
+from src.pipeline.array_image import YuvImage
+from src.pipeline.pose_base import fit_size, letterbox
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--image", type=str, default='Images/fall_img_1.png',
+                    help='Path to a sample image')
+parser.add_argument("--width", type=int, default=1920,
+                    help='Camera frame width')
+parser.add_argument("--height", type=int, default=1080,
+                    help='Camera frame height')
+parser.add_argument("--tensor", type=int, default=256,
+                    help='Model input tensor width and height')
+parser.add_argument("--runs", type=int, default=100,
+                    help='Number of timed runs per strategy')
+p = parser.parse_args()
+
+width, height = p.width, p.height
+image = Image.open(p.image).convert('RGB').resize((width, height))
+ycbcr = np.asarray(image.convert('YCbCr'))
+chroma_size = (width // 2, height // 2)
+u, v = (np.asarray(Image.fromarray(ycbcr[..., c]).resize(chroma_size,
+                                                         Image.BOX))
+        for c in (1, 2))
+nv12 = np.concatenate([ycbcr[..., 0],
+                       np.stack([u, v], axis=-1).reshape(height // 2, width)]
+                      ).tobytes()
+out = np.zeros((p.tensor, p.tensor, 3), np.uint8)
+
+
+def rgb_path():
+    frame = memoryview(nv12)
+    y = Image.frombuffer('L', (width, height), frame[:width * height],
+                         'raw', 'L', 0, 1)
+    uv = Image.frombytes('LA', chroma_size, frame[width * height:])
+    planes = [y] + [c.resize((width, height), Image.NEAREST)
+                    for c in uv.split()]
+    rgb = Image.merge('YCbCr', planes).convert('RGB')
+    letterbox(image=rgb, out=out)
+
+
+def yuv_path():
+    letterbox(image=YuvImage(nv12, size=(width, height), full_range=True),
+              out=out)
+
+
+def reduced_path():
+    frame = YuvImage(nv12, size=(width, height), full_range=True)
+    decoded = frame.decode(fit_size=fit_size(frame.size,
+                                             (p.tensor, p.tensor)))
+    letterbox(image=decoded, out=out)
+
+
+print(f"Frame: {width}x{height} NV12, input tensor: {p.tensor}x{p.tensor}, "
+      f"{p.runs} runs")
+rgb_time = timeit.timeit(rgb_path, number=p.runs) / p.runs
+print(f"RGB PIL path:    {rgb_time*1e3:8.2f} ms")
+for name, path in (('YUV path:', yuv_path),
+                   ('Reduced path:', reduced_path)):
+    path_time = timeit.timeit(path, number=p.runs) / p.runs
+    print(f"{name:16s} {path_time*1e3:8.2f} ms  "
+          f"speedup: {rgb_time/path_time:.2f}x")
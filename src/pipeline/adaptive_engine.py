@@ -0,0 +1,274 @@
+"""Switch between a fast and an accurate pose model depending on load."""
+import logging
+import threading
+import time
+import numpy as np
+from src.pipeline.array_image import as_image
+
+log = logging.getLogger(__name__)
+
+FAST = 'fast'
+ACCURATE = 'accurate'
+
+
+class AdaptivePoseEngine:
+    """Pose engine that holds a fast and an accurate model.
+
+    Uses the accurate model while the host keeps up with the incoming
+    frames and falls back to the fast model when inference latency
+    or the number of frames waiting for processing grows.
+    Separate switch-down and switch-up thresholds plus a minimum number
+    of frames between switches keep it from flapping between models.
+
+    The model is picked once per frame in :func:`begin_frame`, so all
+    pose detection attempts of a frame (e.g. rotations) use the same model.
+    Keypoints are returned in the coordinates of the image passed to
+    :func:`detect_poses` rather than the model thumbnail, so poses
+    from both models can be compared with each other.
+    """
+
+    # detect_poses returns keypoints in input image coordinates
+    source_coordinates = True
+
+    def __init__(self,
+                 fast_engine=None,
+                 accurate_engine=None,
+                 latency_budget=0.25,
+                 high_watermark=1.0,
+                 low_watermark=0.7,
+                 queue_high=2,
+                 queue_low=0,
+                 min_dwell_frames=5,
+                 smoothing=0.3
+                 ):
+        """Create an adaptive engine from two initialized PoseEngines.
+
+        :Parameters:
+        ----------
+        fast_engine : PoseEngine
+            Engine with the faster, less accurate model.
+        accurate_engine : PoseEngine
+            Engine with the slower, more accurate model.
+        latency_budget : float
+            Target seconds of inference per frame.
+        high_watermark : float
+            Switch to the fast model when the accurate model latency
+            exceeds this fraction of the latency budget.
+        low_watermark : float
+            Switch back to the accurate model when its expected latency
+            is below this fraction of the latency budget.
+        queue_high : int
+            Switch to the fast model when at least this many frames
+            are waiting to be processed.
+        queue_low : int
+            Only switch back to the accurate model when at most this many
+            frames are waiting to be processed.
+        min_dwell_frames : int
+            Minimum number of frames between two switches.
+        smoothing : float
+            Weight of the latest frame in the moving average latency.
+        """
+        assert fast_engine is not None
+        assert accurate_engine is not None
+        assert low_watermark < high_watermark
+        assert queue_low < queue_high
+        self._engines = {FAST: fast_engine, ACCURATE: accurate_engine}
+        self.latency_budget = latency_budget
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.min_dwell_frames = min_dwell_frames
+        self.smoothing = smoothing
+
+        self.active = ACCURATE
+        self.switches = 0
+        self._frames_since_switch = 0
+        # moving average and lowest seen per-frame latency of each model
+        self._avg_latency = {FAST: None, ACCURATE: None}
+        self._min_latency = {FAST: None, ACCURATE: None}
+        self._frame_latency = None
+        # detection calls of a frame may run in parallel threads,
+        # e.g. orientation_search='parallel'
+        self._latency_lock = threading.Lock()
+        self._queue_depth = 0
+        self._switch = None
+
+    @property
+    def _engine(self):
+        return self._engines[self.active]
+
+    @property
+    def confidence_threshold(self):
+        return self._engine.confidence_threshold
+
+    @property
+    def _tensor_image_height(self):
+        return self._engine._tensor_image_height
+
+    @property
+    def _tensor_image_width(self):
+        return self._engine._tensor_image_width
+
+    def _cost_ratio(self):
+        """Expected accurate model latency as a multiple of the fast one.
+
+        The ratio of the input tensor sizes, or the ratio of the lowest
+        latencies seen if that is larger. The fast model often only runs
+        under load, so its lowest latency may be too high and
+        understate the ratio.
+        """
+        fast, accurate = self._engines[FAST], self._engines[ACCURATE]
+        ratio = (accurate._tensor_image_height *
+                 accurate._tensor_image_width) / \
+            (fast._tensor_image_height * fast._tensor_image_width)
+        fast, accurate = self._min_latency[FAST], self._min_latency[ACCURATE]
+        if fast and accurate:
+            ratio = max(ratio, accurate / fast)
+        return ratio
+
+    def expected_latency(self, model):
+        """Expected per-frame latency of a model under the current load."""
+        if self._avg_latency[self.active] is None:
+            return None
+        if model == self.active:
+            return self._avg_latency[model]
+        ratio = self._cost_ratio()
+        if model == FAST:
+            ratio = 1 / ratio
+        return self._avg_latency[self.active] * ratio
+
+    def _pick_model(self):
+        """Return (model, reason) for the next frame."""
+        if self._frames_since_switch < self.min_dwell_frames:
+            return self.active, None
+        budget = self.latency_budget
+        if self.active == ACCURATE:
+            latency = self.expected_latency(ACCURATE)
+            if self._queue_depth >= self.queue_high:
+                return FAST, 'queue_depth'
+            if latency is not None and latency > budget * self.high_watermark:
+                return FAST, 'latency'
+        else:
+            latency = self.expected_latency(ACCURATE)
+            if self._queue_depth <= self.queue_low and \
+               latency is not None and latency < budget * self.low_watermark:
+                return ACCURATE, 'recovered'
+        return self.active, None
+
+    def begin_frame(self, queue_depth=0):
+        """Pick the model for the next frame.
+
+        :Parameters:
+        ----------
+        queue_depth : int
+            Number of frames waiting to be processed after this one.
+        """
+        self._queue_depth = queue_depth
+        with self._latency_lock:
+            self._frame_latency = 0.0
+        self._switch = None
+        model, reason = self._pick_model()
+        if model != self.active:
+            self._switch = {'from': self.active, 'to': model,
+                            'reason': reason}
+            log.info('Switching pose model from %s to %s due to %s. '
+                     'Average latency: %r',
+                     self.active, model, reason, self._avg_latency)
+            # the latency seen before the switch is outdated,
+            # start from the current estimate instead
+            self._avg_latency[model] = self.expected_latency(model)
+            self.active = model
+            self.switches += 1
+            self._frames_since_switch = 0
+
+    def end_frame(self):
+        """Update latency statistics with the frame that just finished.
+
+        :Returns:
+        -------
+        dict
+            Model selection metadata for the frame.
+        """
+        with self._latency_lock:
+            latency = self._frame_latency
+            self._frame_latency = None
+        self._frames_since_switch += 1
+        if latency:
+            avg = self._avg_latency[self.active]
+            self._avg_latency[self.active] = latency if avg is None else \
+                self.smoothing * latency + (1 - self.smoothing) * avg
+            low = self._min_latency[self.active]
+            self._min_latency[self.active] = latency if low is None else \
+                min(low, latency)
+        meta = {
+            'model': self.active,
+            'latency': latency,
+            'avg_latency': self._avg_latency[self.active],
+            'queue_depth': self._queue_depth,
+            'switch': self._switch,
+            'switches': self.switches,
+        }
+        return meta
+
+    def _add_latency(self, start_time):
+        """Add the time since start_time to the latency of the current
+        frame, if a frame was begun."""
+        latency = time.perf_counter() - start_time
+        with self._latency_lock:
+            if self._frame_latency is not None:
+                self._frame_latency += latency
+
+    def thumbnail(self, img):
+        """Resize an image to fit the input of the model picked
+        for the current frame."""
+        return self._engine.thumbnail(img)
+
+    def _to_source_coordinates(self, poses, img, thumbnail):
+        sx = img.width / thumbnail.width
+        sy = img.height / thumbnail.height
+        for pose in poses:
+            pose.transform(np.diag([sx, sy, 1.]))
+        return poses
+
+    def detect_keypoints(self, img, timings=None):
+        """Detect the keypoints of all people with the model picked
+        for the current frame.
+
+        Same interface as :func:`PoseEngine.detect_keypoints`
+        except keypoints are in input image coordinates.
+        """
+        img = as_image(img)
+        start_time = time.perf_counter()
+        kps, scores, thumbnail = self._engine.detect_keypoints(
+            img, timings=timings)
+        self._add_latency(start_time)
+        kps = kps * np.array([img.height / thumbnail.height,
+                              img.width / thumbnail.width, 1], np.float32)
+        return kps, scores, thumbnail
+
+    def detect_poses(self, img, timings=None):
+        """Detect poses with the model picked for the current frame.
+
+        Same interface as :func:`PoseEngine.detect_poses`
+        except keypoints are in input image coordinates.
+        """
+        img = as_image(img)
+        start_time = time.perf_counter()
+        poses, thumbnail, pose_score = self._engine.detect_poses(
+            img, timings=timings)
+        self._add_latency(start_time)
+        poses = self._to_source_coordinates(poses, img, thumbnail)
+        return poses, thumbnail, pose_score
+
+    def detect_poses_batch(self, images, timings=None):
+        """Same as :func:`PoseEngine.detect_poses_batch`
+        with keypoints in input image coordinates."""
+        images = [as_image(img) for img in images]
+        start_time = time.perf_counter()
+        results = self._engine.detect_poses_batch(images, timings=timings)
+        self._add_latency(start_time)
+        return [(self._to_source_coordinates(poses, img, thumbnail),
+                 thumbnail, pose_score)
+                for img, (poses, thumbnail, pose_score) in zip(images,
+                                                               results)]
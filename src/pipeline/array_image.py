@@ -0,0 +1,274 @@
+"""Uncompressed camera frames in NumPy arrays or raw buffers."""
+import logging
+import numpy as np
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+
+class ArrayImage:
+    """An uncompressed RGB frame such as a camera capture buffer.
+
+    Capture libraries hand over frames as (height, width, 3) uint8 arrays,
+    often views into buffers with padded rows. Image.fromarray first makes
+    a packed copy of a padded array, which is an order of magnitude slower
+    than the copy itself. ArrayImage reads rows with their stride straight
+    into a PIL image, in a single pass.
+
+    The frame is read when pixels are first asked for, so the source
+    buffer must not be reused while the frame is in use.
+    """
+
+    def __init__(self, source=None, size=None, stride=None):
+        """
+        :Parameters:
+        ----------
+        source : numpy.ndarray or buffer
+            (height, width, 3) RGB or (height, width, 4) RGBX uint8 array
+            or an object with the same shape supporting the buffer protocol.
+            With size, a flat buffer of rows of packed RGB pixels.
+        size : (width, height)
+            Frame size of a flat buffer.
+        stride : int
+            Bytes from the start of one row to the start of the next one
+            in a flat buffer. Defaults to packed rows.
+        """
+        assert source is not None
+        if size is None:
+            array = np.asarray(source)
+        else:
+            width, height = size
+            stride = stride or width * 3
+            flat = np.frombuffer(source, dtype=np.uint8)
+            assert flat.size >= stride * (height - 1) + width * 3
+            array = np.lib.stride_tricks.as_strided(
+                flat, shape=(height, width, 3), strides=(stride, 3, 1),
+                writeable=False)
+        assert array.dtype == np.uint8
+        assert array.ndim == 3 and array.shape[2] in (3, 4)
+        self._array = array
+        self._image = None
+
+    @property
+    def array(self):
+        """(height, width, channels) view of the source pixels."""
+        return self._array
+
+    @property
+    def size(self):
+        """Frame (width, height)."""
+        height, width = self._array.shape[:2]
+        return width, height
+
+    @property
+    def image(self):
+        """RGB PIL.Image copy of the frame. Read on first access."""
+        if self._image is None:
+            self._image = self._to_image()
+        return self._image
+
+    def _to_image(self):
+        array = self._array
+        height, width, channels = array.shape
+        row_stride, pixel_stride, channel_stride = array.strides
+        if pixel_stride == channels and channel_stride == 1 and \
+           row_stride >= width * channels:
+            # rows of packed pixels, possibly padded at the end:
+            # read them through a flat view of the whole span
+            span = row_stride * (height - 1) + width * channels
+            flat = np.lib.stride_tricks.as_strided(
+                array, shape=(span,), strides=(1,), writeable=False)
+            rawmode = 'RGB' if channels == 3 else 'RGBX'
+            return Image.frombytes('RGB', (width, height), flat,
+                                   'raw', rawmode, row_stride, 1)
+        log.debug('Copying frame with strides %r to packed rows',
+                  array.strides)
+        return Image.fromarray(np.ascontiguousarray(array[..., :3]))
+
+    def decode(self, fit_size=None, reducing_gap=2.0):
+        """Same as :func:`EncodedImage.decode`.
+
+        Uncompressed frames have no cheaper reduced scale read,
+        so the frame is always read at full resolution.
+        """
+        return self.image
+
+
+# YUV 4:2:0 layouts: Y plane followed by interleaved UV samples (NV12)
+# or by separate U and V planes (I420)
+YUV_FORMATS = ('nv12', 'i420')
+# chroma has little detail the pose models rely on, a cheaper filter will do
+CHROMA_RESAMPLE = Image.BILINEAR
+# lookup tables from the 16-235 luma and 16-240 chroma video range
+# to the full 0-255 range of JPEG YCbCr
+_LUMA_RANGE = [min(max(round((i - 16) * 255 / 219), 0), 255)
+               for i in range(256)]
+_CHROMA_RANGE = [min(max(round((i - 128) * 255 / 224 + 128), 0), 255)
+                 for i in range(256)]
+
+
+class YuvImage:
+    """A YUV 4:2:0 frame from a hardware video decoder or V4L2 camera.
+
+    Converting a whole HD frame to RGB costs more than resizing it for the
+    pose model. YuvImage resizes the Y and chroma planes first and
+    converts only the resized pixels to RGB, ITU-R BT.601. Planes are
+    read straight from the frame buffer with their row strides.
+
+    The frame buffer is read when pixels are asked for, so it must not be
+    reused while the frame is in use. See :func:`copy`.
+    """
+
+    def __init__(self, source=None, size=None, pixel_format='nv12',
+                 stride=None, full_range=False):
+        """
+        :Parameters:
+        ----------
+        source : bytes or buffer
+            Frame buffer with the planes one after the other.
+        size : (width, height)
+            Frame size. Width and height are even.
+        pixel_format : string
+            One of YUV_FORMATS.
+        stride : int
+            Bytes from the start of one Y row to the next. Chroma rows are
+            the same length for NV12 and half of it for I420.
+            Defaults to packed rows.
+        full_range : bool
+            Whether pixel values use the full 0-255 range (JPEG) rather than
+            the 16-235 video range of most cameras and video decoders.
+        """
+        assert source is not None
+        assert size
+        if pixel_format not in YUV_FORMATS:
+            raise ValueError(f'Unknown YUV pixel format: {pixel_format}. '
+                             f'Supported: {YUV_FORMATS}')
+        width, height = size
+        assert width % 2 == 0 and height % 2 == 0
+        self._source = memoryview(source).cast('B')
+        self._size = (width, height)
+        self.pixel_format = pixel_format
+        self.stride = stride or width
+        self.full_range = full_range
+        assert len(self._source) >= self.stride * height * 3 // 2
+        self._image = None
+
+    @property
+    def size(self):
+        """Frame (width, height)."""
+        return self._size
+
+    def copy(self):
+        """YuvImage with a copy of the frame buffer, so that a capture
+        layer can reuse the original one."""
+        return YuvImage(bytes(self._source), size=self._size,
+                        pixel_format=self.pixel_format, stride=self.stride,
+                        full_range=self.full_range)
+
+    def _planes(self):
+        """Y, U and V planes as 'L' images. Chroma is half size.
+
+        Single channel planes share memory with the frame buffer
+        and are only valid as long as it is.
+        """
+        width, height = self._size
+        stride = self.stride
+        y_end = stride * height
+        y = Image.frombuffer('L', (width, height), self._source[:y_end],
+                             'raw', 'L', stride, 1)
+        chroma_size = (width // 2, height // 2)
+        if self.pixel_format == 'nv12':
+            # interleaved samples are copied out while split in two
+            uv = Image.frombytes('LA', chroma_size, self._source[y_end:],
+                                 'raw', 'LA', stride, 1)
+            u, v = uv.split()
+        else:
+            v_start = y_end + stride // 2 * height // 2
+            u = Image.frombuffer('L', chroma_size,
+                                 self._source[y_end:v_start],
+                                 'raw', 'L', stride // 2, 1)
+            v = Image.frombuffer('L', chroma_size, self._source[v_start:],
+                                 'raw', 'L', stride // 2, 1)
+        return y, u, v
+
+    def resize(self, size, resample=Image.BICUBIC, reducing_gap=None):
+        """Resize the frame and convert it to RGB.
+
+        Same interface as PIL.Image.resize. The planes are resized before
+        the color conversion, so only the output pixels are converted.
+        :Parameters:
+        ----------
+        size : (width, height)
+            Output size.
+        resample : int
+            PIL resampling filter for the Y plane.
+        reducing_gap : float
+            Same as PIL.Image.resize.
+        :Returns:
+        -------
+        PIL.Image
+            RGB image.
+        """
+        size = tuple(size)
+        planes = []
+        for plane, plane_resample in zip(
+                self._planes(), (resample, CHROMA_RESAMPLE, CHROMA_RESAMPLE)):
+            if plane.size != size:
+                plane = plane.resize(size, plane_resample,
+                                     reducing_gap=reducing_gap)
+            planes.append(plane)
+        return self._to_rgb(planes)
+
+    def _to_rgb(self, planes):
+        """Convert same size Y, U and V planes to an RGB image."""
+        if not self.full_range:
+            # PIL converts from full range YCbCr
+            planes = [plane.point(lut) for plane, lut in
+                      zip(planes, (_LUMA_RANGE, _CHROMA_RANGE, _CHROMA_RANGE))]
+        return Image.merge('YCbCr', planes).convert('RGB')
+
+    @property
+    def image(self):
+        """Full resolution RGB PIL.Image. Converted on first access."""
+        if self._image is None:
+            self._image = self.resize(self._size)
+        return self._image
+
+    def decode(self, fit_size=None, reducing_gap=2.0):
+        """Convert to RGB at the smallest integer reduction
+        that still covers a target size.
+
+        Same as :func:`EncodedImage.decode`, with box filter reduction
+        of the YUV planes in place of JPEG DCT scaling.
+        """
+        if fit_size is None or self._image is not None:
+            return self.image
+        width, height = self._size
+        w, h = fit_size
+        factor = max(1, min(int(width // (w * reducing_gap)),
+                            int(height // (h * reducing_gap))))
+        if factor == 1:
+            return self.image
+        y, u, v = self._planes()
+        y = y.reduce(factor)
+        chroma = []
+        for plane in (u, v):
+            # chroma is half size, a small upscale is cheaper
+            # than a fractional reduction
+            chroma_factor = -(-factor // 2)
+            if chroma_factor > 1:
+                plane = plane.reduce(chroma_factor)
+            if plane.size != y.size:
+                plane = plane.resize(y.size, CHROMA_RESAMPLE)
+            chroma.append(plane)
+        return self._to_rgb([y] + chroma)
+
+
+def as_image(image):
+    """PIL.Image of an image given as a PIL.Image, ArrayImage, YuvImage,
+    NumPy array or buffer."""
+    if isinstance(image, Image.Image):
+        return image
+    if not isinstance(image, (ArrayImage, YuvImage)):
+        image = ArrayImage(image)
+    return image.image
@@ -0,0 +1,165 @@
+"""Pick the fastest TFLite CPU runtime settings for the local host."""
+import hashlib
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+from src import DEFAULT_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+DEFAULT_AUTOTUNE_CACHE = Path(DEFAULT_DATA_DIR, 'tflite-autotune.json')
+
+_cache_lock = threading.Lock()
+
+
+def _cpu_model_name():
+    """Return the CPU model name as reported by the OS, if available."""
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                key, _, value = line.partition(':')
+                if key.strip() in ('model name', 'Hardware', 'Model'):
+                    return value.strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def _usable_cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_signature():
+    """Return a short string that identifies the CPU of this host.
+
+    Tuning results are only valid on hosts with the same signature.
+    """
+    signature = '|'.join([platform.system(),
+                          platform.machine(),
+                          _cpu_model_name(),
+                          str(_usable_cpu_count())])
+    return hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+
+def default_thread_candidates():
+    """Thread counts worth trying: powers of two up to the CPU count."""
+    cpu_count = _usable_cpu_count()
+    candidates = {cpu_count}
+    n = 1
+    while n < cpu_count:
+        candidates.add(n)
+        n *= 2
+    return sorted(candidates)
+
+
+def measure_invoke_time(interpreter=None, runs=3, warmup_runs=1):
+    """Return the median wall-clock time of an interpreter invoke.
+
+    The input tensors are filled with zeros. Tensors must be allocated.
+    """
+    assert interpreter
+    for details in interpreter.get_input_details():
+        interpreter.set_tensor(details['index'],
+                               np.zeros(details['shape'], details['dtype']))
+    for _ in range(warmup_runs):
+        interpreter.invoke()
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        interpreter.invoke()
+        durations.append(time.perf_counter() - start_time)
+    return float(np.median(durations))
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_path, cache):
+    cache_path = Path(cache_path)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(cache, cache_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log.warning('Could not save TFLite autotune cache %s: %r',
+                    cache_path, e)
+
+
+def tune_num_threads(create_interpreter=None,
+                     model_hash=None,
+                     cpu_delegate=None,
+                     candidates=None,
+                     runs=3,
+                     cache_path=DEFAULT_AUTOTUNE_CACHE):
+    """Find the number of threads with the lowest inference latency.
+
+    Results are cached on disk keyed by model hash, CPU delegate
+    and CPU signature, so the search only runs once per host and model.
+
+    :Parameters:
+    ----------
+    create_interpreter : callable
+        Takes a thread count and returns an allocated interpreter.
+    model_hash : string
+        Hash of the model content, e.g. LoadedModel.sha256.
+    cpu_delegate : string
+        Name of the CPU delegate in use, e.g. 'xnnpack'. Part of cache key.
+    candidates : list
+        Thread counts to try. Defaults to default_thread_candidates().
+    runs : int
+        Number of timed invokes per candidate.
+    cache_path : string
+        Location of the JSON cache file. None disables caching.
+    :Returns:
+    -------
+    int
+        The fastest thread count.
+    """
+    assert create_interpreter
+    assert model_hash
+    key = '{}:{}:{}'.format(model_hash, cpu_delegate, cpu_signature())
+    if cache_path:
+        with _cache_lock:
+            cached = _load_cache(cache_path).get(key, None)
+        if cached:
+            log.debug('Using cached TFLite autotune result: %r', cached)
+            return cached['num_threads']
+
+    if not candidates:
+        candidates = default_thread_candidates()
+    timings = {}
+    for num_threads in candidates:
+        interpreter = create_interpreter(num_threads)
+        timings[num_threads] = measure_invoke_time(interpreter, runs=runs)
+        log.debug('TFLite autotune: num_threads=%d, invoke time=%.4f sec',
+                  num_threads, timings[num_threads])
+    best = min(timings, key=timings.get)
+    log.info('TFLite autotune picked num_threads=%d out of %r',
+             best, timings)
+
+    if cache_path:
+        with _cache_lock:
+            cache = _load_cache(cache_path)
+            cache[key] = {
+                'num_threads': best,
+                'invoke_time': timings[best],
+                'timings': {str(k): v for k, v in timings.items()},
+            }
+            _save_cache(cache_path, cache)
+    return best
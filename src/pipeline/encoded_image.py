@@ -0,0 +1,140 @@
+"""Encoded camera frames decoded at the resolution consumers need."""
+import io
+import logging
+import os
+from collections.abc import ItemsView, KeysView, ValuesView
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+
+class EncodedImage:
+    """An encoded image such as a camera JPEG frame.
+
+    Pose models only need a small fraction of the pixels in a HD camera
+    frame. JPEG decoders can scale down by 1/2, 1/4 or 1/8 while decoding
+    (DCT scaling), which is much faster than a full resolution decode
+    followed by a resize. The full resolution image is only decoded
+    if it is asked for.
+    """
+
+    def __init__(self, source=None):
+        """
+        :Parameters:
+        ----------
+        source : bytes or string or os.PathLike
+            Encoded image bytes or image file path.
+        """
+        assert source is not None
+        self._source = source
+        self._size = None
+        self._image = None
+
+    def _open(self):
+        if isinstance(self._source, (bytes, bytearray, memoryview)):
+            return Image.open(io.BytesIO(self._source))
+        return Image.open(os.fspath(self._source))
+
+    @property
+    def size(self):
+        """Full resolution (width, height). Only reads the image header."""
+        if self._size is None:
+            if self._image is not None:
+                self._size = self._image.size
+            else:
+                with self._open() as img:
+                    self._size = img.size
+        return self._size
+
+    @property
+    def image(self):
+        """Full resolution RGB image. Decoded on first access."""
+        if self._image is None:
+            with self._open() as img:
+                self._image = img.convert('RGB')
+            self._size = self._image.size
+        return self._image
+
+    def decode(self, fit_size=None, reducing_gap=2.0):
+        """Decode at the smallest scale that still covers a target size.
+
+        :Parameters:
+        ----------
+        fit_size : (width, height)
+            Size the decoded image will be resized to.
+            None decodes at full resolution.
+        reducing_gap : float
+            Decode at least reducing_gap times the fit size, so that the
+            following resize still has enough pixels to smooth over.
+            Same as PIL.Image.thumbnail.
+        :Returns:
+        -------
+        PIL.Image
+            RGB image with the aspect ratio of the full resolution image.
+        """
+        if fit_size is None or self._image is not None:
+            return self.image
+        with self._open() as img:
+            self._size = img.size
+            w, h = fit_size
+            # only JPEG decoders support draft mode, others decode in full
+            img.draft('RGB', (int(w * reducing_gap), int(h * reducing_gap)))
+            decoded = img.convert('RGB')
+        log.debug('Decoded image of size %r at %r', self._size, decoded.size)
+        if decoded.size == self._size:
+            # no reduction possible, keep for full resolution consumers
+            self._image = decoded
+        return decoded
+
+
+class LazySample(dict):
+    """Pipeline sample with values computed on first access.
+
+    Lazy values are produced by calling a function when first read
+    with sample[key] or sample.get(key), e.g. to decode the full
+    resolution image only for consumers that use it.
+
+    Lazy keys are listed like the others, so iterating over the keys
+    does not compute them, while reading the values, copying the sample
+    with dict(sample) or unpacking it with **sample does.
+    """
+
+    def __init__(self, *args, lazy=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lazy = dict(lazy or {})
+
+    def __missing__(self, key):
+        if key not in self._lazy:
+            raise KeyError(key)
+        value = self._lazy.pop(key)()
+        self[key] = value
+        return value
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._lazy
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        # a snapshot, as reading a lazy value adds it to the dict
+        return iter(list(super().__iter__()) + list(self._lazy))
+
+    def __len__(self):
+        return super().__len__() + len(self._lazy)
+
+    def keys(self):
+        return KeysView(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def copy(self):
+        """Shallow copy with the values not read yet still lazy."""
+        return LazySample(super().items(), lazy=self._lazy)
@@ -1,15 +1,64 @@
 """Fall detection pipe element."""
 from .inference import TFInferenceEngine
-from src.pipeline.pose_engine import PoseEngine
+from src.pipeline.pose_base import add_timing, fit_size
+from src.pipeline.array_image import ArrayImage, YuvImage
+from src.pipeline.encoded_image import EncodedImage, LazySample
+from src.pipeline.pose_engine import PoseEngine, KEYPOINT_INDEX
+from src.pipeline.adaptive_engine import AdaptivePoseEngine
+from src.pipeline.motion_gate import MotionGate
+from src.pipeline.sampling_schedule import SamplingSchedule
+from src.pipeline.pose_tracker import PoseTracker
 from src import DEFAULT_DATA_DIR
+import asyncio
+import collections
+import concurrent.futures
+import functools
 import logging
 import math
 import time
-from PIL import Image, ImageDraw
+import numpy as np
+from PIL import Image
 from pathlib import Path
 
 log = logging.getLogger(__name__)
 
+# image rotation angles in degrees counter clockwise
+ROTATION_DEGREES = {0: 0, Image.ROTATE_90: 90, Image.ROTATE_270: 270}
+
+# orientation search modes of find_keypoints
+# sequential: try rotations one by one until a pose is found
+# batch: detect poses in all orientations with one batched invoke
+# parallel: detect poses in all orientations on pooled interpreters
+ORIENTATION_SEARCH = ('sequential', 'batch', 'parallel')
+
+
+def unrotate_transform(angle=0, size=None):
+    """Return a 3x3 affine matrix that maps (x, y, 1) coordinates
+    in an image rotated by angle back to the image before rotation.
+
+    :Parameters:
+    ----------
+    angle : int
+        0, Image.ROTATE_90 or Image.ROTATE_270.
+    size : (width, height)
+        Size of the image before rotation.
+    """
+    width, height = size
+    if angle == Image.ROTATE_90:
+        # ROTATE_90 rotates 90' counter clockwise from ^ to < orientation,
+        # (x, y) -> (y, width - x)
+        return np.array([[0., -1., width], [1., 0., 0.], [0., 0., 1.]])
+    if angle == Image.ROTATE_270:
+        # ROTATE_270 rotates 90' clockwise from ^ to > orientation,
+        # (x, y) -> (height - y, x)
+        return np.array([[0., 1., 0.], [-1., 0., height], [0., 0., 1.]])
+    return np.eye(3)
+
+
+def scale_transform(sx=1.0, sy=1.0):
+    """Return a 3x3 affine matrix that scales (x, y, 1) coordinates."""
+    return np.diag([sx, sy, 1.])
+
 
 class FallDetector():
 
@@ -19,6 +68,20 @@ class FallDetector():
                  labels=None,
                  confidence_threshold=0.15,
                  model_name=None,
+                 tfengine=None,
+                 process_pool=None,
+                 executor=None,
+                 fast_model=None,
+                 fast_model_name=None,
+                 adaptive=None,
+                 resample=None,
+                 orientation_search='sequential',
+                 track_crop=False,
+                 crop_padding=0.5,
+                 motion_gate=None,
+                 sampling=None,
+                 tracking=None,
+                 max_poses=None,
                  **kwargs
                  ):
         """Initialize detector with config parameters.
@@ -31,12 +94,140 @@ class FallDetector():
             'edgetpu': 
                 'ai_models/posenet_mobilenet_v1_075_721_1281_quant_decoder_edgetpu.tflite'
         }
+        tfengine: TFInferenceEngine
+            Optional engine to share between detectors,
+            e.g. one pooled engine for all camera streams.
+            When provided, model and labels are not used.
+        process_pool: PoseProcessPool
+            Optional pool of worker processes to run pose estimation in.
+            The pool can be shared between detectors.
+            When provided, model, labels and tfengine are not used.
+            Fall detection state stays with this detector.
+        executor: concurrent.futures.Executor
+            Executor that runs blocking inference for
+            process_sample_async. Defaults to the event loop default executor.
+        fast_model: dict
+            Optional faster, less accurate model in the same format as model,
+            e.g. MoveNet Lightning next to MoveNet Thunder.
+            When provided, the detector switches between the two models
+            depending on inference latency and queue depth.
+            Keypoints in results are then in input image coordinates.
+        fast_model_name: string
+            Name of the fast model. Defaults to model_name.
+        adaptive: dict
+            AdaptivePoseEngine options such as latency_budget.
+        resample: string
+            Input image downscaling filter: 'nearest', 'bilinear',
+            'bicubic' (default) or 'lanczos'. Faster filters
+            lower preprocessing time at some cost in detail.
+        orientation_search: string
+            How to look for fallen people lying sideways.
+            'sequential' (default) tries the 90' rotations one after
+            the other only when no upright pose is found.
+            'batch' detects poses in all three orientations with one
+            batched model invoke and picks the best one.
+            'parallel' does the same with concurrent invokes on pooled
+            interpreters (pool_size=3) or process pool workers.
+            Both keep the latency of frames with a fallen person
+            close to a single inference. 'parallel' falls back to
+            'sequential' with a single interpreter or worker.
+            See :func:`close`.
+        track_crop: bool
+            Run pose detection on a crop around the person found in the
+            previous frame rather than the whole frame. A person far from
+            the camera then fills the model input instead of a few pixels
+            of it. Falls back to the whole frame when the person
+            is not found in the crop.
+        crop_padding: float
+            Padding around the previous frame keypoints on each side of
+            the crop, as a fraction of the keypoints bounding box size.
+        motion_gate: dict
+            Arguments of a MotionGate, {} for defaults. Runs pose detection
+            only on frames that changed since the last frame it ran on.
+            Unchanged frames reuse the last detected pose and thumbnail.
+            None runs pose detection on every frame.
+        sampling: dict
+            Arguments of a SamplingSchedule, {} for defaults. Samples
+            frames at intervals depending on whether a person is in view
+            and whether their body line moved downward, in place of the
+            fixed min_time_between_frames. Poses are still compared
+            with poses at least min_time_between_frames old, so faster
+            sampling checks for falls more often on the same time base.
+            None samples every frame at least min_time_between_frames
+            after the previous pose.
+        tracking: dict
+            Arguments of a PoseTracker, {} for defaults. Follows each
+            detected person across frames and compares the poses of
+            each person with their own previous poses. Fall results
+            name the track ID of the person. None compares the best
+            scoring pose of each frame.
+        max_poses: int
+            Maximum number of people PoseNet models decode per frame,
+            see create_pose_model. None decodes the max_people of the
+            tracker with tracking, otherwise keeps the model default.
+            A process pool takes its own max_poses.
+        kwargs:
+            Additional TFInferenceEngine options such as
+            pool_size and pool_timeout.
         """
-        
-        self._tfengine = TFInferenceEngine(
-                        model=model,
-                        labels=labels,
-                        confidence_threshold=confidence_threshold)
+
+        init_start_time = time.perf_counter()
+        if orientation_search not in ORIENTATION_SEARCH:
+            raise ValueError(
+                f'orientation_search must be one of {ORIENTATION_SEARCH}, '
+                f'not {orientation_search!r}')
+        self.orientation_search = orientation_search
+        self._orientation_executor = None
+        # orientation of the pose found in the previous frame
+        # of the stream, None if no pose was found
+        self._prev_orientation = None
+        # pose model inferences run for the current frame
+        self._inference_count = 0
+        self.track_crop = track_crop
+        self.crop_padding = crop_padding
+        # bounding box (x0, y0, x1, y1) of the previous frame keypoints
+        # relative to the frame size, None if the track is lost
+        self._track_box = None
+        # crop (x0, y0, x1, y1) in frame pixels used for the current frame
+        self._crop_box = None
+        self._motion_gate = None
+        if motion_gate is not None:
+            self._motion_gate = MotionGate(**motion_gate)
+        # thumbnail and whether a pose was found on the last frame
+        # pose detection ran on, reused for unchanged frames
+        self._detected_thumbnail = None
+        self._detected_pose = False
+        # whether the motion gate skipped the current frame
+        self._motion_skipped = False
+        self._sampling = None
+        if sampling is not None:
+            self._sampling = SamplingSchedule(**sampling)
+        self._tracker = None
+        if tracking is not None:
+            self._tracker = PoseTracker(**tracking)
+            if max_poses is None:
+                # decode everyone the tracker can follow
+                max_poses = self._tracker.max_people
+        # (pose, spinal_vector_score, pose_dix) of each person found
+        # in the current frame, collected only when tracking
+        self._people = []
+        # tracks of the people found on the last detected frame
+        self._tracked = []
+        if tfengine is None and process_pool is None:
+            tfengine = TFInferenceEngine(
+                            model=model,
+                            labels=labels,
+                            confidence_threshold=confidence_threshold,
+                            **kwargs)
+        self._tfengine = tfengine
+        self._process_pool = process_pool
+        self.executor = executor
+        # serializes async samples to keep frame order per detector,
+        # created for the event loop it is used in
+        self._async_lock = None
+        self._async_loop = None
+        # number of async samples submitted but not yet processed
+        self._async_pending = 0
         self.model_name = model_name
 
         self._sys_data_dir = DEFAULT_DATA_DIR
@@ -44,8 +235,6 @@ class FallDetector():
 
         # previous pose detection information for frame at time t-1 and t-2 \
         # to compare pose changes against
-        self._prev_data = [None] * 2
-
         # Data of previous frames lookup constants
         self.POSE_VAL = '_prev_pose_dix'
         self.TIMESTAMP = '_prev_time'
@@ -64,9 +253,29 @@ class FallDetector():
 
         # self._prev_data[0] : store data of frame at t-2
         # self._prev_data[1] : store data of frame at t-1
-        self._prev_data[0] = self._prev_data[1] = _dix
-
-        self._pose_engine = PoseEngine(self._tfengine, self.model_name)
+        self._prev_data = collections.deque([_dix, _dix], maxlen=2)
+
+        self._pose_engine = PoseEngine(self._tfengine, self.model_name,
+                                       model=process_pool,
+                                       resample=resample,
+                                       max_poses=max_poses)
+        self._fast_tfengine = None
+        if fast_model:
+            self._fast_tfengine = TFInferenceEngine(
+                            model=fast_model,
+                            labels=labels,
+                            confidence_threshold=confidence_threshold,
+                            **kwargs)
+            fast_engine = PoseEngine(self._fast_tfengine,
+                                     fast_model_name or self.model_name,
+                                     resample=resample,
+                                     max_poses=max_poses)
+            self._pose_engine = AdaptivePoseEngine(
+                fast_engine=fast_engine,
+                accurate_engine=self._pose_engine,
+                **(adaptive or {}))
+        if self.orientation_search == 'parallel':
+            self._check_parallel_capacity()
         self._fall_factor = 60
         self.confidence_threshold = confidence_threshold
         log.debug(f"Initializing FallDetector with conficence threshold: \
@@ -88,39 +297,314 @@ class FallDetector():
         self.LEFT_HIP = 'left hip'
         self.RIGHT_SHOULDER = 'right shoulder'
         self.RIGHT_HIP = 'right hip'
+        # rows of the same keypoints in pose arrays
+        self._LEFT_SHOULDER_INDEX = KEYPOINT_INDEX[self.LEFT_SHOULDER]
+        self._LEFT_HIP_INDEX = KEYPOINT_INDEX[self.LEFT_HIP]
+        self._RIGHT_SHOULDER_INDEX = KEYPOINT_INDEX[self.RIGHT_SHOULDER]
+        self._RIGHT_HIP_INDEX = KEYPOINT_INDEX[self.RIGHT_HIP]
 
         self.fall_detect_corr = [self.LEFT_SHOULDER, self.LEFT_HIP,
                                  self.RIGHT_SHOULDER, self.RIGHT_HIP]
 
+        # startup costs in seconds
+        self._startup_timings = {
+            'init': time.perf_counter() - init_start_time
+        }
+
+    def _inference_capacity(self):
+        """Number of inferences the detector engines can run at once."""
+        if self._process_pool is not None:
+            capacity = self._process_pool.workers
+        else:
+            capacity = self._tfengine.pool_size
+        if self._fast_tfengine is not None:
+            capacity = min(capacity, self._fast_tfengine.pool_size)
+        return capacity
+
+    def _check_parallel_capacity(self):
+        """Fall back from parallel orientation search when the engine
+        cannot run the orientations concurrently."""
+        capacity = self._inference_capacity()
+        if capacity < 2:
+            log.warning("orientation_search='parallel' needs at least two "
+                        "pooled interpreters or process pool workers, "
+                        "using 'sequential' instead.")
+            self.orientation_search = 'sequential'
+        elif capacity < len(ROTATION_DEGREES):
+            log.warning("orientation_search='parallel' runs %d of %d "
+                        "orientations at once with %d pooled interpreters "
+                        "or process pool workers.",
+                        capacity, len(ROTATION_DEGREES), capacity)
+
+    def close(self):
+        """Stop the threads of parallel orientation search.
+
+        Engines and pools passed to the detector are left to their owner.
+        """
+        if self._orientation_executor is not None:
+            self._orientation_executor.shutdown(wait=True)
+            self._orientation_executor = None
+
+    @property
+    def startup_timings(self):
+        """Wall-clock seconds spent in each startup stage.
+
+        Includes the inference engine timings (import, autotune, allocate),
+        detector initialization (init) and warm-up (warmup) if it ran.
+        import is the one-time runtime import of the process, shared by all
+        detectors, see :func:`inference.tflite_import_time`.
+        """
+        engine = self._tfengine or self._process_pool
+        timings = engine.startup_timings
+        timings.update(self._startup_timings)
+        return timings
+
+    def warmup(self, image_size=(640, 480), runs=1):
+        """Run dummy inferences ahead of the first real frame.
+
+        The first inferences of a freshly started detector are much slower
+        than the following ones. Warm-up invokes every pooled interpreter
+        and then runs pose detection on a blank frame. A blank frame has
+        no pose, so find_keypoints goes through every orientation
+        it may try on real frames.
+
+        :Parameters:
+        ----------
+        image_size : (width, height)
+            Size of the frames expected from the camera.
+        runs : int
+            Number of warm-up passes.
+        :Returns:
+        -------
+        dict
+            Startup timings. See :func:`startup_timings`.
+        """
+        start_time = time.perf_counter()
+        if self._tfengine is not None:
+            # process pool workers warm up their interpreters on start
+            self._tfengine.warmup(runs=runs)
+        if self._fast_tfengine is not None:
+            self._fast_tfengine.warmup(runs=runs)
+        blank_image = Image.new('RGB', image_size)
+        for _ in range(runs):
+            self.find_keypoints(blank_image)
+        # warm-up frames are not part of the stream
+        self._prev_orientation = None
+        self._track_box = None
+        if self._motion_gate is not None:
+            self._motion_gate.reset()
+        if self._sampling is not None:
+            self._sampling.reset()
+        if self._tracker is not None:
+            self._tracker.reset()
+            self._tracked = []
+        self._startup_timings['warmup'] = time.perf_counter() - start_time
+        log.info('FallDetector startup timings: %r', self.startup_timings)
+        return self.startup_timings
+
     def process_sample(self, **sample):
-        """Detect objects in sample image."""
+        """Detect objects in sample image.
+
+        sample['image'] is a PIL.Image or an encoded image:
+        JPEG bytes, an image file path or an EncodedImage.
+        Encoded images are decoded at reduced scale for pose detection.
+        The full resolution image is only decoded when a consumer
+        reads the 'image' entry of the processed sample.
+
+        Uncompressed frames can be passed as (height, width, 3) RGB or
+        (height, width, 4) RGBX uint8 numpy arrays, other buffers of that
+        shape, or an ArrayImage for flat buffers with padded rows.
+        They are read into an image in one pass, row padding included.
+        NV12 and I420 frames from video decoders are passed as a YuvImage
+        and only converted to RGB at reduced scale. The full resolution
+        image of uncompressed frames is read from the frame buffer when
+        a consumer reads it, so the buffer must not be reused until the
+        processed sample is consumed. Pass a copy of the array or
+        YuvImage.copy() to reuse it right away.
+
+        An optional sample['queue_depth'] tells an adaptive detector
+        how many samples are waiting behind this one.
+        """
         log.debug("%s received new sample", self.__class__.__name__)
         if not sample:
             # pass through empty samples to next element
             yield None
         else:
             try:
-                image = sample['image']
-                inference_result, thumbnail = self.fall_detect(image=image)
-                inference_result = self.convert_inference_result(
-                                        inference_result)
-                inf_meta = {
-                    'display': 'Fall Detection',
-                }
-                # pass on the results to the next connected pipe element
-                processed_sample = {
-                    'image': image,
-                    'thumbnail': thumbnail,
-                    'inference_result': inference_result,
-                    'inference_meta': inf_meta
-                    }
-                yield processed_sample
+                yield self._process_image(
+                    sample['image'],
+                    queue_depth=sample.get('queue_depth', 0))
             except Exception as e:
                 log.exception('Error "%s" while processing sample. '
                               'Dropping sample: %s',
                               str(e),
                               str(sample))
 
+    async def process_sample_async(self, **sample):
+        """Detect objects in sample image without blocking the event loop.
+
+        Async generator counterpart of :func:`process_sample`.
+        Inference runs in the detector executor. Samples of the same
+        detector are processed one at a time in the order they arrive,
+        while samples of other detectors proceed concurrently.
+
+        A detector serves the samples of one event loop at a time.
+        A sample cancelled while it is processed keeps the following
+        samples waiting until its frame is done.
+        """
+        log.debug("%s received new async sample", self.__class__.__name__)
+        if not sample:
+            # pass through empty samples to next element
+            yield None
+        else:
+            loop = asyncio.get_running_loop()
+            if self._async_loop is not loop:
+                # an asyncio.Lock can only be used in one event loop
+                self._async_lock = asyncio.Lock()
+                self._async_loop = loop
+            processed_sample = None
+            self._async_pending += 1
+            try:
+                # asyncio.Lock wakes up waiters in FIFO order
+                async with self._async_lock:
+                    # samples still waiting behind this one
+                    queue_depth = max(sample.get('queue_depth', 0),
+                                      self._async_pending - 1)
+                    future = loop.run_in_executor(
+                        self.executor,
+                        functools.partial(self._process_image,
+                                          sample['image'],
+                                          queue_depth=queue_depth))
+                    try:
+                        processed_sample = await asyncio.shield(future)
+                    except asyncio.CancelledError:
+                        await self._finish_cancelled(future)
+                        raise
+            except Exception as e:
+                log.exception('Error "%s" while processing sample. '
+                              'Dropping sample: %s',
+                              str(e),
+                              str(sample))
+            finally:
+                # no longer queued once its frame is processed,
+                # however long the consumer takes with the result
+                self._async_pending -= 1
+            if processed_sample is not None:
+                yield processed_sample
+
+    async def _finish_cancelled(self, future):
+        """Wait for the executor future of a cancelled sample,
+        as the frame keeps running in the executor thread
+        and changes the detector state until it is done."""
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                pass
+        if not future.cancelled() and future.exception() is not None:
+            log.warning('Error in cancelled sample: %r', future.exception())
+
+    def _process_image(self, image, queue_depth=0):
+        """Run fall detection on an image and return the processed sample.
+
+        queue_depth is the number of samples waiting behind this one.
+        """
+        start_time = time.perf_counter()
+        timings = {}
+        self._inference_count = 0
+        self._motion_skipped = False
+        frame = None
+        if isinstance(image, (EncodedImage, ArrayImage, YuvImage)):
+            frame = image
+        elif getattr(image, 'ndim', None) == 3:
+            # numpy array or another (height, width, channels) buffer
+            frame = ArrayImage(image)
+        elif not isinstance(image, Image.Image):
+            frame = EncodedImage(image)
+        self._pose_engine.begin_frame(queue_depth=queue_depth)
+        inference_result, thumbnail = self.fall_detect(image=frame or image,
+                                                       timings=timings)
+        model_meta = self._pose_engine.end_frame()
+        inference_result = self.convert_inference_result(inference_result)
+        add_timing(timings, 'total', start_time)
+        inf_meta = {
+            'display': 'Fall Detection',
+            # wall-clock seconds spent in each processing stage
+            'timing': timings,
+            # pose model inferences run for this frame, 0 if skipped
+            'inferences': self._inference_count,
+            # degrees the frame was rotated by to find the pose
+            'orientation': ROTATION_DEGREES.get(self._prev_orientation)
+            if self._inference_count else None,
+        }
+        if self.track_crop:
+            # frame pixel area the pose was detected in, None for full frame
+            inf_meta['crop'] = self._crop_box if self._inference_count \
+                else None
+        if self._motion_gate is not None:
+            # frame difference with the last detected frame
+            inf_meta['motion'] = {
+                'score': self._motion_gate.score,
+                'skipped': self._motion_skipped,
+                'skipped_frames': self._motion_gate.skipped,
+                'consecutive_skipped': self._motion_gate.consecutive_skipped,
+            }
+        if self._sampling is not None:
+            # sampling state for the next frame
+            inf_meta['sampling'] = {
+                'state': self._sampling.state,
+                'interval': self._sampling.interval,
+                'rate': self._sampling.rate,
+            }
+        if self._tracker is not None:
+            # track IDs of the people found in this frame
+            inf_meta['tracking'] = {
+                'people': [track.id for track in self._tracked]
+                if self._inference_count else None,
+                'tracks': len(self._tracker.tracks),
+            }
+        if model_meta:
+            # pose model selection and switches of an adaptive detector
+            inf_meta['model'] = model_meta
+        # pass on the results to the next connected pipe element
+        processed_sample = {
+            'image': image,
+            'thumbnail': thumbnail,
+            'inference_result': inference_result,
+            'inference_meta': inf_meta
+            }
+        if frame is not None:
+            # decode or convert full resolution only if a consumer asks
+            # for it, the frame buffer is kept until then, see process_sample
+            del processed_sample['image']
+            processed_sample = LazySample(processed_sample,
+                                          lazy={'image': lambda: frame.image})
+        return processed_sample
+
+    def _decode_image(self, image, timings=None):
+        """Decode an EncodedImage at the smallest scale that covers
+        the pose model input tensor, in any orientation tried.
+        Convert a YuvImage to RGB after reducing it the same way.
+        Read an ArrayImage into an image.
+
+        :Returns:
+        -------
+        (PIL.Image, (width, height))
+            Image for pose detection and full resolution size
+            if the image was decoded at reduced scale, otherwise None.
+        """
+        if not isinstance(image, (EncodedImage, ArrayImage, YuvImage)):
+            return image, None
+        start_time = time.perf_counter()
+        tensor_size = max(self._pose_engine._tensor_image_width,
+                          self._pose_engine._tensor_image_height)
+        decoded = image.decode(fit_size=fit_size(image.size,
+                                                 (tensor_size, tensor_size)))
+        add_timing(timings, 'decode', start_time)
+        if decoded.size == image.size:
+            return decoded, None
+        return decoded, image.size
+
     def calculate_angle(self, p):
         '''
             Calculate angle b/w two lines such as
@@ -142,110 +626,431 @@ class FallDetector():
         return angle
 
     def is_body_line_motion_downward(self, left_angle_with_yaxis,
-                                     rigth_angle_with_yaxis, inx):
+                                     rigth_angle_with_yaxis, inx,
+                                     prev_data=None):
 
         test = False
+        if prev_data is None:
+            prev_data = self._prev_data
 
         l_angle = left_angle_with_yaxis and \
-            self._prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]  \
+            prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]  \
             and left_angle_with_yaxis > \
-            self._prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]
+            prev_data[inx][self.LEFT_ANGLE_WITH_YAXIS]
         r_angle = rigth_angle_with_yaxis and \
-            self._prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS] \
+            prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS] \
             and rigth_angle_with_yaxis > \
-            self._prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS]
+            prev_data[inx][self.RIGHT_ANGLE_WITH_YAXIS]
 
         if l_angle or r_angle:
             test = True
 
         return test
 
-    def find_keypoints(self, image):
+    def _detect_rotated_poses(self, image, angle, timings):
+        """Run pose detection on an image rotated by angle
+        (0, Image.ROTATE_90 or Image.ROTATE_270).
+
+        Returns the rotated image along with the detect_poses results.
+
+        Stage timings are recorded as one attempt in timings['attempts'].
+        """
+        start_time = time.perf_counter()
+        attempt = {'angle': ROTATION_DEGREES[angle]}
+        self._inference_count += 1
+        if angle:
+            image = image.transpose(angle)
+            add_timing(attempt, 'rotate', start_time)
+        if timings is None:
+            return (image,) + self._pose_engine.detect_poses(image)
+        result = self._pose_engine.detect_poses(image, timings=attempt)
+        add_timing(attempt, 'total', start_time)
+        timings.setdefault('attempts', []).append(attempt)
+        for stage, duration in attempt.items():
+            if stage not in ('angle', 'total'):
+                timings[stage] = timings.get(stage, 0.0) + duration
+        return (image,) + result
+
+    def _keypoint_transform(self, angle, image, thumbnail, rotated_image,
+                            rotated_thumbnail, source_size=None):
+        """Return a 3x3 affine matrix from the coordinates of a detection
+        attempt to result keypoint coordinates.
+
+        Results are in thumbnail coordinates, or in input image
+        (source_size if given) coordinates for pose engines that report
+        source coordinates. Rotated attempts run on the thumbnail, which is
+        letterboxed again for the swapped aspect ratio.
+        """
+        source_coordinates = self._pose_engine.source_coordinates
+        if source_coordinates:
+            out_w, out_h = source_size or image.size
+        else:
+            out_w, out_h = thumbnail.size
+        if not angle:
+            if not source_coordinates:
+                return np.eye(3)
+            return scale_transform(out_w / image.width,
+                                   out_h / image.height)
+        # detection coordinates -> rotated thumbnail
+        detected = rotated_image if source_coordinates else rotated_thumbnail
+        transform = scale_transform(rotated_image.width / detected.width,
+                                    rotated_image.height / detected.height)
+        # rotated thumbnail -> thumbnail
+        transform = unrotate_transform(angle, thumbnail.size) @ transform
+        # thumbnail -> result coordinates
+        return scale_transform(out_w / thumbnail.width,
+                               out_h / thumbnail.height) @ transform
+
+    def _detect_orientations(self, images, timings=None):
+        """Detect poses in several images at once
+        with the orientation search mode of the detector."""
+        if self.orientation_search == 'batch':
+            return self._pose_engine.detect_poses_batch(images,
+                                                        timings=timings)
+        if self._orientation_executor is None:
+            self._orientation_executor = \
+                concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(len(ROTATION_DEGREES),
+                                    self._inference_capacity()),
+                    thread_name_prefix='fall-detect-orientation')
+        image_timings = [{} for _ in images]
+        results = list(self._orientation_executor.map(
+            lambda args: self._pose_engine.detect_poses(args[0],
+                                                        timings=args[1]),
+            zip(images, image_timings)))
+        if timings is not None:
+            # stage durations add up across concurrent threads
+            for image_timing in image_timings:
+                for stage, duration in image_timing.items():
+                    timings[stage] = timings.get(stage, 0.0) + duration
+        return results
+
+    def _search_orientations(self, image, timings=None, source_size=None):
+        """Detect poses in the upright and both 90' rotated orientations
+        at once and pick the one with the best spinal vector score.
+
+        All orientations are detected on the image thumbnail,
+        which is rotated rather than the full image.
+        Recorded as one attempt with the 'angles' searched.
+        :Returns:
+        -------
+        (angle, poses, thumbnail, spinal_vector_score, pose_dix, transform)
+            Best orientation, its poses and the upright thumbnail.
+            transform maps its keypoints to result coordinates.
+        """
+        start_time = t = time.perf_counter()
+        angles = [0, Image.ROTATE_90, Image.ROTATE_270]
+        attempt = {'angles': [ROTATION_DEGREES[a] for a in angles]}
+        thumbnail = self._pose_engine.thumbnail(image)
+        t = add_timing(attempt, 'preprocess', t)
+        images = [thumbnail] + [thumbnail.transpose(a) for a in angles[1:]]
+        add_timing(attempt, 'rotate', t)
+        self._inference_count += len(images)
+        results = self._detect_orientations(images, timings=attempt)
+        best = None
+        for angle, rotated_image, (poses, rotated_thumbnail, _) in \
+                zip(angles, images, results):
+            spinal_vector_score, pose_dix = \
+                self.estimate_spinal_vector_score(poses[0])
+            # ties go to the upright orientation
+            if best is None or spinal_vector_score > best[3]:
+                best = (angle, poses, rotated_image, spinal_vector_score,
+                        pose_dix, rotated_thumbnail)
+        angle, poses, rotated_image, spinal_vector_score, pose_dix, \
+            rotated_thumbnail = best
+        # the thumbnail stands in for the input image,
+        # keep results in input image coordinates
+        transform = self._keypoint_transform(
+            angle, thumbnail, thumbnail, rotated_image, rotated_thumbnail,
+            source_size=source_size or image.size)
+        if timings is not None:
+            add_timing(attempt, 'total', start_time)
+            timings.setdefault('attempts', []).append(attempt)
+            for stage, duration in attempt.items():
+                if stage not in ('angles', 'total'):
+                    timings[stage] = timings.get(stage, 0.0) + duration
+        return angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+            transform
+
+    def _orientation_from_geometry(self, pose_dix, left_angle_with_yaxis,
+                                   right_angle_with_yaxis):
+        """Predict the orientation a pose is found in
+        from its body-line angles and shoulder and hip positions."""
+        body_angle = max(left_angle_with_yaxis or 0,
+                         right_angle_with_yaxis or 0) % 180
+        if not 45 < body_angle < 135:
+            # upright or upside down
+            return 0
+        shoulders = [pose_dix[k] for k in (self.LEFT_SHOULDER,
+                                           self.RIGHT_SHOULDER)
+                     if k in pose_dix]
+        hips = [pose_dix[k] for k in (self.LEFT_HIP, self.RIGHT_HIP)
+                if k in pose_dix]
+        if not shoulders or not hips:
+            return None
+        shoulder_x = sum(p[0] for p in shoulders) / len(shoulders)
+        hip_x = sum(p[0] for p in hips) / len(hips)
+        # lying with the head to the left needs a clockwise rotation
+        # to bring the head up, to the right a counter clockwise one
+        return Image.ROTATE_270 if hip_x > shoulder_x else Image.ROTATE_90
+
+    def _orientation_order(self):
+        """Orientations to search in order, most likely first.
+
+        Starts with the orientation of the previous frame pose of the
+        stream. If none was found, the last recent pose geometry is used
+        as a prior. Otherwise upright first, as falls are rare.
+        """
+        order = [0, Image.ROTATE_90, Image.ROTATE_270]
+        first = self._prev_orientation
+        prev_data = self._prev_data[-1]
+        if first is None and prev_data[self.POSE_VAL] and \
+           time.monotonic() - prev_data[self.TIMESTAMP] <= \
+           self.max_time_between_frames:
+            first = self._orientation_from_geometry(
+                prev_data[self.POSE_VAL],
+                prev_data[self.LEFT_ANGLE_WITH_YAXIS],
+                prev_data[self.RIGHT_ANGLE_WITH_YAXIS])
+        if first:
+            order.remove(first)
+            order.insert(0, first)
+        return order
+
+    def _result_size(self, image, source_size=None):
+        """Size of the coordinate space of find_keypoints results."""
+        if self._pose_engine.source_coordinates:
+            return source_size or image.size
+        return fit_size(image.size, (self._pose_engine._tensor_image_width,
+                                     self._pose_engine._tensor_image_height))
+
+    def _update_track(self, pose, result_size):
+        """Remember the keypoints bounding box of a pose
+        relative to the result size."""
+        self._track_box = None
+        if pose is None:
+            return
+        points = pose.data[pose.data[:, 2] > 0, :2]
+        if len(points) < 2:
+            return
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        width, height = result_size
+        self._track_box = (float(x0) / width, float(y0) / height,
+                           float(x1) / width, float(y1) / height)
+
+    def _track_crop_box(self, image):
+        """Square crop box in image pixels around the tracked person.
+
+        None if there is no track or the crop would not be smaller
+        than the image.
+        """
+        if self._track_box is None:
+            return None
+        x0, y0, x1, y1 = self._track_box
+        width, height = image.size
+        x0, x1 = x0 * width, x1 * width
+        y0, y1 = y0 * height, y1 * height
+        side = max(x1 - x0, y1 - y0) * (1 + 2 * self.crop_padding)
+        # at least the model input size, so the crop is never enlarged
+        side = max(side, self._pose_engine._tensor_image_width,
+                   self._pose_engine._tensor_image_height)
+        crop_w, crop_h = min(side, width), min(side, height)
+        if crop_w >= width and crop_h >= height:
+            return None
+        # center on the person, shift inside the image at the edges
+        left = min(max((x0 + x1 - crop_w) / 2, 0), width - crop_w)
+        top = min(max((y0 + y1 - crop_h) / 2, 0), height - crop_h)
+        return (int(left), int(top),
+                int(left + crop_w), int(top + crop_h))
+
+    def _find_keypoints_in_crop(self, image, box, timings=None,
+                                source_size=None):
+        """Find a pose in a crop of an image
+        and map its keypoints to whole image results."""
+        t = time.perf_counter()
+        crop = image.crop(box)
+        add_timing(timings, 'crop', t)
+        pose, crop_thumbnail, spinal_vector_score, pose_dix = \
+            self._find_pose(crop, timings=timings)
+        if pose is None:
+            return None
+        # crop results -> crop pixels -> image pixels -> image results
+        if self._pose_engine.source_coordinates:
+            transform = np.eye(3)
+        else:
+            transform = scale_transform(
+                crop.width / crop_thumbnail.width,
+                crop.height / crop_thumbnail.height)
+        transform = np.array([[1., 0., box[0]], [0., 1., box[1]],
+                              [0., 0., 1.]]) @ transform
+        out_w, out_h = self._result_size(image, source_size)
+        transform = scale_transform(out_w / image.width,
+                                    out_h / image.height) @ transform
+        for person_pose, _, _ in self._people or [(pose, None, None)]:
+            person_pose.transform(transform)
+        t = time.perf_counter()
+        thumbnail = self._pose_engine.thumbnail(image)
+        add_timing(timings, 'preprocess', t)
+        return pose, thumbnail, spinal_vector_score, pose_dix
+
+    def find_keypoints(self, image, timings=None, source_size=None):
+        """Find the best pose candidate in an image.
+
+        With track_crop, looks in a crop around the person found
+        in the previous frame first.
+        :Parameters:
+        ----------
+        image : PIL.Image
+            Input image.
+        timings : dict
+            Optional dict to record wall-clock seconds per stage in.
+            Each pose detection attempt is recorded in timings['attempts'].
+        source_size : (width, height)
+            Full resolution size if image is a reduced scale decode.
+            Keypoints in input image coordinates are scaled to it.
+        """
+        self._crop_box = None
+        if not self.track_crop:
+            return self._find_pose(image, timings=timings,
+                                   source_size=source_size)
+        result = None
+        box = self._track_crop_box(image)
+        if box:
+            result = self._find_keypoints_in_crop(image, box,
+                                                  timings=timings,
+                                                  source_size=source_size)
+            if result is None:
+                log.debug('Lost track of the person in crop %r. '
+                          'Falling back to the whole frame.', box)
+            else:
+                self._crop_box = box
+        if result is None:
+            result = self._find_pose(image, timings=timings,
+                                     source_size=source_size)
+        self._update_track(result[0], self._result_size(image, source_size))
+        return result
+
+    def _find_pose(self, image, timings=None, source_size=None):
+        """Find the best pose candidate in an image.
+
+        Tries rotated versions of the image if no pose is found in the
+        most likely orientation, or all orientations at once
+        depending on orientation_search. The most likely orientation
+        is the one a pose was found in on the previous frame.
+        :Parameters:
+        ----------
+        image : PIL.Image
+            Input image.
+        timings : dict
+            Optional dict to record wall-clock seconds per stage in.
+            Each pose detection attempt is recorded in timings['attempts'].
+        source_size : (width, height)
+            Full resolution size if image is a reduced scale decode.
+            Keypoints in input image coordinates are scaled to it.
+        """
 
         # this score value should be related to the configuration \
         # confidence_threshold parameter
         min_score = self.confidence_threshold
-        rotations = [Image.ROTATE_270, Image.ROTATE_90]
-        angle = 0
         pose = None
-        poses, thumbnail, _ = self._pose_engine.detect_poses(image)
-        width, height = thumbnail.size
-        # if no pose detected with high confidence,
-        # try rotating the image +/- 90' to find a fallen person
-        # currently only looking at pose[0] because we are focused \
-        # on a lone person falls
-        # while (not poses or poses[0].score < min_score) and rotations:
-        spinal_vector_score, pose_dix = self.estimate_spinal_vector_score(
-                                        poses[0])
-        while spinal_vector_score < min_score and rotations:
-            angle = rotations.pop()
-            transposed = image.transpose(angle)
-            # we are interested in the poses but not the rotated thumbnail
-            poses, _, _ = self._pose_engine.detect_poses(transposed)
-            spinal_vector_score, pose_dix = self.estimate_spinal_vector_score(
-                                    poses[0])
+        if self.orientation_search != 'sequential':
+            angle, poses, thumbnail, spinal_vector_score, pose_dix, \
+                transform = self._search_orientations(image, timings,
+                                                      source_size)
+        else:
+            rotations = self._orientation_order()
+            rotations.reverse()
+            thumbnail = None
+            spinal_vector_score = -1
+            # if no pose detected with high confidence,
+            # try rotating the image +/- 90' to find a fallen person
+            # currently only looking at pose[0] because we are focused \
+            # on a lone person falls
+            # while (not poses or poses[0].score < min_score) and rotations:
+            while spinal_vector_score < min_score and rotations:
+                angle = rotations.pop()
+                if thumbnail is None and not angle:
+                    detected_image = image
+                    rotated_image = rotated_thumbnail = None
+                    _, poses, thumbnail, _ = self._detect_rotated_poses(
+                        image, angle, timings)
+                else:
+                    if thumbnail is None:
+                        t = time.perf_counter()
+                        thumbnail = self._pose_engine.thumbnail(image)
+                        add_timing(timings, 'preprocess', t)
+                    detected_image = thumbnail
+                    # rotate the downscaled thumbnail rather than
+                    # the full frame
+                    rotated_image, poses, rotated_thumbnail, _ = \
+                        self._detect_rotated_poses(thumbnail, angle, timings)
+                spinal_vector_score, pose_dix = \
+                    self.estimate_spinal_vector_score(poses[0])
+            # if the image was rotated, we need to rotate back to the original\
+            # image coordinates
+            # before comparing with poses in other frames.
+            transform = self._keypoint_transform(
+                angle, detected_image, thumbnail, rotated_image,
+                rotated_thumbnail, source_size=source_size or image.size)
 
         if poses and poses[0]:
             pose = poses[0]
 
         # lets check if we found a good pose candidate
 
+        self._people = []
         if (pose and spinal_vector_score >= min_score):
-            # if the image was rotated, we need to rotate back to the original\
-            # image coordinates
-            # before comparing with poses in other frames.
-            if angle == Image.ROTATE_90:
-                # ROTATE_90 rotates 90' counter clockwise \
-                # from ^ to < orientation.
-                for _, keypoint in pose.keypoints.items():
-                    # keypoint.yx[0] is the x coordinate in an image
-                    # keypoint.yx[0] is the y coordinate in an image, \
-                    # with 0,0 in the upper left corner (not lower left).
-                    tmp_swap = keypoint.yx[0]
-                    keypoint.yx[0] = width-keypoint.yx[1]
-                    keypoint.yx[1] = tmp_swap
-            elif angle == Image.ROTATE_270:
-                # ROTATE_270 rotates 90' clockwise from ^ to > orientation.
-                for _, keypoint in pose.keypoints.items():
-                    tmp_swap = keypoint.yx[0]
-                    keypoint.yx[0] = keypoint.yx[1]
-                    keypoint.yx[1] = height-tmp_swap
+            if self._tracker is not None:
+                # everyone found in the same orientation
+                self._people.append((pose, spinal_vector_score, pose_dix))
+                for other_pose in poses[1:]:
+                    other_score, other_dix = \
+                        self.estimate_spinal_vector_score(other_pose)
+                    if other_score >= min_score:
+                        self._people.append((other_pose, other_score,
+                                             other_dix))
+            if not np.array_equal(transform, np.eye(3)):
+                for person_pose, _, _ in self._people or [(pose, None, None)]:
+                    person_pose.transform(transform)
             # we could not detexct a pose with sufficient confidence
             log.info(f"""A pose detected with
                     spinal_vector_score={spinal_vector_score} >= {min_score}
                     confidence threshold.
                     Pose keypoints: {pose_dix}"
                 """)
+            self._prev_orientation = angle
         else:
             pose = None
+            self._prev_orientation = None
 
         return pose, thumbnail, spinal_vector_score, pose_dix
 
-    def find_changes_in_angle(self, pose_dix, inx):
+    def find_changes_in_angle(self, pose_dix, inx, prev_data=None):
         '''
             Find the changes in angle for shoulder-hip lines
             b/w current and previpus frame.
         '''
+        if prev_data is None:
+            prev_data = self._prev_data
 
-        prev_leftLine_corr_exist = all(e in self._prev_data[inx][self.POSE_VAL]
+        prev_leftLine_corr_exist = all(e in prev_data[inx][self.POSE_VAL]
                                        for e in [self.LEFT_SHOULDER, self.LEFT_HIP])
         curr_leftLine_corr_exist = all(e in pose_dix for e in [self.LEFT_SHOULDER,self.LEFT_HIP])
 
-        prev_rightLine_corr_exist = all(e in self._prev_data[inx][self.POSE_VAL] for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
+        prev_rightLine_corr_exist = all(e in prev_data[inx][self.POSE_VAL] for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
         curr_rightLine_corr_exist = all(e in pose_dix for e in [self.RIGHT_SHOULDER, self.RIGHT_HIP])
 
         left_angle = right_angle = 0
 
         if prev_leftLine_corr_exist and curr_leftLine_corr_exist:
-            temp_left_vector = [[self._prev_data[inx][self.POSE_VAL][self.LEFT_SHOULDER],
-                                self._prev_data[inx][self.POSE_VAL][self.LEFT_HIP]],
+            temp_left_vector = [[prev_data[inx][self.POSE_VAL][self.LEFT_SHOULDER],
+                                prev_data[inx][self.POSE_VAL][self.LEFT_HIP]],
                                 [pose_dix[self.LEFT_SHOULDER], pose_dix[self.LEFT_HIP]]]
             left_angle = self.calculate_angle(temp_left_vector)
             log.debug("Left shoulder-hip angle: %r", left_angle)
 
         if prev_rightLine_corr_exist and curr_rightLine_corr_exist:
-            temp_right_vector = [[self._prev_data[inx][self.POSE_VAL][self.RIGHT_SHOULDER],
-                                 self._prev_data[inx][self.POSE_VAL][self.RIGHT_HIP]],
+            temp_right_vector = [[prev_data[inx][self.POSE_VAL][self.RIGHT_SHOULDER],
+                                 prev_data[inx][self.POSE_VAL][self.RIGHT_HIP]],
                                  [pose_dix[self.RIGHT_SHOULDER], pose_dix[self.RIGHT_HIP]]]
             right_angle = self.calculate_angle(temp_right_vector)
             log.debug("Right shoulder-hip angle: %r", right_angle)
@@ -255,7 +1060,7 @@ class FallDetector():
 
     def assign_prev_records(self, pose_dix, left_angle_with_yaxis,
                             rigth_angle_with_yaxis, now, thumbnail,
-                            current_body_vector_score):
+                            current_body_vector_score, prev_data=None):
 
         curr_data = {self.POSE_VAL: pose_dix,
                      self.TIMESTAMP: now,
@@ -264,12 +1069,15 @@ class FallDetector():
                      self.RIGHT_ANGLE_WITH_YAXIS: rigth_angle_with_yaxis,
                      self.BODY_VECTOR_SCORE: current_body_vector_score}
 
-        self._prev_data[-2] = self._prev_data[-1]
-        self._prev_data[-1] = curr_data
+        if prev_data is None:
+            prev_data = self._prev_data
+        # the oldest record drops out
+        prev_data.append(curr_data)
 
     def draw_lines(self, thumbnail, pose_dix, score):
         """Draw body lines if available. Return number of lines drawn."""
         # save an image with drawn lines for debugging
+        from PIL import ImageDraw
         draw = ImageDraw.Draw(thumbnail)
         path = None
         body_lines_drawn = 0
@@ -326,23 +1134,25 @@ class FallDetector():
         pose_dix = {}
         is_leftVector = is_rightVector = False
 
+        # pose_dix coordinates are views of the pose array rows,
+        # so they follow transforms of the pose
+        data = pose.data
+        left = (self._LEFT_SHOULDER_INDEX, self._LEFT_HIP_INDEX)
+        right = (self._RIGHT_SHOULDER_INDEX, self._RIGHT_HIP_INDEX)
+
         # Calculate leftVectorScore & rightVectorScore
-        leftVectorScore = min(pose.keypoints[self.LEFT_SHOULDER].score,
-                              pose.keypoints[self.LEFT_HIP].score)
-        rightVectorScore = min(pose.keypoints[self.RIGHT_SHOULDER].score,
-                               pose.keypoints[self.RIGHT_HIP].score)
+        leftVectorScore = float(data[left, 2].min())
+        rightVectorScore = float(data[right, 2].min())
 
         if leftVectorScore > self.confidence_threshold:
             is_leftVector = True
-            pose_dix[self.LEFT_SHOULDER] = \
-                pose.keypoints[self.LEFT_SHOULDER].yx
-            pose_dix[self.LEFT_HIP] = pose.keypoints[self.LEFT_HIP].yx
+            pose_dix[self.LEFT_SHOULDER] = data[left[0], :2]
+            pose_dix[self.LEFT_HIP] = data[left[1], :2]
 
         if rightVectorScore > self.confidence_threshold:
             is_rightVector = True
-            pose_dix[self.RIGHT_SHOULDER] = \
-                pose.keypoints[self.RIGHT_SHOULDER].yx
-            pose_dix[self.RIGHT_HIP] = pose.keypoints[self.RIGHT_HIP].yx
+            pose_dix[self.RIGHT_SHOULDER] = data[right[0], :2]
+            pose_dix[self.RIGHT_HIP] = data[right[1], :2]
 
         def find_spinalLine():
             left_spinal_x1 = (pose_dix[self.LEFT_SHOULDER][0] +
@@ -379,7 +1189,139 @@ class FallDetector():
         log.debug(f"Estimated spinal vector score: {spinalVectorScore}")
         return spinalVectorScore, pose_dix
 
-    def fall_detect(self, image=None):
+    def _save_pose(self, pose_dix, spinal_vector_score, now, thumbnail,
+                   prev_data, angles=None):
+        """Save a pose in a pose history for comparison
+        with subsequent frames."""
+        # frames sampled faster than min_time_between_frames
+        # are compared with the saved poses but not saved,
+        # so that saved poses stay far enough apart
+        if self._sampling is None or not prev_data or \
+           not prev_data[-1][self.POSE_VAL] or \
+           now - prev_data[-1][self.TIMESTAMP] >= \
+           self.min_time_between_frames:
+            log.debug("Saving pose for subsequent comparison.")
+            left_angle_with_yaxis, rigth_angle_with_yaxis = \
+                angles or self.get_line_angles_with_yaxis(pose_dix)
+            self.assign_prev_records(pose_dix, left_angle_with_yaxis,
+                                     rigth_angle_with_yaxis, now,
+                                     thumbnail, spinal_vector_score,
+                                     prev_data=prev_data)
+
+    def _compare_poses(self, pose_dix, spinal_vector_score, now, thumbnail,
+                       prev_data):
+        """Compare a pose with the poses of a pose history, newest first,
+        then save it in the history.
+
+        :Returns:
+        -------
+        (list, bool)
+            FALL inference results and whether the body line
+            moved downward since a previous pose.
+        """
+        inference_result = []
+        downward = False
+
+        current_body_vector_score = spinal_vector_score
+
+        # Find line angle with vertcal axis
+        left_angle_with_yaxis, rigth_angle_with_yaxis = \
+            self.get_line_angles_with_yaxis(pose_dix)
+
+        # save an image with drawn lines for debugging
+        if log.getEffectiveLevel() <= logging.DEBUG:
+            # development mode
+            self.draw_lines(thumbnail, pose_dix, spinal_vector_score)
+
+        for t in range(-1, -len(prev_data) - 1, -1):
+            lapse = now - prev_data[t][self.TIMESTAMP]
+
+            if not prev_data[t][self.POSE_VAL] or \
+               lapse > self.max_time_between_frames:
+                log.debug("No recent pose to compare to. Will save \
+                    this frame pose for subsequent comparison.")
+            elif lapse < self.min_time_between_frames:
+                # frames sampled faster than min_time_between_frames,
+                # e.g. at the alert interval, are only compared with
+                # poses at least that old, the time base of fall_factor
+                log.debug("Pose %.2f sec old is too recent to compare to.",
+                          lapse)
+            elif not self.is_body_line_motion_downward(
+                                                left_angle_with_yaxis,
+                                                rigth_angle_with_yaxis,
+                                                inx=t, prev_data=prev_data):
+                log.debug("The body-line angle with vertical axis is \
+                            decreasing from the previous frame. \
+                            Not likely to be a fall.")
+            else:
+                downward = True
+                leaning_angle = self.find_changes_in_angle(
+                    pose_dix, inx=t, prev_data=prev_data)
+
+                # Get leaning_probability by comparing leaning_angle
+                # with fall_factor probability.
+                leaning_probability = 1 \
+                    if leaning_angle > self._fall_factor else 0
+
+                # Calculate fall score using average of current and \
+                # previous frame's body vector score with \
+                # leaning_probability
+                fall_score = leaning_probability * \
+                    (prev_data[t][self.BODY_VECTOR_SCORE] +
+                     current_body_vector_score) / 2
+
+                if fall_score >= self.confidence_threshold:
+                    inference_result.append(('FALL', fall_score,
+                                             leaning_angle, pose_dix))
+                    log.info("Fall detected: %r", inference_result)
+                    break
+                else:
+                    log.debug(f"No fall detected due to low \
+                    confidence score:  \
+                    {fall_score} < {self.confidence_threshold} \
+                    min threshold.Inference result: {inference_result}")
+
+        self._save_pose(pose_dix, current_body_vector_score, now, thumbnail,
+                        prev_data, angles=(left_angle_with_yaxis,
+                                           rigth_angle_with_yaxis))
+        return inference_result, downward
+
+    def _compare_tracked_poses(self, now, thumbnail):
+        """Associate the people of the current frame with tracks
+        and compare the pose of each person with their previous poses.
+
+        :Returns:
+        -------
+        (list, bool)
+            FALL inference results, each with the track ID of the person,
+            and whether the body line of anyone moved downward.
+        """
+        kps = np.stack([person_pose.data
+                        for person_pose, _, _ in self._people])
+        self._tracked = self._tracker.update(kps, now)
+        inference_result = []
+        downward = False
+        for track, (_, spinal_vector_score, pose_dix) in zip(self._tracked,
+                                                             self._people):
+            person_result, person_downward = self._compare_poses(
+                pose_dix, spinal_vector_score, now, thumbnail, track.history)
+            inference_result += [result + (track.id,)
+                                 for result in person_result]
+            downward = downward or person_downward
+        return inference_result, downward
+
+    def _check_motion(self, image, now, timings=None):
+        """Whether pose detection has to run on a frame.
+        Always True without a motion gate."""
+        if self._motion_gate is None:
+            return True
+        start_time = time.perf_counter()
+        changed = self._motion_gate.check(image, now)
+        add_timing(timings, 'motion', start_time)
+        self._motion_skipped = not changed
+        return changed
+
+    def fall_detect(self, image=None, timings=None):
         assert image
         log.debug("Calling TF engine for inference")
         start_time = time.monotonic()
@@ -387,85 +1329,62 @@ class FallDetector():
         now = time.monotonic()
         lapse = now - self._prev_data[-1][self.TIMESTAMP]
 
-        if self._prev_data[-1][self.POSE_VAL] \
-           and lapse < self.min_time_between_frames:
+        if self._sampling is not None and not self._sampling.due(now):
+            log.debug("Frame not due for sampling. %s state interval: %.2f",
+                      self._sampling.state, self._sampling.interval)
+            inference_result = None
+            thumbnail = self._detected_thumbnail
+        elif self._sampling is None and self._prev_data[-1][self.POSE_VAL] \
+                and lapse < self.min_time_between_frames:
             log.debug("Received an image frame too soon after the previous \
                 frame. Only %.2f ms apart.\
                 Minimum %.2f ms distance required for fall detection.",
                 lapse, self.min_time_between_frames)
             inference_result = None
             thumbnail = self._prev_data[-1][self.THUMBNAIL]
+        elif not self._check_motion(image, now, timings=timings):
+            # same scene as the last detected frame, so is its pose
+            inference_result = None
+            thumbnail = self._detected_thumbnail
+            if self._detected_pose:
+                self._prev_data[-1][self.TIMESTAMP] = now
+                for track in self._tracked:
+                    track.last_seen = now
+                    if track.history:
+                        track.history[-1][self.TIMESTAMP] = now
+            if self._sampling is not None:
+                self._sampling.update(now, pose=self._detected_pose)
         else:
+            image, source_size = self._decode_image(image, timings=timings)
             # Detection using tensorflow posenet module
             pose, thumbnail, spinal_vector_score, pose_dix = \
-                        self.find_keypoints(image)
+                        self.find_keypoints(image, timings=timings,
+                                            source_size=source_size)
+            self._detected_thumbnail = thumbnail
+            self._detected_pose = pose is not None
+            heuristics_start_time = time.perf_counter()
 
             inference_result = None
+            downward = False
             if not pose:
                 log.debug(f"No pose detected or detection score does not meet \
                     confidence threshold of {self.confidence_threshold}.")
+            elif self._tracker is None:
+                inference_result, downward = self._compare_poses(
+                    pose_dix, spinal_vector_score, now, thumbnail,
+                    self._prev_data)
             else:
-                inference_result = []
-
-                current_body_vector_score = spinal_vector_score
-
-                # Find line angle with vertcal axis
-                left_angle_with_yaxis, rigth_angle_with_yaxis = \
-                    self.get_line_angles_with_yaxis(pose_dix)
-
-                # save an image with drawn lines for debugging
-                if log.getEffectiveLevel() <= logging.DEBUG:
-                    # development mode
-                    self.draw_lines(thumbnail, pose_dix, spinal_vector_score)
-
-                for t in [-1, -2]:
-                    lapse = now - self._prev_data[t][self.TIMESTAMP]
-
-                    if not self._prev_data[t][self.POSE_VAL] or \
-                       lapse > self.max_time_between_frames:
-                        log.debug("No recent pose to compare to. Will save \
-                            this frame pose for subsequent comparison.")
-                    elif not self.is_body_line_motion_downward(
-                                                        left_angle_with_yaxis,
-                                                        rigth_angle_with_yaxis,
-                                                        inx=t):
-                        log.debug("The body-line angle with vertical axis is \
-                                    decreasing from the previous frame. \
-                                    Not likely to be a fall.")
-                    else:
-                        leaning_angle = self.find_changes_in_angle(pose_dix,
-                                                                   inx=t)
-
-                        # Get leaning_probability by comparing leaning_angle
-                        # with fall_factor probability.
-                        leaning_probability = 1 \
-                            if leaning_angle > self._fall_factor else 0
-
-                        # Calculate fall score using average of current and \
-                        # previous frame's body vector score with \
-                        # leaning_probability
-                        fall_score = leaning_probability * \
-                            (self._prev_data[t][self.BODY_VECTOR_SCORE] +
-                             current_body_vector_score) / 2
-
-                        if fall_score >= self.confidence_threshold:
-                            inference_result.append(('FALL', fall_score,
-                                                     leaning_angle, pose_dix))
-                            log.info("Fall detected: %r", inference_result)
-                            break
-                        else:
-                            log.debug(f"No fall detected due to low \
-                            confidence score:  \
-                            {fall_score} < {self.confidence_threshold} \
-                            min threshold.Inference result: {inference_result}")
-
-                log.debug("Saving pose for subsequent comparison.")
-                self.assign_prev_records(pose_dix, left_angle_with_yaxis,
-                                         rigth_angle_with_yaxis, now,
-                                         thumbnail,
-                                         current_body_vector_score)
-
-                # log.debug("Logging stats")
+                inference_result, downward = self._compare_tracked_poses(
+                    now, thumbnail)
+                # the best scoring pose still drives the frame sampling
+                # and orientation search
+                self._save_pose(pose_dix, spinal_vector_score, now,
+                                thumbnail, self._prev_data)
+
+            if self._sampling is not None:
+                self._sampling.update(now, pose=pose is not None,
+                                      downward=downward)
+            add_timing(timings, 'heuristics', heuristics_start_time)
 
         # self.log_stats(start_time=start_time)
         log.debug("thumbnail: %r", thumbnail)
@@ -476,7 +1395,10 @@ class FallDetector():
 
         if inference_result:
             for inf in inference_result:
-                label, confidence, leaning_angle, keypoint_corr = inf
+                label, confidence, leaning_angle, keypoint_corr = inf[:4]
+                # plain lists of coordinates rather than pose array views
+                keypoint_corr = {name: [float(v) for v in corr]
+                                 for name, corr in keypoint_corr.items()}
                 log.info('label: %s , confidence: %.0f, leaning_angle: %.0f, \
                          keypoint_corr: %s',
                          label,
@@ -496,6 +1418,9 @@ class FallDetector():
                         'right hip': keypoint_corr.get('right hip', None)
                     }
                 }
+                if len(inf) > 4:
+                    # track ID of the person
+                    one_inf['person'] = inf[4]
                 inf_json.append(one_inf)
 
         return inf_json
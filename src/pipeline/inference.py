@@ -1,24 +1,100 @@
 """Tensorflow inference engine wrapper."""
 import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
-from tflite_runtime.interpreter import Interpreter
-from tflite_runtime.interpreter import load_delegate
+from .autotune import DEFAULT_AUTOTUNE_CACHE, tune_num_threads
+from .model_registry import get_model_registry
 
 log = logging.getLogger(__name__)
 
+_tflite_interpreter_module = None
+# time spent importing the TFLite runtime in this process
+_tflite_import_time = 0.0
 
-def _get_edgetpu_interpreter(model=None):  # pragma: no cover
+
+def _tflite():
+    """Import the TFLite runtime on first use.
+
+    The runtime is a heavyweight native module. Importing it lazily
+    keeps the import of this package fast.
+    """
+    global _tflite_interpreter_module, _tflite_import_time
+    if _tflite_interpreter_module is None:
+        start_time = time.perf_counter()
+        import tflite_runtime.interpreter as tflite_interpreter
+        _tflite_import_time = time.perf_counter() - start_time
+        _tflite_interpreter_module = tflite_interpreter
+        log.debug('TFLite runtime imported in %.3f sec',
+                  _tflite_import_time)
+    return _tflite_interpreter_module
+
+
+def tflite_import_time():
+    """Seconds the TFLite runtime import took in this process.
+
+    The runtime is imported once per process, on first use by any engine.
+    0 before that.
+    """
+    return _tflite_import_time
+
+# CPU delegates that can be selected for the TFLite CPU runtime
+CPU_DELEGATES = ('xnnpack', None)
+
+# custom op library of PoseNet models with a built-in pose decoder
+POSENET_DECODER_LIBRARY = 'posenet_decoder.so'
+
+
+def _load_delegates(libraries=None):
+    """Load TFLite delegate libraries, skipping the ones
+    that are not available."""
+    delegates = []
+    for library in libraries or ():
+        try:
+            delegates.append(_tflite().load_delegate(library))
+        except (ValueError, OSError) as e:
+            log.warning('Could not load TFLite delegate %s: %r',
+                        library, e)
+    return delegates
+
+
+def _cpu_op_resolver_options(cpu_delegate=None):
+    """Interpreter kwargs that turn the default XNNPACK delegate on or off.
+
+    Older tflite_runtime versions do not support op resolver selection
+    and always use their built-in default.
+    """
+    assert cpu_delegate in CPU_DELEGATES, \
+        'Unsupported CPU delegate: {}'.format(cpu_delegate)
+    OpResolverType = getattr(_tflite(), 'OpResolverType', None)
+    if OpResolverType is None:  # pragma: no cover
+        log.debug('tflite_runtime does not support op resolver selection.')
+        return {}
+    if cpu_delegate == 'xnnpack':
+        resolver_type = OpResolverType.AUTO
+    else:
+        resolver_type = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return {'experimental_op_resolver_type': resolver_type}
+
+
+def _get_edgetpu_interpreter(model=None, registry=None,
+                             delegates=None):  # pragma: no cover
     # Note: Looking for ideas how to test Coral EdgeTPU dependent code
     # in a cloud CI environment such as Travis CI and Github
     tf_interpreter = None
     if model:
         try:
-            edgetpu_delegate = load_delegate('libedgetpu.so.1.0')
+            edgetpu_delegate = _tflite().load_delegate('libedgetpu.so.1.0')
             assert edgetpu_delegate
-            tf_interpreter = Interpreter(
-                model_path=model,
-                experimental_delegates=[edgetpu_delegate]
+            if registry is None:
+                registry = get_model_registry()
+            tf_interpreter = _tflite().Interpreter(
+                model_content=registry.get_model_content(
+                    model, delegate='edgetpu'),
+                experimental_delegates=[edgetpu_delegate] +
+                _load_delegates(delegates)
                 )
             log.debug('EdgeTPU available. Will use EdgeTPU model.')
         except Exception as e:
@@ -27,6 +103,148 @@ def _get_edgetpu_interpreter(model=None):  # pragma: no cover
     return tf_interpreter
 
 
+class InterpreterPool:
+    """Fixed size pool of TFLite interpreters for the same AI model.
+
+    A TFLite Interpreter is not safe to use from more than one thread.
+    The pool hands out each interpreter to one caller at a time
+    so that several threads (e.g. one per camera) can run inferences
+    in parallel, each on its own pre-allocated interpreter.
+    """
+
+    def __init__(self, interpreters=None, timeout=None):
+        """Create a pool from a list of allocated interpreters.
+
+        :Parameters:
+        ----------
+        interpreters: list
+            TFLite interpreters with already allocated tensors.
+        timeout : float
+            Default max time in seconds to wait for a free interpreter.
+            None means wait indefinitely.
+        """
+        assert interpreters, 'At least one interpreter required.'
+        self._interpreters = tuple(interpreters)
+        self._idle = list(self._interpreters)
+        self._timeout = timeout
+        self._cond = threading.Condition()
+        self._start_time = time.monotonic()
+        # checkout timestamps of interpreters currently in use
+        self._busy_since = {}
+        self._busy_time = 0.0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+
+    @property
+    def size(self):
+        return len(self._interpreters)
+
+    @property
+    def interpreters(self):
+        return self._interpreters
+
+    def checkout(self, timeout=None):
+        """Take an idle interpreter out of the pool.
+
+        Blocks until an interpreter is returned to the pool by another
+        caller or the timeout expires.
+
+        :Parameters:
+        ----------
+        timeout : float
+            Max time in seconds to wait. Defaults to the pool timeout.
+        :Returns:
+        -------
+        Interpreter
+            TFLite interpreter reserved for the caller.
+        :Raises:
+        -------
+        TimeoutError
+            If no interpreter became available in time.
+        """
+        if timeout is None:
+            timeout = self._timeout
+        with self._cond:
+            start_time = time.monotonic()
+            if not self._idle:
+                self._waits += 1
+            if not self._cond.wait_for(lambda: self._idle, timeout=timeout):
+                self._timeouts += 1
+                raise TimeoutError(
+                    f'No idle TFLite interpreter available after '
+                    f'{timeout} seconds. Pool size: {self.size}')
+            now = time.monotonic()
+            wait_time = now - start_time
+            self._wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+            interpreter = self._idle.pop()
+            self._busy_since[id(interpreter)] = now
+            self._checkouts += 1
+            self._peak_in_use = max(self._peak_in_use,
+                                    len(self._busy_since))
+            return interpreter
+
+    def checkin(self, interpreter=None):
+        """Return a previously checked out interpreter to the pool."""
+        assert interpreter is not None
+        with self._cond:
+            busy_since = self._busy_since.pop(id(interpreter), None)
+            assert busy_since is not None, \
+                'Interpreter was not checked out from this pool.'
+            self._busy_time += time.monotonic() - busy_since
+            self._idle.append(interpreter)
+            self._cond.notify()
+
+    @contextmanager
+    def interpreter(self, timeout=None):
+        """Context manager that checks out an interpreter and returns it
+        to the pool on exit."""
+        interpreter = self.checkout(timeout=timeout)
+        try:
+            yield interpreter
+        finally:
+            self.checkin(interpreter)
+
+    def stats(self):
+        """Return pool utilization statistics.
+
+        :Returns:
+        -------
+        dict
+            size: number of interpreters in the pool
+            in_use: interpreters currently checked out
+            peak_in_use: max number of interpreters checked out at once
+            checkouts: total number of checkouts
+            waits: checkouts that had to wait for an idle interpreter
+            timeouts: checkouts that gave up waiting
+            avg_wait_time: average wait time per checkout in seconds
+            max_wait_time: longest wait time in seconds
+            utilization: share of pool capacity used since pool creation
+        """
+        with self._cond:
+            now = time.monotonic()
+            busy_time = self._busy_time + \
+                sum(now - t for t in self._busy_since.values())
+            elapsed = max(now - self._start_time, 1e-9)
+            return {
+                'size': self.size,
+                'in_use': len(self._busy_since),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'avg_wait_time':
+                    self._wait_time / self._checkouts
+                    if self._checkouts else 0.0,
+                'max_wait_time': self._max_wait_time,
+                'utilization': busy_time / (elapsed * self.size),
+            }
+
+
 class TFInferenceEngine:
     """Thin wrapper around TFLite Interpreter.
 
@@ -35,12 +253,25 @@ class TFInferenceEngine:
 
     It dynamically detects if EdgeTPU is available and uses it.
     Otherwise falls back to TFLite Runtime.
+
+    With pool_size > 1 the engine keeps a pool of interpreters
+    for the same model so that multiple threads can run inferences
+    concurrently. See :func:`interpreter`.
     """
 
     def __init__(self,
                  model=None,
                  labels=None,
                  confidence_threshold=0.8,
+                 pool_size=1,
+                 pool_timeout=None,
+                 model_registry=None,
+                 num_threads=None,
+                 cpu_delegate='xnnpack',
+                 autotune=False,
+                 autotune_threads=None,
+                 autotune_cache=DEFAULT_AUTOTUNE_CACHE,
+                 delegates=None,
                  **kwargs
                  ):
         """Create an instance of Tensorflow inference engine.
@@ -58,7 +289,38 @@ class TFInferenceEngine:
             Location of file with model labels.
         confidence_threshold : float
             Inference confidence threshold.
-        
+        pool_size : int
+            Number of interpreters to pre-allocate for concurrent
+            inference.
+        pool_timeout : float
+            Max time in seconds to wait for an idle interpreter.
+            None means wait indefinitely.
+        model_registry : ModelRegistry
+            Registry that holds model files in memory.
+            Defaults to the process-wide registry so that each model file
+            is read once and shared by all engines and interpreters.
+        num_threads : int
+            Number of threads for the TFLite CPU runtime.
+            None leaves the choice to the runtime.
+        cpu_delegate : string
+            'xnnpack' to accelerate the CPU runtime with the XNNPACK
+            delegate, None to use the reference TFLite kernels.
+        autotune : bool
+            If True and num_threads is not set, time a few inferences
+            at each candidate thread count and use the fastest one.
+            Not applicable to EdgeTPU.
+        autotune_threads : list
+            Candidate thread counts. Defaults to powers of two up to
+            the number of CPUs.
+        autotune_cache : string
+            Location of the file where autotune results are cached,
+            keyed by model hash and CPU signature. None disables caching.
+        delegates : list
+            Additional TFLite delegate libraries to load for each
+            interpreter, e.g. POSENET_DECODER_LIBRARY, which provides
+            the custom op of PoseNet models with a built-in pose decoder.
+            Libraries that fail to load are skipped with a warning.
+
         """
         assert model
         assert model['tflite'], 'TFLite AI model path required.'
@@ -95,18 +357,193 @@ class TFInferenceEngine:
 #        module_object = import_module('edgetpu.detection.engine',
 #                                      packaage=edgetpu_class)
 #        target_class = getattr(module_object, edgetpu_class)
-        self._tf_interpreter = _get_edgetpu_interpreter(model=model_edgetpu)
-        if not self._tf_interpreter:
-            log.debug('EdgeTPU not available. Will use TFLite CPU runtime.')
-            self._tf_interpreter = Interpreter(model_path=model_tflite)
-        assert self._tf_interpreter
-        self._tf_interpreter.allocate_tensors()
+        if model_registry is None:
+            model_registry = get_model_registry()
+        self._model_registry = model_registry
+        # the process-wide import is not part of the engine allocation
+        _tflite()
+        start_time = time.perf_counter()
+        self._cpu_options = _cpu_op_resolver_options(cpu_delegate)
+        autotune_time = 0.0
+        self._cpu_delegate = cpu_delegate
+        self._num_threads = num_threads
+        self._delegates = list(delegates or ())
+        self._uses_edgetpu = False
+        # current input batch size of interpreters with resized inputs
+        self._batch_sizes = {}
+        assert pool_size >= 1, 'Interpreter pool size must be at least 1.'
+        interpreters = [self._create_interpreter()]
+        if autotune and num_threads is None and not self._uses_edgetpu:
+            autotune_start_time = time.perf_counter()
+            self._num_threads = tune_num_threads(
+                create_interpreter=self._create_cpu_interpreter,
+                model_hash=self._model_registry.get(model_tflite).sha256,
+                cpu_delegate=cpu_delegate,
+                candidates=autotune_threads,
+                cache_path=autotune_cache)
+            autotune_time = time.perf_counter() - autotune_start_time
+            interpreters = [self._create_interpreter()]
+        interpreters += [self._create_interpreter()
+                         for _ in range(pool_size - 1)]
+        # startup costs in seconds
+        self._startup_timings = {
+            'import': _tflite_import_time,
+            'autotune': autotune_time,
+            'allocate': time.perf_counter() - start_time - autotune_time
+        }
+        self._pool = InterpreterPool(interpreters, timeout=pool_timeout)
+        self._tf_interpreter = interpreters[0]
+        # interpreter of the single threaded API, apart from the pool,
+        # created on first use
+        self._legacy_interpreter = None
+        self._legacy_lock = threading.Lock()
         # check the type of the input tensor
         self._tf_input_details = self._tf_interpreter.get_input_details()
         self._tf_output_details = self._tf_interpreter.get_output_details()
         self._tf_is_quantized_model = \
             self.input_details[0]['dtype'] != np.float32
 
+    def _create_cpu_interpreter(self, num_threads=None):
+        tf_interpreter = _tflite().Interpreter(
+            model_content=self._model_registry.get_model_content(
+                self._model_tflite_path),
+            num_threads=num_threads,
+            experimental_delegates=_load_delegates(self._delegates) or None,
+            **self._cpu_options)
+        tf_interpreter.allocate_tensors()
+        return tf_interpreter
+
+    def _create_interpreter(self):
+        tf_interpreter = _get_edgetpu_interpreter(
+            model=self._model_edgetpu_path,
+            registry=self._model_registry,
+            delegates=self._delegates)
+        if tf_interpreter:
+            self._uses_edgetpu = True
+            tf_interpreter.allocate_tensors()
+        else:
+            log.debug('EdgeTPU not available. Will use TFLite CPU runtime.')
+            tf_interpreter = self._create_cpu_interpreter(
+                num_threads=self._num_threads)
+        assert tf_interpreter
+        return tf_interpreter
+
+    @property
+    def startup_timings(self):
+        """Wall-clock seconds spent in each engine startup stage.
+
+        import: loading the TFLite runtime. Paid once per process by
+            the first engine and reported the same by every engine,
+            see :func:`tflite_import_time`. Not included in allocate.
+        autotune: searching for the fastest thread count
+        allocate: creating interpreters and allocating tensors
+        warmup: first invokes of all interpreters, see :func:`warmup`
+        """
+        return dict(self._startup_timings)
+
+    def warmup(self, runs=1):
+        """Invoke every pooled interpreter on blank input.
+
+        The first invokes of a TFLite interpreter are much slower than
+        the following ones. Running them ahead of time keeps that latency
+        away from the first real frames.
+
+        :Returns:
+        -------
+        float
+            Warm-up time in seconds.
+        """
+        start_time = time.perf_counter()
+        details = self.input_details[0]
+        # check out all interpreters to make sure each one is warmed up
+        interpreters = [self._pool.checkout() for _ in range(self.pool_size)]
+        try:
+            for interpreter in interpreters:
+                self.resize_input_batch(interpreter, 1)
+                interpreter.set_tensor(
+                    details['index'],
+                    np.zeros(details['shape'], details['dtype']))
+                for _ in range(runs):
+                    interpreter.invoke()
+        finally:
+            for interpreter in interpreters:
+                self._pool.checkin(interpreter)
+        warmup_time = time.perf_counter() - start_time
+        self._startup_timings['warmup'] = warmup_time
+        return warmup_time
+
+    @property
+    def num_threads(self):
+        """Number of CPU runtime threads. None if left to the runtime."""
+        return self._num_threads
+
+    @property
+    def cpu_delegate(self):
+        return self._cpu_delegate
+
+    @property
+    def pool_size(self):
+        return self._pool.size
+
+    @property
+    def pool_stats(self):
+        """Interpreter pool utilization statistics.
+
+        See :func:`InterpreterPool.stats`.
+        """
+        return self._pool.stats()
+
+    def interpreter(self, timeout=None):
+        """Check out an interpreter for exclusive use by the caller.
+
+        Use as a context manager. The interpreter is returned to the pool
+        on exit:
+
+            with tfengine.interpreter() as interpreter:
+                interpreter.set_tensor(...)
+                interpreter.invoke()
+
+        :Parameters:
+        ----------
+        timeout : float
+            Max time in seconds to wait for an idle interpreter.
+            Defaults to the engine pool_timeout.
+        """
+        return self._pool.interpreter(timeout=timeout)
+
+    def resize_input_batch(self, interpreter=None, batch_size=1):
+        """Resize the input tensor of an interpreter to hold batch_size
+        frames.
+
+        No-op if the interpreter already has the requested batch size.
+        The interpreter must be checked out by the caller.
+        Tensors are re-allocated on resize.
+
+        :Raises:
+        -------
+        ValueError, RuntimeError
+            If the model graph does not support the batch size.
+        """
+        assert interpreter is not None
+        assert batch_size >= 1
+        if self._batch_sizes.get(id(interpreter), 1) == batch_size:
+            return
+        details = self.input_details[0]
+        shape = list(details['shape'])
+        shape[0] = batch_size
+        try:
+            interpreter.resize_tensor_input(details['index'], shape)
+            interpreter.allocate_tensors()
+        except (ValueError, RuntimeError):
+            # restore the original input shape
+            # so that the interpreter remains usable
+            interpreter.resize_tensor_input(details['index'],
+                                            details['shape'])
+            interpreter.allocate_tensors()
+            self._batch_sizes.pop(id(interpreter), None)
+            raise
+        self._batch_sizes[id(interpreter)] = batch_size
+
     @property
     def input_details(self):
         return self._tf_input_details
@@ -134,17 +571,30 @@ class TFInferenceEngine:
         """
         return self._confidence_threshold
 
-    
+    def _default_interpreter(self):
+        """Interpreter of the single threaded API.
+
+        Held by the engine for its lifetime apart from the pool,
+        so that a set_tensor, infer and get_tensor sequence runs
+        on one interpreter that pooled callers never use.
+        Like a TFLite Interpreter, the single threaded API is not safe
+        to call from several threads at once, see :func:`interpreter`.
+        """
+        with self._legacy_lock:
+            if self._legacy_interpreter is None:
+                self._legacy_interpreter = self._create_interpreter()
+            return self._legacy_interpreter
+
     def infer(self):
         """Invoke model inference on current input tensor."""
-        return self._tf_interpreter.invoke()
+        return self._default_interpreter().invoke()
 
     def set_tensor(self, index=None, tensor_data=None):
         """Set tensor data at given reference index."""
         assert isinstance(index, int)
-        self._tf_interpreter.set_tensor(index, tensor_data)
+        self._default_interpreter().set_tensor(index, tensor_data)
 
     def get_tensor(self, index=None):
         """Return tensor data at given reference index."""
         assert isinstance(index, int)
-        return self._tf_interpreter.get_tensor(index)
+        return self._default_interpreter().get_tensor(index)
@@ -0,0 +1,141 @@
+"""Process-wide registry of TFLite AI model files loaded in memory."""
+import hashlib
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class LoadedModel:
+    """Immutable in-memory TFLite model flatbuffer of a model file
+    and the delegate it is used with.
+
+    Models with the same content share one content buffer.
+    """
+    __slots__ = ['path', 'delegate', 'content', 'sha256']
+
+    def __init__(self, path, delegate, content, sha256):
+        self.path = path
+        self.delegate = delegate
+        self.content = content
+        # hex digest of the model content
+        self.sha256 = sha256
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def __repr__(self):
+        return 'LoadedModel(<{}>, {}, {} bytes)'.format(
+            self.path, self.delegate, self.size)
+
+
+class ModelRegistry:
+    """Loads each model file once per process.
+
+    TFLite interpreters created with `model_content` keep a reference
+    to the buffer instead of copying it. Handing the same read-only bytes
+    object to every interpreter of a model saves disk reads and parsing
+    on detector startup and keeps resident memory flat as more
+    detectors and pooled interpreters are added.
+
+    Model content is kept once per content hash, so the same file used
+    with several delegates, or copies of a file, are held in memory once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (path, delegate) -> LoadedModel
+        self._models = {}
+        # content sha256 -> model flatbuffer bytes
+        self._contents = {}
+        self._loads = 0
+        self._hits = 0
+
+    @staticmethod
+    def _key(model_path, delegate):
+        return (os.path.realpath(model_path), delegate)
+
+    def get(self, model_path=None, delegate=None):
+        """Return the loaded model for a model path and delegate.
+
+        :Parameters:
+        ----------
+        model_path : string
+            Location of the TFLite model file.
+        delegate : string
+            Name of the delegate the model is compiled for,
+            e.g. 'edgetpu'. None for the CPU runtime.
+        :Returns:
+        -------
+        LoadedModel
+            Shared in-memory model.
+        """
+        assert model_path
+        key = self._key(model_path, delegate)
+        with self._lock:
+            model = self._models.get(key, None)
+            if model:
+                self._hits += 1
+                return model
+            with open(key[0], 'rb') as model_file:
+                content = model_file.read()
+            sha256 = hashlib.sha256(content).hexdigest()
+            content = self._contents.setdefault(sha256, content)
+            model = LoadedModel(key[0], delegate, content, sha256)
+            self._models[key] = model
+            self._loads += 1
+            log.debug('Loaded AI model in registry: %r', model)
+            return model
+
+    def get_model_content(self, model_path=None, delegate=None):
+        """Return the shared flatbuffer bytes for a model file."""
+        return self.get(model_path=model_path, delegate=delegate).content
+
+    def evict(self, model_path=None, delegate=None):
+        """Remove a model from the registry.
+
+        Interpreters already created from it keep their own reference
+        to the model content.
+        """
+        with self._lock:
+            model = self._models.pop(self._key(model_path, delegate), None)
+            if model and not any(other.sha256 == model.sha256
+                                 for other in self._models.values()):
+                del self._contents[model.sha256]
+
+    def clear(self):
+        """Remove all models from the registry."""
+        with self._lock:
+            self._models.clear()
+            self._contents.clear()
+
+    def stats(self):
+        """Return registry statistics.
+
+        :Returns:
+        -------
+        dict
+            models: number of model file and delegate pairs
+            contents: number of distinct model contents in memory
+            bytes: total size of the model contents in memory
+            loads: number of model file reads
+            hits: number of requests served from memory
+        """
+        with self._lock:
+            return {
+                'models': len(self._models),
+                'contents': len(self._contents),
+                'bytes': sum(len(c) for c in self._contents.values()),
+                'loads': self._loads,
+                'hits': self._hits,
+            }
+
+
+_model_registry = ModelRegistry()
+
+
+def get_model_registry():
+    """Return the process-wide model registry."""
+    return _model_registry
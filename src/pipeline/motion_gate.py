@@ -0,0 +1,106 @@
+"""Skip pose detection on frames that did not change."""
+import logging
+import numpy as np
+from PIL import Image
+from src.pipeline.pose_base import fit_size
+
+log = logging.getLogger(__name__)
+
+
+class MotionGate:
+    """Frame difference test between a frame and the last frame
+    pose detection ran on.
+
+    Both frames are compared as tiny grayscale thumbnails. A frame counts
+    as changed when enough thumbnail pixels changed by more than sensor
+    noise. Comparing with the last detected frame rather than the previous
+    frame also catches changes too slow to show between two frames.
+    Detection runs at least every max_skip_interval seconds
+    regardless of motion.
+    """
+
+    def __init__(self,
+                 size=(64, 64),
+                 pixel_threshold=25,
+                 threshold=0.005,
+                 max_skip_interval=5.0
+                 ):
+        """
+        :Parameters:
+        ----------
+        size : (width, height)
+            Size the grayscale thumbnails fit in.
+        pixel_threshold : int
+            Minimum change of a thumbnail pixel gray level, out of 255,
+            to count as changed.
+        threshold : float
+            Minimum fraction of changed thumbnail pixels for a frame
+            to count as changed.
+        max_skip_interval : float
+            Maximum seconds between two frames pose detection runs on.
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.threshold = threshold
+        self.max_skip_interval = max_skip_interval
+        # frames skipped in total and since pose detection last ran
+        self.skipped = 0
+        self.consecutive_skipped = 0
+        # fraction of changed pixels of the last frame checked
+        self.score = None
+        self.reset()
+
+    def reset(self):
+        """Forget the reference frame, so the next frame is detected."""
+        self._reference = None
+        self._reference_time = None
+
+    def _grayscale(self, image):
+        """Tiny grayscale thumbnail of an image as an int16 array."""
+        size = fit_size(image.size, self.size)
+        if not isinstance(image, Image.Image):
+            # EncodedImage, YuvImage or ArrayImage
+            image = image.decode(fit_size=size, reducing_gap=1.0)
+        factor = max(1, min(image.width // size[0],
+                            image.height // size[1]))
+        if factor > 1:
+            image = image.reduce(factor)
+        image = image.convert('L')
+        if image.size != size:
+            image = image.resize(size, Image.BOX)
+        return np.asarray(image, np.int16)
+
+    def check(self, image, now):
+        """Whether pose detection has to run on an image.
+
+        :Parameters:
+        ----------
+        image : PIL.Image or EncodedImage or YuvImage or ArrayImage
+            Input frame.
+        now : float
+            Frame time in seconds, time.monotonic().
+        :Returns:
+        -------
+        bool
+            True if the frame changed since the last detected frame or
+            max_skip_interval passed, False if it can be skipped.
+        """
+        gray = self._grayscale(image)
+        self.score = None
+        changed = True
+        if self._reference is not None and \
+           gray.shape == self._reference.shape:
+            diff = np.abs(gray - self._reference) > self.pixel_threshold
+            self.score = np.count_nonzero(diff) / diff.size
+            changed = self.score >= self.threshold or \
+                now - self._reference_time >= self.max_skip_interval
+        if changed:
+            self._reference = gray
+            self._reference_time = now
+            self.consecutive_skipped = 0
+        else:
+            self.skipped += 1
+            self.consecutive_skipped += 1
+            log.debug('Skipping static frame. Changed pixels: %.4f',
+                      self.score)
+        return changed
@@ -1,11 +1,18 @@
-from src.pipeline.pose_base import AbstractPoseModel
+from src.pipeline.pose_base import AbstractPoseModel, sort_by_score
 import numpy as np
-import time
+
+# MoveNet MultiPose detections are 17 (y, x, score) keypoints
+# followed by a (ymin, xmin, ymax, xmax) box and the detection score
+MULTIPOSE_KEYPOINTS = 17 * 3
+MULTIPOSE_SCORE = 55
 
 
 class Movenet(AbstractPoseModel):
     '''The class for pose estimation using Movenet implementation.'''
 
+    # minimum detection score of a MoveNet MultiPose person
+    min_pose_score = 0.2
+
     def __init__(self, tfengine):
         super().__init__(tfengine)
 
@@ -13,77 +20,34 @@ class Movenet(AbstractPoseModel):
     def parse_output(self, keypoints_with_scores, height, width):
         '''
             Parse Output of TFLite model and get keypoints with score.
+
+            Single pose models output [1, 1, 17, 3] keypoints scored with
+            their average keypoint score, MultiPose models [1, 6, 56]
+            detections of which the ones scoring at least min_pose_score
+            are kept. Returns (people, 17, 3) keypoints in input tensor
+            coordinates and the score of each person.
         '''
-    
-        keypoints_all = []
-        num_instances, _, _, _ = keypoints_with_scores.shape
-        
-        for idx in range(num_instances):
-            
-            kpts_y = keypoints_with_scores[0, idx, :, 1]
-            kpts_x = keypoints_with_scores[0, idx, :, 0]
-            
-            kpts_scores = keypoints_with_scores[0, idx, :, 2]
-            
-            kpts_absolute_xy = np.stack([width * np.array(kpts_x), height * np.array(kpts_y), kpts_scores], axis=-1)
-            keypoints_all.append(kpts_absolute_xy)
-            
-        if keypoints_all:
-            keypoints_xy = np.concatenate(keypoints_all, axis=0)
+        if keypoints_with_scores.ndim == 4:
+            kps = keypoints_with_scores.reshape(-1, 17, 3)
+            scores = kps[..., 2].mean(axis=-1)
         else:
-            keypoints_xy = np.zeros((0, 17, 2))
-
-        return keypoints_xy
+            detections = keypoints_with_scores.reshape(
+                -1, keypoints_with_scores.shape[-1])
+            detections = detections[
+                detections[:, MULTIPOSE_SCORE] >= self.min_pose_score]
+            kps = detections[:, :MULTIPOSE_KEYPOINTS].reshape(-1, 17, 3)
+            scores = detections[:, MULTIPOSE_SCORE]
+        kps = kps * np.array([height, width, 1], np.float32)
+        return sort_by_score(kps, scores)
 
 
-    def execute_model(self, img):
-        ''' Run TFLite model.
-        
-        :Parameters:
-        ----------
-        img: PIL.Image
-            Input Image for AI model detection.
-        :Returns:
-        -------
-        kps:
-            A list of Pose objects with keypoints and confidence scores
-        template_image: PIL.Image
-            Input resized image.
-        thumbnail: PIL.Image
-            Thumbnail input image
-        _inference_time: float
-            Model inference time in seconds
+    def decode_output(self, interpreter):
         '''
-        
-        _tensor_input_size = (self._tensor_image_width,
-                              self._tensor_image_height)
-
-        # thumbnail is a proportionately resized image
-        thumbnail = self.thumbnail(image=img,
-                                               desired_size=_tensor_input_size)
-        # convert thumbnail into an image with the exact size
-        # as the input tensor preserving proportions by padding with
-        # a solid color as needed
-        template_image = self.resize(image=thumbnail,
-                                desired_size=_tensor_input_size)
-
-        start_time = time.process_time()
-
-        template_input = np.expand_dims(template_image.copy(), axis=0)
-        floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
-
-        if floating_model:
-            template_input = template_input.astype(np.float32)
-            
-        self.tf_interpreter().\
-            set_tensor(self._tfengine.input_details[0]['index'],
-                       template_input)
-        self.tf_interpreter().invoke()
-
-        keypoints_with_scores = self.tf_interpreter().get_tensor(self._tfengine.output_details[0]['index'])
-        kps = self.parse_output(keypoints_with_scores, self._tensor_image_height, self._tensor_image_width)
-
-
-        _inference_time = time.process_time() - start_time
-
-        return kps, template_image, thumbnail, _inference_time
\ No newline at end of file
+            Get keypoints with score for each frame in the input batch.
+        '''
+        keypoints_with_scores = interpreter.get_tensor(
+            self._tfengine.output_details[0]['index'])
+        return [self.parse_output(keypoints_with_scores[i:i+1],
+                                  self._tensor_image_height,
+                                  self._tensor_image_width)
+                for i in range(keypoints_with_scores.shape[0])]
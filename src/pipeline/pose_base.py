@@ -1,15 +1,216 @@
 from abc import ABC, abstractmethod
+from collections import namedtuple
+import math
+import threading
 import numpy as np
-from PIL import ImageOps
+import time
+from PIL import Image, ImageOps
+from src.pipeline.array_image import ArrayImage, YuvImage, as_image
 
 import logging
 log = logging.getLogger(__name__)
 
+
+def write_image_to_tensor(tensor=None, image=None, mean=0.0, std=1.0):
+    """Write image pixels into a preallocated input tensor in place.
+
+    Normalizes pixels for floating point tensors as (pixel - mean) / std
+    without intermediate full frame arrays.
+    :Parameters:
+    ----------
+    tensor : numpy.ndarray
+        Destination of shape (height, width, channels). Typically a view
+        of one batch entry of the interpreter input tensor.
+    image : PIL.Image or numpy.ndarray
+        Source pixels of the same height and width as the tensor.
+    mean : float
+        Value subtracted from each pixel for floating point tensors.
+    std : float
+        Value each pixel is divided by for floating point tensors.
+    """
+    assert tensor is not None
+    assert image is not None
+    pixels = np.asarray(image)
+    if np.issubdtype(tensor.dtype, np.floating):
+        np.subtract(pixels, mean, out=tensor, dtype=tensor.dtype,
+                    casting='unsafe')
+        if std != 1.0:
+            np.multiply(tensor, 1.0 / std, out=tensor, dtype=tensor.dtype)
+    else:
+        np.copyto(tensor, pixels, casting='unsafe')
+
+
+# resampling filters for input image downscaling,
+# from fastest and lowest quality to slowest and highest quality
+RESAMPLING = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+}
+
+# Placement of a source image in a model input tensor.
+# thumbnail: the resized source image without padding.
+# scale: (x, y) factors from source image to tensor coordinates.
+# offset: (x, y) position of the thumbnail in the tensor.
+# Source coordinates are (tensor coordinates - offset) / scale.
+Letterbox = namedtuple('Letterbox', ['thumbnail', 'scale', 'offset'])
+
+
+def fit_size(image_size=None, desired_size=None):
+    """Return the largest size with the aspect ratio of image_size
+    that fits in desired_size. Images are never enlarged.
+
+    Same rounding as PIL.Image.thumbnail.
+    """
+    assert image_size
+    assert desired_size
+    width, height = image_size
+    x, y = int(desired_size[0]), int(desired_size[1])
+    if x >= width and y >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(
+            x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def letterbox(image=None, out=None, resample=Image.BICUBIC,
+              reducing_gap=2.0):
+    """Resize an image into a tensor sized pixel buffer in one pass.
+
+    Resizes straight from the source image, without a full resolution copy,
+    preserving the aspect ratio. The resized pixels go to the top left
+    corner of the buffer. The rest of the buffer is set to black.
+    :Parameters:
+    ----------
+    image : PIL.Image or ArrayImage or YuvImage or numpy.ndarray
+        Source image. Not modified. YuvImage frames are converted to RGB
+        after resizing.
+    out : numpy.ndarray
+        uint8 buffer of shape (height, width, 3) to write the result to.
+        Can be reused between calls.
+    resample : int
+        PIL resampling filter. See RESAMPLING.
+    reducing_gap : float
+        Resize in two steps, a fast integer reduction first and
+        then resampling of the last reducing_gap times the target size.
+        None resamples the full source image, which is slowest.
+    :Returns:
+    -------
+    Letterbox
+        Thumbnail image and coordinate mapping of the source image.
+    """
+    assert image is not None
+    assert out is not None
+    height, width = out.shape[:2]
+    # an array is read into a new image the thumbnail can be
+    private = not isinstance(image, (Image.Image, ArrayImage, YuvImage))
+    if not isinstance(image, YuvImage):
+        # YUV frames are converted to RGB after resizing
+        image = as_image(image)
+    size = fit_size(image.size, (width, height))
+    if size == image.size and not isinstance(image, YuvImage):
+        # callers may draw on the thumbnail
+        thumbnail = image if private else image.copy()
+    else:
+        thumbnail = image.resize(size, resample, reducing_gap=reducing_gap)
+    if thumbnail.mode != 'RGB':
+        thumbnail = thumbnail.convert('RGB')
+    tw, th = size
+    out[:th, :tw] = np.asarray(thumbnail)
+    # padding is only as large as the thumbnail size allows
+    out[:th, tw:] = 0
+    out[th:] = 0
+    scale = (tw / image.size[0], th / image.size[1])
+    return Letterbox(thumbnail, scale, (0, 0))
+
+
+def pad_to_size(thumbnail=None, size=None):
+    """Model input image of a letterbox thumbnail.
+
+    :Parameters:
+    ----------
+    thumbnail : PIL.Image
+        Thumbnail of a :func:`letterbox` result.
+    size : (width, height)
+        Input tensor size.
+    :Returns:
+    -------
+    PIL.Image
+        RGB image of the input tensor size with the thumbnail
+        in the top left corner and black padding.
+    """
+    assert thumbnail is not None
+    assert size
+    image = Image.new('RGB', tuple(size))
+    image.paste(thumbnail, (0, 0))
+    return image
+
+
+def sort_by_score(kps, scores):
+    """Keypoints and scores of several people, best scoring person first.
+
+    :Parameters:
+    ----------
+    kps : numpy.ndarray
+        Keypoints of shape (people, keypoints, 3), (y, x, score) each.
+    scores : numpy.ndarray
+        Score of each person, shape (people,).
+    :Returns:
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        float32 keypoints and scores in descending score order.
+    """
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    return (np.asarray(kps, np.float32)[order],
+            np.asarray(scores, np.float32)[order])
+
+
+def add_timing(timings=None, stage=None, start_time=None):
+    """Add the wall-clock time elapsed since start_time to a stage
+    in a timings dict.
+
+    :Parameters:
+    ----------
+    timings : dict
+        Stage name to seconds. Nothing is recorded if None.
+    stage : string
+        Name of the stage.
+    start_time : float
+        Stage start time as returned by time.perf_counter().
+    :Returns:
+    -------
+    float
+        Current time, to be used as start time of the next stage.
+    """
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - start_time
+    return now
+
+
 class AbstractPoseModel(ABC):
     """
         Abstract class for pose estimation models.
     """
 
+    # normalization of pixel values for floating point input tensors
+    input_mean = 0.0
+    input_std = 1.0
+
+    # input image downscaling filter, see RESAMPLING
+    resample = Image.BICUBIC
+    # see :func:`letterbox`
+    reducing_gap = 2.0
+
     def __init__(self, tfengine):
                 
         """Initialize posenet-base class with Tensorflow inference engine.
@@ -26,6 +227,9 @@ class AbstractPoseModel(ABC):
             self.get_input_tensor_shape()
 
         self.confidence_threshold = self._tfengine.confidence_threshold
+        # per thread letterbox buffers for concurrent callers
+        # of a shared pooled engine
+        self._buffers = threading.local()
         log.debug(f"Initializing PoseEngine with confidence threshold \
             {self.confidence_threshold}")
         
@@ -50,13 +254,37 @@ class AbstractPoseModel(ABC):
         return self._tfengine._tf_interpreter
 
 
+    def set_input_tensor(self, interpreter, image, batch_index=0):
+        """Write a model input image straight into the interpreter
+        input tensor buffer.
+
+        Avoids the intermediate copies of `set_tensor`. The tensor view
+        is released before returning, as TFLite does not allow invoke()
+        while references to its internal buffers are held.
+        :Parameters:
+        ----------
+        interpreter : Interpreter
+            TFLite interpreter checked out for the calling thread.
+        image : PIL.Image
+            Image with the exact size of the input tensor.
+        batch_index : int
+            Position of the image in a batched input tensor.
+        """
+        input_tensor = interpreter.tensor(
+            self._tfengine.input_details[0]['index'])
+        write_image_to_tensor(tensor=input_tensor()[batch_index],
+                              image=image,
+                              mean=self.input_mean,
+                              std=self.input_std)
+
+
     def thumbnail(self, image=None, desired_size=None):
         """Resizes original image as close as possible to desired size.
         Preserves aspect ratio of original image.
         Does not modify the original image.
         :Parameters:
         ----------
-        image : PIL.Image
+        image : PIL.Image or ArrayImage or YuvImage or numpy.ndarray
             Input Image for AI model detection.
         desired_size : (width, height)
             Size expected by the AI model.
@@ -65,20 +293,25 @@ class AbstractPoseModel(ABC):
         PIL.Image
             Resized image fitting for the AI model input tensor.
         """
-        assert image
+        assert image is not None
         assert desired_size
-        log.debug('input image size = %r', image.size)
-        thumb = image.copy()
         w, h = desired_size
+        if isinstance(image, YuvImage):
+            # converted to RGB after resizing
+            return image.resize(fit_size(image.size, (w, h)), self.resample,
+                                reducing_gap=self.reducing_gap)
+        private = not isinstance(image, (Image.Image, ArrayImage))
+        image = as_image(image)
+        log.debug('input image size = %r', image.size)
         try:
-            # convert from numpy to native Python int type
-            # that PIL expects
-            if isinstance(w, np.generic):
-                w = w.item()
-                w = int(w)
-                h = h.item()
-                h = int(h)
-            thumb.thumbnail((w, h))
+            # resize straight from the original image, same as
+            # :func:`letterbox`, rather than from a full size copy
+            size = fit_size(image.size, (w, h))
+            if size == image.size:
+                thumb = image if private else image.copy()
+            else:
+                thumb = image.resize(size, self.resample,
+                                     reducing_gap=self.reducing_gap)
         except Exception as e:
             msg = (f"Exception in "
                    f"PIL.image.thumbnail(desired_size={desired_size}):"
@@ -124,8 +357,171 @@ class AbstractPoseModel(ABC):
         return new_im
 
 
+    def letterbox(self, img):
+        """Fit an input image into the model input tensor size in one pass.
+
+        :Parameters:
+        ----------
+        img: PIL.Image or ArrayImage or YuvImage or numpy.ndarray
+            Input Image for AI model detection.
+        :Returns:
+        -------
+        pixels: numpy.ndarray
+            Input tensor sized pixels. A buffer reused by the next call
+            from the same thread.
+        letterbox: Letterbox
+            Thumbnail and mapping between input image and tensor coordinates.
+        """
+        pixels = getattr(self._buffers, 'pixels', None)
+        if pixels is None:
+            pixels = np.zeros((self._tensor_image_height,
+                               self._tensor_image_width, 3), np.uint8)
+            self._buffers.pixels = pixels
+        box = letterbox(image=img, out=pixels, resample=self.resample,
+                        reducing_gap=self.reducing_gap)
+        return pixels, box
+
+
+    def preprocess(self, img):
+        """Fit an input image into the model input tensor size.
+
+        :Parameters:
+        ----------
+        img: PIL.Image or ArrayImage or YuvImage or numpy.ndarray
+            Input Image for AI model detection.
+        :Returns:
+        -------
+        template_image: PIL.Image
+            Image with the exact size of the input tensor.
+        thumbnail: PIL.Image
+            Proportionately resized input image without padding.
+        """
+        pixels, box = self.letterbox(img)
+        template_image = Image.fromarray(pixels)
+        return template_image, box.thumbnail
+
+
     @abstractmethod
-    def execute_model(self, img):
+    def decode_output(self, interpreter):
+        '''
+            Read model output tensors after invoke.
+            Return a list with a (kps, scores) pair for each frame
+            in the input batch: keypoints of shape (people, 17, 3)
+            with (y, x, score) in input tensor coordinates and
+            a score per person, best scoring person first.
+        '''
+
+
+    def execute_model(self, img, timings=None):
+        ''' Run TFLite model.
+
+        :Parameters:
+        ----------
+        img: PIL.Image or ArrayImage or YuvImage or numpy.ndarray
+            Input Image for AI model detection.
+        timings: dict
+            Optional dict to add wall-clock seconds spent in each stage to:
+            preprocess, interpreter_wait, tensor_write, invoke, parse_output.
+        :Returns:
+        -------
+        kps: numpy.ndarray
+            Keypoints with confidence scores of shape (people, 17, 3),
+            see :func:`decode_output`
+        scores: numpy.ndarray
+            Score of each person, best scoring person first
+        template_image: None
+            The input tensor sized image is not built for each frame.
+            Consumers that need it pad the thumbnail, see
+            :func:`pad_to_size`.
+        thumbnail: PIL.Image
+            Thumbnail input image
+        _inference_time: float
+            Model inference wall-clock time in seconds
         '''
-            Execute Pose Estimation Model.
-        '''
\ No newline at end of file
+        t = time.perf_counter()
+        pixels, box = self.letterbox(img)
+        thumbnail = box.thumbnail
+        t = add_timing(timings, 'preprocess', t)
+
+        # check out a dedicated interpreter so that concurrent callers
+        # sharing a pooled engine do not overwrite each other's tensors
+        with self._tfengine.interpreter() as interpreter:
+            start_time = t = add_timing(timings, 'interpreter_wait', t)
+            self._tfengine.resize_input_batch(interpreter, 1)
+            self.set_input_tensor(interpreter, pixels)
+            t = add_timing(timings, 'tensor_write', t)
+            interpreter.invoke()
+            t = add_timing(timings, 'invoke', t)
+            kps, scores = self.decode_output(interpreter)[0]
+        t = add_timing(timings, 'parse_output', t)
+
+        _inference_time = t - start_time
+
+        return kps, scores, None, thumbnail, _inference_time
+
+
+    def execute_batch(self, images, timings=None):
+        ''' Run TFLite model on multiple frames with one invoke.
+
+        Resizes the model input tensor to the number of frames.
+        Falls back to one invoke per frame for models
+        that do not support variable batch size (e.g. EdgeTPU models).
+        :Parameters:
+        ----------
+        images: list of PIL.Image
+            Input Images for AI model detection.
+        timings: dict
+            Optional dict to add wall-clock seconds spent in each stage to.
+            See :func:`execute_model`.
+        :Returns:
+        -------
+        kps_list:
+            Keypoints with confidence scores for each image
+        scores_list:
+            Scores of the people in each image
+        template_images: list of PIL.Image
+            Input resized images. None for models that do not
+            build them, see :func:`execute_model`.
+        thumbnails: list of PIL.Image
+            Thumbnail input images
+        _inference_time: float
+            Model inference wall-clock time for the whole batch in seconds
+        '''
+        assert images
+        t = time.perf_counter()
+        preprocessed = [self.preprocess(img) for img in images]
+        template_images = [template for template, _ in preprocessed]
+        thumbnails = [thumbnail for _, thumbnail in preprocessed]
+        t = add_timing(timings, 'preprocess', t)
+
+        with self._tfengine.interpreter() as interpreter:
+            start_time = t = add_timing(timings, 'interpreter_wait', t)
+            try:
+                self._tfengine.resize_input_batch(interpreter, len(images))
+            except (ValueError, RuntimeError) as e:
+                log.debug('Model does not support batch size %d: %r. '
+                          'Will invoke model once per frame.',
+                          len(images), e)
+                people = []
+                for template_image in template_images:
+                    self.set_input_tensor(interpreter, template_image)
+                    t = add_timing(timings, 'tensor_write', t)
+                    interpreter.invoke()
+                    t = add_timing(timings, 'invoke', t)
+                    people.append(self.decode_output(interpreter)[0])
+                    t = add_timing(timings, 'parse_output', t)
+            else:
+                for i, template_image in enumerate(template_images):
+                    self.set_input_tensor(interpreter, template_image,
+                                          batch_index=i)
+                t = add_timing(timings, 'tensor_write', t)
+                interpreter.invoke()
+                t = add_timing(timings, 'invoke', t)
+                people = self.decode_output(interpreter)
+                t = add_timing(timings, 'parse_output', t)
+
+        _inference_time = t - start_time
+        kps_list = [kps for kps, _ in people]
+        scores_list = [scores for _, scores in people]
+        return kps_list, scores_list, template_images, thumbnails, \
+            _inference_time
\ No newline at end of file
@@ -1,12 +1,10 @@
 from src import DEFAULT_DATA_DIR
+import collections.abc
 import logging
 import time
-from PIL import ImageDraw
 from pathlib import Path
-
-
-from src.pipeline.posenet_model import Posenet_MobileNet
-from src.pipeline.movenet_model import Movenet
+import numpy as np
+from src.pipeline.pose_base import RESAMPLING, add_timing, pad_to_size
 
 log = logging.getLogger(__name__)
 
@@ -30,6 +28,9 @@ KEYPOINTS = (
   'right ankle'
 )
 
+# row of each keypoint in Pose.data
+KEYPOINT_INDEX = {name: index for index, name in enumerate(KEYPOINTS)}
+
 
 class Keypoint:
     __slots__ = ['k', 'yx', 'score']
@@ -43,31 +44,174 @@ class Keypoint:
         return 'Keypoint(<{}>, {}, {})'.format(self.k, self.yx, self.score)
 
 
+class KeypointView:
+    """Keypoint backed by a row of a Pose array.
+
+    yx is a writable view of the x and y coordinates, so updates of
+    either the view or the pose array are seen by both.
+    """
+    __slots__ = ['_data', '_index']
+
+    def __init__(self, data, index):
+        self._data = data
+        self._index = index
+
+    @property
+    def k(self):
+        return KEYPOINTS[self._index]
+
+    @property
+    def yx(self):
+        return self._data[self._index, :2]
+
+    @yx.setter
+    def yx(self, value):
+        self._data[self._index, :2] = value
+
+    @property
+    def score(self):
+        return float(self._data[self._index, 2])
+
+    @score.setter
+    def score(self, value):
+        self._data[self._index, 2] = value
+
+    def __repr__(self):
+        return 'Keypoint(<{}>, {}, {})'.format(self.k, self.yx.tolist(),
+                                               self.score)
+
+
+class PoseKeypoints(collections.abc.Mapping):
+    """Read only mapping of keypoint names to the KeypointView
+    of each row of a Pose array, in KEYPOINTS order."""
+    __slots__ = ['_data']
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, name):
+        return KeypointView(self._data, KEYPOINT_INDEX[name])
+
+    def __iter__(self):
+        return iter(KEYPOINTS)
+
+    def __len__(self):
+        return len(KEYPOINTS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 class Pose:
-    __slots__ = ['keypoints', 'score']
+    """Keypoints of a person.
+
+    The keypoints are kept in a (17, 3) float32 array, data, with the
+    x and y image coordinates and the score of each keypoint in
+    KEYPOINTS order, see KEYPOINT_INDEX. keypoints offers named views
+    of the array rows.
+    """
+    __slots__ = ['data', 'score']
 
     def __init__(self, keypoints, score=None):
-        assert len(keypoints) == len(KEYPOINTS)
-        self.keypoints = keypoints
+        """
+        :Parameters:
+        ----------
+        keypoints : numpy.ndarray or dict
+            Array of shape (17, 3), used without a copy if it is float32,
+            or a dict of keypoint names to Keypoint objects.
+        score : float
+            Score of the person.
+        """
+        if isinstance(keypoints, dict):
+            assert len(keypoints) == len(KEYPOINTS)
+            keypoints = [(*keypoints[name].yx, keypoints[name].score)
+                         for name in KEYPOINTS]
+        self.data = np.asarray(keypoints, np.float32)
+        assert self.data.shape == (len(KEYPOINTS), 3)
         self.score = score
 
+    @property
+    def keypoints(self):
+        return PoseKeypoints(self.data)
+
+    def transform(self, matrix):
+        """Map the keypoint coordinates with a 3x3 affine matrix, in place.
+
+        Named views of the keypoints see the mapped coordinates.
+        """
+        matrix = np.asarray(matrix, np.float32)
+        self.data[:, :2] = self.data[:, :2] @ matrix[:2, :2].T + matrix[:2, 2]
+
     def __repr__(self):
         return 'Pose({}, {})'.format(self.keypoints, self.score)
 
 
+def create_pose_model(tfengine=None, model_name=None, resample=None,
+                      max_poses=None):
+    """Create the pose estimation model implementation for a model name.
+
+    :Parameters:
+    ----------
+    tfengine : TFInferenceEngine
+        Initialized inference engine with the model loaded.
+    model_name : string
+        'movenet' or 'mobilenet'. PoseNet models with a built-in
+        pose decoder are recognized by their output tensors.
+    resample : string
+        Input image downscaling filter name, e.g. 'bilinear'.
+        See pose_base.RESAMPLING. Defaults to 'bicubic'.
+    max_poses : int
+        Maximum number of people PoseNet models decode per frame.
+        More than one decodes multi-pose models for multiple people.
+        None keeps the model default, one person for PoseNet models
+        decoded in Python and all decoded poses for models with a
+        built-in decoder. MoveNet models decode the people their
+        output has room for.
+    """
+    assert tfengine is not None
+    assert model_name is not None
+
+    if model_name == 'movenet':
+        # pose model modules are imported on demand
+        # to keep package import time low
+        from src.pipeline.movenet_model import Movenet
+        model = Movenet(tfengine)
+    elif model_name == 'mobilenet':
+        from src.pipeline.posenet_model import Posenet_MobileNet, \
+            Posenet_MobileNet_Decoder, has_decoder_outputs
+        if has_decoder_outputs(tfengine.output_details):
+            model = Posenet_MobileNet_Decoder(tfengine)
+        else:
+            model = Posenet_MobileNet(tfengine)
+    else:
+        raise ValueError('Unsupported pose model name: {}'.format(model_name))
+    if resample:
+        model.resample = RESAMPLING[resample]
+    if max_poses is not None and model_name == 'mobilenet':
+        model.max_poses = max_poses
+    return model
+
+
 class PoseEngine():
     """Engine used for pose tasks."""
-    def __init__(self, tfengine=None, model_name=None, context=None):
+
+    # detect_poses returns keypoints in model thumbnail coordinates
+    source_coordinates = False
+
+    def __init__(self, tfengine=None, model_name=None, context=None,
+                 model=None, resample=None, max_poses=None):
         """Creates a PoseEngine wrapper around an initialized tfengine.
-        """
 
-        assert tfengine is not None
-        assert model_name is not None
+        Alternatively takes a ready to use pose model implementation
+        such as a PoseProcessPool. See :func:`create_pose_model`
+        for resample and max_poses.
+        """
 
-        if model_name == 'movenet':
-            self._model = Movenet(tfengine)
-        elif model_name == 'mobilenet':
-            self._model = Posenet_MobileNet(tfengine)
+        if model is None:
+            model = create_pose_model(tfengine, model_name,
+                                      resample=resample,
+                                      max_poses=max_poses)
+        self._model = model
         
         if context:
             self._sys_data_dir = context.data_dir
@@ -84,6 +228,7 @@ class PoseEngine():
     def draw_kps(self, kps, template_image):
 
         pil_im = template_image
+        from PIL import ImageDraw
         draw = ImageDraw.Draw(pil_im)
         
         leftShoulder = False
@@ -123,61 +268,166 @@ class PoseEngine():
         return pil_im, scoreList
 
 
+    def begin_frame(self, queue_depth=0):
+        """Called before the pose detections of a frame.
+        Used by engines that adapt to load."""
+        pass
+
+    def end_frame(self):
+        """Called after the pose detections of a frame.
+        Returns model selection metadata or None."""
+        return None
+
+    def thumbnail(self, img):
+        """Resize an image to fit the model input tensor,
+        preserving aspect ratio. Same as the thumbnail
+        returned by :func:`detect_poses`."""
+        return self._model.thumbnail(
+            image=img,
+            desired_size=(self._tensor_image_width,
+                          self._tensor_image_height))
+
+    def _template_image(self, template_image, thumbnail):
+        """Model input image, padded from the thumbnail
+        if the model did not return it."""
+        if template_image is None:
+            template_image = pad_to_size(
+                thumbnail,
+                (self._tensor_image_width, self._tensor_image_height))
+        return template_image
+
     def get_result(self, img):
 
-        kps, template_image, thumbnail, _inference_time = self._model.execute_model(img)
-        output_img, scoreList = self.draw_kps(kps, template_image)
+        kps, _, template_image, thumbnail, _inference_time = \
+            self._model.execute_model(img)
+        # the best scoring person
+        kps = kps[0] if len(kps) else np.zeros((len(KEYPOINTS), 3))
+        output_img, scoreList = self.draw_kps(
+            kps, self._template_image(template_image, thumbnail))
 
         return thumbnail, output_img, scoreList, _inference_time
 
 
-    def detect_poses(self, img):
+    def detect_keypoints(self, img, timings=None):
         """
-        Detects poses in a given image.
+        Detects the keypoints of all people in a given image.
         :Parameters:
         ----------
-        img : PIL.Image
+        img : PIL.Image or ArrayImage or numpy.ndarray
             Input Image for AI model detection.
+        timings : dict
+            Optional dict to add wall-clock seconds spent
+            in each processing stage to.
         :Returns:
         -------
-        poses:
-            A list of Pose objects with keypoints and confidence scores
+        numpy.ndarray
+            Keypoints of shape (people, 17, 3) with (y, x, score)
+            in thumbnail coordinates, best scoring person first.
+        numpy.ndarray
+            Score of each person.
         PIL.Image
             Resized image fitting the AI model input tensor.
         """
+        kps, scores, _, thumbnail, _ = self._model.execute_model(
+            img, timings=timings)
+        return kps, scores, thumbnail
 
-        kps, template_image, thumbnail, _ = self._model.execute_model(img)
-        poses = []
 
-        keypoint_dict = {}
-        cnt = 0
-
-        keypoint_count = kps.shape[0]
-        for point_i in range(keypoint_count):
-            x, y = kps[point_i, 1], kps[point_i, 0]
-            prob = kps[point_i, 2]
-
-            if prob > self.confidence_threshold and \
-                0 < y < self._tensor_image_height and \
-                0 < x < self._tensor_image_width:
+    def detect_poses(self, img, timings=None):
+        """
+        Detects poses in a given image.
+        :Parameters:
+        ----------
+        img : PIL.Image or ArrayImage or numpy.ndarray
+            Input Image for AI model detection.
+        timings : dict
+            Optional dict to add wall-clock seconds spent
+            in each processing stage to.
+        :Returns:
+        -------
+        poses:
+            A list of Pose objects with keypoints and confidence scores,
+            one per detected person, best scoring person first.
+            Holds one Pose without keypoints if nobody was detected.
+        PIL.Image
+            Resized image fitting the AI model input tensor.
+        float
+            Share of keypoints of the first pose scoring over
+            the confidence threshold.
+        """
 
-                cnt += 1
-                if log.getEffectiveLevel() <= logging.DEBUG:
-                    # development mode
-                    # draw on image and save it for debugging
-                    draw = ImageDraw.Draw(template_image)
-                    draw.line(((0, 0), (x, y)), fill='blue')
-            else:
-                prob = 0
+        kps, scores, template_image, thumbnail, _ = \
+            self._model.execute_model(img, timings=timings)
+        t = time.perf_counter()
+        poses, pose_score = self._create_poses(kps, scores, template_image,
+                                               thumbnail)
+        add_timing(timings, 'parse_output', t)
+        return poses, thumbnail, pose_score
 
-            keypoint = Keypoint(KEYPOINTS[point_i], [x, y], prob)
-            keypoint_dict[KEYPOINTS[point_i]] = keypoint
 
-        # overall pose score is calculated as the average of all
-        # individual keypoint scores
+    def detect_poses_batch(self, images, timings=None):
+        """
+        Detects poses in multiple images with one model invocation.
+        :Parameters:
+        ----------
+        images : list of PIL.Image
+            Input Images for AI model detection.
+        timings : dict
+            Optional dict to add wall-clock seconds spent
+            in each processing stage to.
+        :Returns:
+        -------
+        list of (poses, thumbnail, pose_score):
+            Same as :func:`detect_poses` for each input image.
+        """
+        kps_list, scores_list, template_images, thumbnails, _ = \
+            self._model.execute_batch(images, timings=timings)
+        t = time.perf_counter()
+        results = []
+        for kps, scores, template_image, thumbnail in zip(kps_list,
+                                                          scores_list,
+                                                          template_images,
+                                                          thumbnails):
+            poses, pose_score = self._create_poses(kps, scores,
+                                                   template_image, thumbnail)
+            results.append((poses, thumbnail, pose_score))
+        add_timing(timings, 'parse_output', t)
+        return results
+
+
+    def _create_poses(self, kps, scores, template_image, thumbnail):
+        """Convert model keypoints of each person to a list of Pose objects
+        and an overall pose score of the first person."""
+        poses = []
+        if not len(kps):
+            # nobody detected
+            kps = np.zeros((1, len(KEYPOINTS), 3), np.float32)
+            scores = np.zeros(1, np.float32)
+        # keypoints inside the model input scoring over the threshold
+        confident = (kps[..., 2] > self.confidence_threshold) & \
+            (kps[..., 0] > 0) & (kps[..., 0] < self._tensor_image_height) & \
+            (kps[..., 1] > 0) & (kps[..., 1] < self._tensor_image_width)
+        # model keypoints are (y, x, score), poses (x, y, score)
+        data = kps[..., [1, 0, 2]].astype(np.float32, copy=False)
+        data[..., 2] = np.where(confident, data[..., 2], 0)
+        for person_data, person_score in zip(data, scores.tolist()):
+            poses.append(Pose(person_data, person_score))
+
+        cnt = int(np.count_nonzero(confident[0]))
+        keypoint_count = confident.shape[1]
+        if cnt > 0 and log.getEffectiveLevel() <= logging.DEBUG:
+            # development mode
+            # draw on image and save it for debugging
+            from PIL import ImageDraw
+            template_image = self._template_image(template_image, thumbnail)
+            draw = ImageDraw.Draw(template_image)
+            for y, x in kps[0, confident[0], :2]:
+                draw.line(((0, 0), (x, y)), fill='blue')
+
+        # overall pose score is calculated as the share of keypoints
+        # scoring over the confidence threshold
         pose_score = cnt/keypoint_count
         log.debug(f"Overall pose score (keypoint score average): {pose_score}")
-        poses.append(Pose(keypoint_dict, pose_score))
         if cnt > 0 and log.getEffectiveLevel() <= logging.DEBUG:
             # development mode
             # save template_image for debugging
@@ -192,4 +442,4 @@ class PoseEngine():
             #                          debug_image_file_name),
             #                     format='JPEG')
             log.debug(f"Debug image saved: {debug_image_file_name}")
-        return poses, thumbnail, pose_score
+        return poses, pose_score
@@ -0,0 +1,188 @@
+"""Follow people across frames by the keypoints of their poses."""
+import collections
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class Track:
+    """A person followed across frames."""
+
+    __slots__ = ['id', 'keypoints', 'last_seen', 'history']
+
+    def __init__(self, track_id, keypoints, now, history_size):
+        self.id = track_id
+        # keypoints of the person in the last frame they were seen in
+        self.keypoints = keypoints
+        self.last_seen = now
+        # per person data of previous frames, oldest first
+        self.history = collections.deque(maxlen=history_size)
+
+    def __repr__(self):
+        return 'Track({}, last_seen={})'.format(self.id, self.last_seen)
+
+
+def keypoint_boxes(kps):
+    """Bounding boxes of the keypoints of each person.
+
+    :Parameters:
+    ----------
+    kps : numpy.ndarray
+        Keypoints of shape (people, keypoints, 3) with two coordinates
+        and a score each. Keypoints scoring 0 are missing.
+    :Returns:
+    -------
+    numpy.ndarray
+        (x0, y0, x1, y1) boxes of shape (people, 4) in the order of the
+        keypoint coordinates. All zeros for people without keypoints.
+    """
+    found = kps[..., 2:] > 0
+    low = np.where(found, kps[..., :2], np.inf).min(axis=-2)
+    high = np.where(found, kps[..., :2], -np.inf).max(axis=-2)
+    boxes = np.concatenate([low, high], axis=-1)
+    boxes[~found.any(axis=(-2, -1))] = 0
+    return boxes
+
+
+def match_cost(track_kps, kps):
+    """Cost of associating each track with each person.
+
+    The average of one minus the keypoint box IoU and the mean distance
+    of the keypoints found in both, relative to the track box diagonal
+    and capped at 1.
+
+    :Parameters:
+    ----------
+    track_kps, kps : numpy.ndarray
+        Keypoints of tracks and people, see :func:`keypoint_boxes`.
+    :Returns:
+    -------
+    numpy.ndarray
+        Costs in [0, 1] of shape (tracks, people).
+    """
+    track_boxes = keypoint_boxes(track_kps)[:, np.newaxis]
+    boxes = keypoint_boxes(kps)[np.newaxis]
+    overlap = np.clip(np.minimum(track_boxes[..., 2:], boxes[..., 2:]) -
+                      np.maximum(track_boxes[..., :2], boxes[..., :2]),
+                      0, None).prod(axis=-1)
+    track_areas = (track_boxes[..., 2:] - track_boxes[..., :2]).prod(axis=-1)
+    areas = (boxes[..., 2:] - boxes[..., :2]).prod(axis=-1)
+    union = track_areas + areas - overlap
+    iou = np.divide(overlap, union, out=np.zeros_like(union),
+                    where=union > 0)
+
+    common = (track_kps[:, np.newaxis, :, 2] > 0) & \
+        (kps[np.newaxis, :, :, 2] > 0)
+    distances = np.linalg.norm(track_kps[:, np.newaxis, :, :2] -
+                               kps[np.newaxis, :, :, :2], axis=-1)
+    diagonals = np.linalg.norm(track_boxes[..., 2:] - track_boxes[..., :2],
+                               axis=-1)
+    distances = np.minimum(distances / np.maximum(diagonals, 1)[..., None], 1)
+    counts = common.sum(axis=-1)
+    distance_cost = np.where(
+        counts > 0,
+        np.where(common, distances, 0).sum(axis=-1) / np.maximum(counts, 1),
+        1)
+    return (1 - iou + distance_cost) / 2
+
+
+def greedy_assignment(cost, max_cost):
+    """Pairs of (row, column) indices of a cost matrix, cheapest first,
+    using each row and column at most once.
+
+    Close to the optimal assignment for the few people in a room,
+    at a fraction of its cost.
+    """
+    rows, cols = set(), set()
+    pairs = []
+    for index in np.argsort(cost, axis=None, kind='stable'):
+        row, col = divmod(int(index), cost.shape[1])
+        if cost[row, col] > max_cost:
+            break
+        if row not in rows and col not in cols:
+            rows.add(row)
+            cols.add(col)
+            pairs.append((row, col))
+    return pairs
+
+
+class PoseTracker:
+    """Associates the people detected in a frame with the people
+    of previous frames.
+
+    Each person gets a Track with an ID and a fixed size history of
+    per person data, so that changes of a pose can be followed for each
+    person rather than between whoever scores best in each frame.
+    """
+
+    def __init__(self,
+                 max_people=5,
+                 history_size=2,
+                 max_cost=0.9,
+                 max_age=10.0
+                 ):
+        """
+        :Parameters:
+        ----------
+        max_people : int
+            Maximum number of people to track, best scoring first.
+        history_size : int
+            Number of previous frame records kept per track.
+        max_cost : float
+            Maximum match cost, see :func:`match_cost`, of a person
+            and a track. Costlier people start a new track.
+        max_age : float
+            Seconds after which a track that was not seen is dropped.
+        """
+        self.max_people = max_people
+        self.history_size = history_size
+        self.max_cost = max_cost
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        """Forget all tracks."""
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, kps, now):
+        """Associate the people of a frame with tracks.
+
+        :Parameters:
+        ----------
+        kps : numpy.ndarray
+            Keypoints of the people in the frame, see
+            :func:`keypoint_boxes`, best scoring person first.
+        now : float
+            Frame time in seconds, time.monotonic().
+        :Returns:
+        -------
+        list of Track
+            Track of each of the first max_people people.
+        """
+        self.tracks = [track for track in self.tracks
+                       if now - track.last_seen <= self.max_age]
+        kps = np.asarray(kps, np.float32)[:self.max_people]
+        matched = [None] * len(kps)
+        if self.tracks and len(kps):
+            cost = match_cost(np.stack([track.keypoints
+                                        for track in self.tracks]), kps)
+            for row, col in greedy_assignment(cost, self.max_cost):
+                matched[col] = self.tracks[row]
+        for i, person_kps in enumerate(kps):
+            track = matched[i]
+            if track is None:
+                track = Track(self._next_id, person_kps, now,
+                              self.history_size)
+                self._next_id += 1
+                log.debug('New person track %d', track.id)
+                self.tracks.append(track)
+                matched[i] = track
+            track.keypoints = person_kps
+            track.last_seen = now
+        if len(self.tracks) > self.max_people:
+            # drop the tracks seen longest ago
+            self.tracks.sort(key=lambda track: track.last_seen, reverse=True)
+            del self.tracks[self.max_people:]
+        return matched
@@ -1,100 +1,288 @@
-from src.pipeline.pose_base import AbstractPoseModel
+from src.pipeline.pose_base import AbstractPoseModel, sort_by_score
 import numpy as np
-import time
+
+# parent and child keypoints of the skeleton edges, in the order
+# of the displacement output channels of multi-pose PoseNet models
+POSE_CHAIN = ((0, 1), (1, 3), (0, 2), (2, 4), (0, 5), (5, 7), (7, 9),
+              (5, 11), (11, 13), (13, 15), (0, 6), (6, 8), (8, 10),
+              (6, 12), (12, 14), (14, 16))
+
+
+def sigmoid(x):
+    """Logistic function of an array, without overflow warnings
+    for large negative values."""
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
+
+def output_stride(input_size, grid_size):
+    """Input pixels between two heatmap cells.
+
+    PoseNet input sizes are a multiple of the output stride plus one,
+    e.g. a 257 pixel input has a 9 cell heatmap at stride 32.
+    """
+    if grid_size < 2:
+        return float(input_size)
+    return (input_size - 1) / (grid_size - 1)
+
+
+def decode_heatmaps(heatmaps, offsets, stride):
+    """Keypoints at the heatmap maximum of each joint.
+
+    :Parameters:
+    ----------
+    heatmaps : numpy.ndarray
+        Joint heatmap logits, shape (..., grid height, grid width, joints).
+        Leading dimensions, such as a batch, are decoded at once.
+    offsets : numpy.ndarray
+        Keypoint offsets in input pixels from the heatmap cells, shape
+        (..., grid height, grid width, 2 * joints), y offsets first.
+    stride : (float, float)
+        Input pixels between two heatmap cells, vertically and
+        horizontally. See :func:`output_stride`.
+    :Returns:
+    -------
+    numpy.ndarray
+        float32 array of shape (..., joints, 3) with the y and x
+        input tensor coordinates and the score of each keypoint.
+    """
+    *batch, height, width, joints = heatmaps.shape
+    heatmaps = heatmaps.reshape(*batch, height * width, joints)
+    offsets = offsets.reshape(*batch, height * width, 2 * joints)
+    # first maximum cell of each joint
+    cells = np.argmax(heatmaps, axis=-2)[..., np.newaxis, :]
+    logits = np.take_along_axis(heatmaps, cells, axis=-2)[..., 0, :]
+    cell_offsets = np.take_along_axis(
+        offsets, np.concatenate([cells, cells], axis=-1), axis=-2)[..., 0, :]
+    rows, cols = np.divmod(cells[..., 0, :], width)
+
+    kps = np.empty((*batch, joints, 3), np.float32)
+    kps[..., 0] = rows * stride[0] + cell_offsets[..., :joints]
+    kps[..., 1] = cols * stride[1] + cell_offsets[..., joints:]
+    kps[..., 2] = sigmoid(logits.astype(np.float32))
+    return kps
+
+
+def _local_maxima(scores, threshold):
+    """Heatmap cells of shape (rows, cols, joints) index arrays that score
+    at least threshold and the most in their 3x3 neighborhood,
+    best scoring first."""
+    height, width, _ = scores.shape
+    padded = np.pad(scores, ((1, 1), (1, 1), (0, 0)),
+                    constant_values=-np.inf)
+    maxima = scores.copy()
+    for dy in range(3):
+        for dx in range(3):
+            np.maximum(maxima, padded[dy:dy + height, dx:dx + width],
+                       out=maxima)
+    rows, cols, joints = np.nonzero((scores >= threshold) &
+                                    (scores == maxima))
+    order = np.argsort(-scores[rows, cols, joints], kind='stable')
+    return rows[order], cols[order], joints[order]
+
+
+def decode_multiple_poses(heatmaps, offsets, displacements_fwd,
+                          displacements_bwd, stride, max_poses=10,
+                          score_threshold=0.5, nms_radius=20,
+                          min_pose_score=0.25):
+    """Keypoints of each person in the outputs of a multi-pose
+    PoseNet model for one frame.
+
+    Each heatmap maximum that is not close to the same keypoint of an
+    already decoded person is the root of a new person. The other
+    keypoints are found by following the displacements along the
+    skeleton edges, see POSE_CHAIN, so the cost grows with the number
+    of people rather than the heatmap size.
+
+    :Parameters:
+    ----------
+    heatmaps, offsets : numpy.ndarray
+        See :func:`decode_heatmaps`, without leading dimensions.
+    displacements_fwd, displacements_bwd : numpy.ndarray
+        Parent to child and child to parent keypoint displacements in
+        input pixels, shape (grid height, grid width, 2 * edges),
+        y displacements first.
+    stride : (float, float)
+        See :func:`output_stride`.
+    max_poses : int
+        Maximum number of people to decode.
+    score_threshold : float
+        Minimum keypoint score of a person root keypoint.
+    nms_radius : float
+        Input pixels within which the same keypoints of two people
+        are considered the same.
+    min_pose_score : float
+        Minimum score of a person, the sum of its keypoint scores that
+        do not overlap another person divided by the number of keypoints.
+    :Returns:
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        float32 keypoints of shape (people, joints, 3) with (y, x, score)
+        in input tensor coordinates and the score of each person,
+        best scoring person first.
+    """
+    height, width, joints = heatmaps.shape
+    edges = len(POSE_CHAIN)
+    scores = sigmoid(heatmaps.astype(np.float32))
+    offsets = offsets.reshape(height, width, 2, joints)
+    displacements_fwd = displacements_fwd.reshape(height, width, 2, edges)
+    displacements_bwd = displacements_bwd.reshape(height, width, 2, edges)
+    stride = np.asarray(stride, np.float32)
+    last_cell = np.array([height - 1, width - 1])
+
+    def keypoint(cell, joint):
+        y, x = cell
+        return np.append(cell * stride + offsets[y, x, :, joint],
+                         scores[y, x, joint])
+
+    def follow(edge, source, target, displacements):
+        y, x = np.clip(np.round(source / stride), 0, last_cell).astype(int)
+        point = source + displacements[y, x, :, edge]
+        cell = np.clip(np.round(point / stride), 0, last_cell).astype(int)
+        return keypoint(cell, target)
+
+    kps = np.zeros((max_poses, joints, 3), np.float32)
+    pose_scores = np.zeros(max_poses, np.float32)
+    count = 0
+    squared_radius = nms_radius ** 2
+    for y, x, root in zip(*_local_maxima(scores, score_threshold)):
+        if count == max_poses:
+            break
+        root_keypoint = keypoint(np.array([y, x]), root)
+        if np.any(np.sum((kps[:count, root, :2] - root_keypoint[:2]) ** 2,
+                         axis=-1) <= squared_radius):
+            continue
+        pose = np.zeros((joints, 3), np.float32)
+        pose[root] = root_keypoint
+        # from the root up to the nose, then down to the extremities
+        for edge in reversed(range(edges)):
+            parent, child = POSE_CHAIN[edge]
+            if pose[child, 2] > 0 and pose[parent, 2] == 0:
+                pose[parent] = follow(edge, pose[child, :2], parent,
+                                      displacements_bwd)
+        for edge, (parent, child) in enumerate(POSE_CHAIN):
+            if pose[parent, 2] > 0 and pose[child, 2] == 0:
+                pose[child] = follow(edge, pose[parent, :2], child,
+                                     displacements_fwd)
+        overlap = np.any(np.sum((kps[:count, :, :2] - pose[:, :2]) ** 2,
+                                axis=-1) <= squared_radius, axis=0)
+        pose_score = pose[~overlap, 2].sum() / joints
+        if pose_score >= min_pose_score:
+            kps[count] = pose
+            pose_scores[count] = pose_score
+            count += 1
+    return sort_by_score(kps[:count], pose_scores[:count])
+
 
 class Posenet_MobileNet(AbstractPoseModel):
     '''The class for pose estimation using Posenet Mobilenet implementation.'''
 
+    # floating point models expect pixel values in the [-1, 1] range
+    input_mean = 127.5
+    input_std = 127.5
+
+    # multi-pose decoding options, see decode_multiple_poses;
+    # more than one pose decodes models with displacement outputs
+    # for multiple people, e.g. for tracking
+    max_poses = 1
+    score_threshold = 0.5
+    nms_radius = 20
+    min_pose_score = 0.25
+
     def __init__(self, tfengine):
         super().__init__(tfengine)
 
 
     def sigmoid(self, x):
-        return 1 / (1 + np.exp(-x))
+        return sigmoid(x)
+
+
+    def _output_stride(self, heatmap_shape):
+        """Input pixels between two heatmap cells for a heatmap
+        of shape (..., grid height, grid width, joints)."""
+        return (output_stride(self._tensor_image_height, heatmap_shape[-3]),
+                output_stride(self._tensor_image_width, heatmap_shape[-2]))
 
 
     def parse_output(self, heatmap_data, offset_data):
         '''
             Parse Output of TFLite model and get keypoints with score.
         '''
+        return decode_heatmaps(heatmap_data, offset_data,
+                               self._output_stride(heatmap_data.shape))
+
 
-        joint_num = heatmap_data.shape[-1]
-        pose_kps = np.zeros((joint_num, 3), np.float32)
-
-        for i in range(heatmap_data.shape[-1]):
-
-            joint_heatmap = heatmap_data[..., i]
-            max_val_pos = np.squeeze(
-                np.argwhere(joint_heatmap == np.max(joint_heatmap)))
-            remap_pos = np.array(max_val_pos/8*self._tensor_image_height,
-                                 dtype=np.int32)
-            pose_kps[i, 0] = int(remap_pos[0] + offset_data[max_val_pos[0],
-                                 max_val_pos[1], i])
-            pose_kps[i, 1] = int(remap_pos[1] + offset_data[max_val_pos[0],
-                                 max_val_pos[1], i+joint_num])
-            max_prob = np.max(joint_heatmap)
-            
-            pose_kps[i,2] = self.sigmoid(max_prob)
-            
-
-        return pose_kps
-
-
-    def execute_model(self, img):
-        ''' Run TFLite model.
-        
-        :Parameters:
-        ----------
-        img: PIL.Image
-            Input Image for AI model detection.
-        :Returns:
-        -------
-        kps:
-            A list of Pose objects with keypoints and confidence scores
-        template_image: PIL.Image
-            Input resized image.
-        thumbnail: PIL.Image
-            Thumbnail input image
-        _inference_time: float
-            Model inference time in seconds
+    def decode_output(self, interpreter):
         '''
+            Get keypoints with score for each frame in the input batch.
 
-        _tensor_input_size = (self._tensor_image_width,
-                              self._tensor_image_height)
+            By default one person is decoded at the heatmap maxima and
+            scored with the average keypoint score. With max_poses over
+            one, models with displacement outputs are decoded for
+            multiple people.
+        '''
+        outputs = [interpreter.get_tensor(details['index'])
+                   for details in self._tfengine.output_details]
+        if self.max_poses > 1 and len(outputs) >= 4:
+            options = dict(stride=self._output_stride(outputs[0].shape),
+                           max_poses=self.max_poses,
+                           score_threshold=self.score_threshold,
+                           nms_radius=self.nms_radius,
+                           min_pose_score=self.min_pose_score)
+            return [decode_multiple_poses(*frame_outputs, **options)
+                    for frame_outputs in zip(*outputs[:4])]
+        # all frames of the batch are decoded at once
+        kps = self.parse_output(outputs[0], outputs[1])[:, np.newaxis]
+        return [(frame_kps, frame_kps[..., 2].mean(axis=-1))
+                for frame_kps in kps]
 
-        # thumbnail is a proportionately resized image
-        thumbnail = self.thumbnail(image=img,
-                                   desired_size=_tensor_input_size)
 
-        # convert thumbnail into an image with the exact size
-        # as the input tensor preserving proportions by padding with
-        # a solid color as needed
-        template_image = self.resize(image=thumbnail,
-                                desired_size=_tensor_input_size)
+# output tensors of PoseNet models with a built-in pose decoder:
+# keypoints [batch, poses, joints, (y, x)], keypoint scores
+# [batch, poses, joints], pose scores [batch, poses] and number of poses
+DECODER_OUTPUTS = ('poses', 'keypoint_scores', 'pose_scores', 'num_poses')
 
-        start_time = time.process_time()
 
-        template_input = np.expand_dims(template_image.copy(), axis=0)
-        floating_model = self._tfengine.input_details[0]['dtype'] == np.float32
+def has_decoder_outputs(output_details):
+    """Whether the output tensors of a PoseNet model are
+    the decoded poses rather than heatmaps and offsets."""
+    return len(output_details) == len(DECODER_OUTPUTS) and \
+        len(output_details[0]['shape']) == 4 and \
+        output_details[0]['shape'][-1] == 2
 
-        if floating_model:
-            template_input = (np.float32(template_input) - 127.5) / 127.5
 
-        self.tf_interpreter().\
-            set_tensor(self._tfengine.input_details[0]['index'],
-                       template_input)
-        self.tf_interpreter().invoke()
+class Posenet_MobileNet_Decoder(Posenet_MobileNet):
+    '''The class for pose estimation using Posenet Mobilenet models
+    with a built-in pose decoder, such as the EdgeTPU models.
 
-        template_output_data = self.tf_interpreter().\
-            get_tensor(self._tfengine.output_details[0]['index'])
-        template_offset_data = self.tf_interpreter().\
-            get_tensor(self._tfengine.output_details[1]['index'])
+    The decoder op runs in the model graph, so the keypoints
+    are read from the output tensors without decoding in Python.
+    Requires the posenet_decoder custom op library to be loaded,
+    see TFInferenceEngine delegates.
+    '''
 
-        template_heatmaps = np.squeeze(template_output_data)
-        template_offsets = np.squeeze(template_offset_data)
+    # the decoder op decodes multiple people, None keeps all of them
+    max_poses = None
 
-        kps = self.parse_output(template_heatmaps, template_offsets)
+    def parse_output(self, poses, keypoint_scores, pose_scores, num_poses):
+        '''
+            Get keypoints with score of each decoded pose.
+        '''
+        count = min(int(num_poses), len(pose_scores))
+        kps = np.concatenate([poses[:count],
+                              keypoint_scores[:count, :, np.newaxis]],
+                             axis=-1)
+        kps, scores = sort_by_score(kps, pose_scores[:count])
+        return kps[:self.max_poses], scores[:self.max_poses]
 
-        _inference_time = time.process_time() - start_time
 
-        return kps, template_image, thumbnail, _inference_time
\ No newline at end of file
+    def decode_output(self, interpreter):
+        '''
+            Get keypoints with score for each frame in the input batch.
+        '''
+        poses, keypoint_scores, pose_scores, num_poses = (
+            interpreter.get_tensor(details['index'])
+            for details in self._tfengine.output_details)
+        num_poses = np.broadcast_to(np.reshape(num_poses, -1), len(poses))
+        return [self.parse_output(*outputs)
+                for outputs in zip(poses, keypoint_scores,
+                                   pose_scores, num_poses)]
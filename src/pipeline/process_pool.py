@@ -0,0 +1,496 @@
+"""Pose estimation in a pool of worker processes."""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+from src.pipeline.array_image import ArrayImage, YuvImage, as_image
+from src.pipeline.pose_base import RESAMPLING, add_timing, fit_size
+
+log = logging.getLogger(__name__)
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python 3.7, see PoseProcessPool
+    resource_tracker = shared_memory = None
+
+# room for the keypoints of up to 16 people, 17 keypoints each,
+# (y, x, score) float32 per keypoint
+_MAX_PEOPLE = 16
+_KEYPOINTS_BYTES = _MAX_PEOPLE * 17 * 3 * 4
+
+# seconds between liveness checks of a worker while waiting for its reply
+_POLL_INTERVAL = 0.1
+
+
+class _SlotLayout:
+    """Shared memory slot layout.
+
+    | keypoints | thumbnail (tensor size) | input frame (max size) |
+    """
+
+    def __init__(self, tensor_size, max_frame_size):
+        self.tensor_size = tuple(tensor_size)
+        tensor_w, tensor_h = tensor_size
+        max_w, max_h = max_frame_size
+        self.thumbnail_offset = _KEYPOINTS_BYTES
+        self.frame_offset = self.thumbnail_offset + tensor_h * tensor_w * 3
+        self.size = self.frame_offset + max_w * max_h * 3
+
+    def keypoints(self, buf, shape):
+        return np.ndarray(shape, np.float32, buffer=buf)
+
+    def thumbnail(self, buf, size):
+        w, h = size
+        return np.ndarray((h, w, 3), np.uint8, buffer=buf,
+                          offset=self.thumbnail_offset)
+
+    def frame(self, buf, size):
+        w, h = size
+        return np.ndarray((h, w, 3), np.uint8, buffer=buf,
+                          offset=self.frame_offset)
+
+
+def _worker_main(conn, engine_config, model_name, resample, max_poses,
+                 max_frame_size, core):
+    """Worker process loop.
+
+    Owns an inference engine and pose model. Reads frames from its
+    shared memory slot and writes keypoints and the thumbnail back.
+    """
+    if core is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {core})
+    # imported here to keep the parent process free of the TFLite runtime
+    from src.pipeline.inference import TFInferenceEngine
+    from src.pipeline.pose_engine import create_pose_model
+    slot = None
+    try:
+        tfengine = TFInferenceEngine(**engine_config)
+        model = create_pose_model(tfengine, model_name, resample=resample,
+                                  max_poses=max_poses)
+        tfengine.warmup()
+        tensor_size = (model._tensor_image_width, model._tensor_image_height)
+        conn.send(('ready', tensor_size, model.confidence_threshold))
+        # the parent creates the slot once the tensor size is known
+        slot = shared_memory.SharedMemory(name=conn.recv())
+        layout = _SlotLayout(tensor_size, max_frame_size)
+        while True:
+            frame_size = conn.recv()
+            if frame_size is None:
+                break
+            try:
+                timings = {}
+                start_time = time.perf_counter()
+                frame = layout.frame(slot.buf, frame_size)
+                img = Image.fromarray(frame)
+                kps, scores, _, thumbnail, _ = \
+                    model.execute_model(img, timings=timings)
+                # people are sorted by score, keep the best ones
+                kps = np.asarray(kps[:_MAX_PEOPLE], np.float32)
+                scores = [float(score) for score in scores[:_MAX_PEOPLE]]
+                layout.keypoints(slot.buf, kps.shape)[...] = kps
+                layout.thumbnail(slot.buf, thumbnail.size)[...] = \
+                    np.asarray(thumbnail)
+                add_timing(timings, 'worker_total', start_time)
+                conn.send(('ok', kps.shape, scores, thumbnail.size,
+                           timings))
+                del frame
+            except Exception as e:
+                log.exception('Error in pose worker process')
+                conn.send(('error', repr(e)))
+    except Exception as e:
+        log.exception('Pose worker process failed to start')
+        conn.send(('error', repr(e)))
+    finally:
+        if slot is not None:
+            slot.close()
+        conn.close()
+
+
+class _Worker:
+    __slots__ = ['process', 'conn', 'slot', 'core']
+
+    def __init__(self, process, conn, core=None):
+        self.process = process
+        self.conn = conn
+        self.slot = None
+        self.core = core
+
+
+class PoseProcessPool:
+    """Runs pose estimation in a pool of worker processes.
+
+    Preprocessing, inference and output decoding hold the GIL for
+    a large part of each frame. Worker processes own their interpreters
+    and run these stages outside of the caller process, so a multicore
+    host can work on several frames at once.
+    Frames and results travel through per-worker shared memory slots
+    instead of being pickled.
+
+    Implements the execute_model interface of AbstractPoseModel and can be
+    used as the model of a PoseEngine. Per-stream fall detection state
+    stays with the FallDetector in the caller process.
+
+    Requires Python 3.8 or later for multiprocessing.shared_memory.
+    """
+
+    def __init__(self,
+                 model=None,
+                 labels=None,
+                 confidence_threshold=0.15,
+                 model_name=None,
+                 resample=None,
+                 max_poses=None,
+                 workers=2,
+                 max_frame_size=(1920, 1080),
+                 pin_cores=False,
+                 timeout=None,
+                 start_method='spawn',
+                 **kwargs
+                 ):
+        """Start worker processes.
+
+        :Parameters:
+        ----------
+        model, labels, confidence_threshold, kwargs:
+            TFInferenceEngine config for each worker process.
+        model_name : string
+            'movenet' or 'mobilenet'.
+        resample : string
+            Input image downscaling filter name. See pose_base.RESAMPLING.
+        max_poses : int
+            Maximum number of people PoseNet models decode per frame.
+            See :func:`create_pose_model`.
+        workers : int
+            Number of worker processes.
+        max_frame_size : (width, height)
+            Largest frame size the shared memory slots can hold.
+            Larger frames are downscaled before they are sent to a worker.
+        pin_cores : bool or list
+            True pins worker i to the i-th usable CPU core.
+            A list of core ids pins workers to these cores round robin.
+        timeout : float
+            Max time in seconds to wait for an idle worker and for
+            the result of a frame. None means wait indefinitely.
+            Workers that exit or do not reply in time are replaced.
+        start_method : string
+            multiprocessing start method for worker processes.
+        """
+        if shared_memory is None:
+            raise RuntimeError('PoseProcessPool requires Python 3.8 or later '
+                               'for multiprocessing.shared_memory.')
+        assert workers >= 1
+        assert model_name
+        start_time = time.perf_counter()
+        engine_config = dict(kwargs)
+        engine_config.update(model=model,
+                             labels=labels,
+                             confidence_threshold=confidence_threshold)
+        if pin_cores is True:
+            try:
+                pin_cores = sorted(os.sched_getaffinity(0))
+            except AttributeError:
+                log.warning('CPU core pinning is not supported '
+                            'on this platform.')
+                pin_cores = None
+        self._max_frame_size = tuple(max_frame_size)
+        self.resample = RESAMPLING[resample or 'bicubic']
+        self._timeout = timeout
+        self._workers = []
+        self._idle = queue.Queue()
+        self._context = multiprocessing.get_context(start_method)
+        self._worker_args = (engine_config, model_name, resample, max_poses,
+                             self._max_frame_size)
+        self._started = 0
+        # guards the worker list and slot layout, which failed workers
+        # change while other threads run frames on the pool
+        self._lock = threading.Lock()
+        # workers share the resource tracker of this process,
+        # which releases the shared memory slots if this process dies
+        resource_tracker.ensure_running()
+        try:
+            # workers load their models in parallel
+            for i in range(workers):
+                core = pin_cores[i % len(pin_cores)] if pin_cores else None
+                self._workers.append(self._spawn(core))
+            for worker in self._workers:
+                self._attach(worker)
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        self._tensor_image_width, self._tensor_image_height = \
+            self._layout.tensor_size
+        self._startup_timings = {
+            'allocate': time.perf_counter() - start_time
+        }
+
+    @property
+    def workers(self):
+        return len(self._workers)
+
+    @property
+    def startup_timings(self):
+        """Wall-clock seconds to start the workers, load the model
+        and warm up the interpreters in each of them."""
+        return dict(self._startup_timings)
+
+    def _spawn(self, core=None):
+        """Start a worker process."""
+        with self._lock:
+            name = f'pose-worker-{self._started}'
+            self._started += 1
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn,) + self._worker_args + (core,),
+            name=name,
+            daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn, core)
+
+    def _attach(self, worker):
+        """Wait for a started worker to load its model
+        and give it a shared memory slot."""
+        reply = self._receive(worker)
+        if reply[0] != 'ready':
+            raise RuntimeError(
+                f'Pose worker process failed to start: {reply[1]}')
+        _, tensor_size, confidence_threshold = reply
+        layout = _SlotLayout(tensor_size, self._max_frame_size)
+        with self._lock:
+            self._layout = layout
+            self.confidence_threshold = confidence_threshold
+        worker.slot = shared_memory.SharedMemory(
+            create=True, size=layout.size)
+        worker.conn.send(worker.slot.name)
+
+    def _receive(self, worker, timeout=None):
+        """Wait for a message from a worker.
+
+        :Raises:
+        -------
+        EOFError
+            If the worker process exited.
+        TimeoutError
+            If the worker did not reply within timeout seconds.
+        """
+        start_time = time.monotonic()
+        while not worker.conn.poll(_POLL_INTERVAL):
+            if not worker.process.is_alive():
+                raise EOFError(f'Pose worker process {worker.process.name} '
+                               f'exited with code {worker.process.exitcode}')
+            if timeout is not None and \
+                    time.monotonic() - start_time > timeout:
+                raise TimeoutError(
+                    f'No reply from pose worker process '
+                    f'{worker.process.name} after {timeout} seconds')
+        return worker.conn.recv()
+
+    def _stop(self, worker):
+        """Stop a worker process and release its shared memory slot."""
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        if worker.slot is not None:
+            worker.slot.close()
+            worker.slot.unlink()
+            worker.slot = None
+
+    def _replace(self, worker):
+        """Replace a failed worker with a new one.
+
+        :Returns:
+        -------
+        _Worker
+            The new worker, not in the idle queue.
+            None if it failed to start, the pool then has one worker less.
+        """
+        log.warning('Replacing pose worker process %s',
+                    worker.process.name)
+        self._stop(worker)
+        new_worker = None
+        try:
+            new_worker = self._spawn(worker.core)
+            self._attach(new_worker)
+        except Exception:
+            log.exception('Pose worker process failed to restart')
+            if new_worker is not None:
+                self._stop(new_worker)
+            new_worker = None
+        with self._lock:
+            index = self._workers.index(worker)
+            if new_worker is None:
+                del self._workers[index]
+            else:
+                self._workers[index] = new_worker
+        return new_worker
+
+    def _fit_frame(self, img):
+        """Return (height, width, 3) RGB pixels of an image
+        that fit in a shared memory slot."""
+        max_w, max_h = self._max_frame_size
+        if isinstance(img, YuvImage):
+            # converted at the smallest reduction that fits a slot
+            img = img.decode(fit_size=self._max_frame_size, reducing_gap=1.0)
+        if not isinstance(img, Image.Image):
+            if not isinstance(img, ArrayImage):
+                img = ArrayImage(img)
+            w, h = img.size
+            if w <= max_w and h <= max_h:
+                # copied straight to shared memory, row strides and all
+                return img.array[..., :3]
+            img = img.image
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        w, h = img.size
+        if w > max_w or h > max_h:
+            factor = max(-(-w // max_w), -(-h // max_h))
+            img = img.reduce(factor)
+        return np.asarray(img)
+
+    def thumbnail(self, image=None, desired_size=None):
+        """Resize an image to fit the model input in the caller process.
+        Same as :func:`AbstractPoseModel.thumbnail`."""
+        image = as_image(image)
+        size = fit_size(image.size, desired_size)
+        if size == image.size:
+            return image.copy()
+        return image.resize(size, self.resample, reducing_gap=2.0)
+
+    def _submit(self, img, timings=None):
+        t = time.perf_counter()
+        if not self._workers:
+            raise RuntimeError('No pose worker processes left.')
+        try:
+            worker = self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f'No idle pose worker available after {self._timeout} '
+                f'seconds. Workers: {self.workers}')
+        if not worker.process.is_alive():
+            worker = self._replace(worker)
+            if worker is None:
+                raise RuntimeError('Pose worker process exited '
+                                   'and could not be restarted.')
+        t = add_timing(timings, 'worker_wait', t)
+        try:
+            pixels = self._fit_frame(img)
+            frame_size = (pixels.shape[1], pixels.shape[0])
+            frame = self._layout.frame(worker.slot.buf, frame_size)
+            frame[...] = pixels
+            del frame
+            worker.conn.send(frame_size)
+        except OSError:
+            # the worker exited since the liveness check
+            self._release(worker, failed=True)
+            raise
+        except Exception:
+            self._idle.put(worker)
+            raise
+        add_timing(timings, 'frame_transfer', t)
+        return worker
+
+    def _release(self, worker, failed=False):
+        """Return a worker to the idle queue, or its replacement
+        if it failed."""
+        if failed:
+            worker = self._replace(worker)
+        if worker is not None:
+            self._idle.put(worker)
+
+    def _collect(self, worker, timings=None):
+        t = time.perf_counter()
+        failed = False
+        try:
+            reply = self._receive(worker, timeout=self._timeout)
+            if reply[0] != 'ok':
+                raise RuntimeError(f'Pose worker process error: {reply[1]}')
+            _, kps_shape, scores, thumbnail_size, worker_timings = reply
+            kps = np.array(self._layout.keypoints(worker.slot.buf, kps_shape))
+            scores = np.array(scores, np.float32)
+            thumbnail = Image.fromarray(np.array(
+                self._layout.thumbnail(worker.slot.buf, thumbnail_size)))
+        except (EOFError, OSError, TimeoutError) as e:
+            # a crashed or stalled worker cannot take the next frame
+            failed = True
+            if isinstance(e, TimeoutError):
+                raise
+            raise RuntimeError(f'Pose worker process failed: {e!r}') from e
+        finally:
+            self._release(worker, failed=failed)
+        if timings is not None:
+            for stage, duration in worker_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + duration
+        add_timing(timings, 'worker_roundtrip', t)
+        # the input tensor sized image is not sent back,
+        # see AbstractPoseModel.execute_model
+        return kps, scores, None, thumbnail
+
+    def execute_model(self, img, timings=None):
+        ''' Run pose estimation on an idle worker process.
+
+        Same interface as :func:`AbstractPoseModel.execute_model`.
+        '''
+        start_time = time.perf_counter()
+        worker = self._submit(img, timings=timings)
+        kps, scores, template_image, thumbnail = \
+            self._collect(worker, timings=timings)
+        _inference_time = time.perf_counter() - start_time
+        return kps, scores, template_image, thumbnail, _inference_time
+
+    def execute_batch(self, images, timings=None):
+        ''' Run pose estimation on multiple frames across worker processes.
+
+        Same interface as :func:`AbstractPoseModel.execute_batch`.
+        '''
+        assert images
+        start_time = time.perf_counter()
+        pending = []
+        results = []
+        try:
+            for img in images:
+                # keep all workers busy but collect in order
+                if len(pending) == self.workers:
+                    results.append(self._collect(pending.pop(0), timings))
+                pending.append(self._submit(img, timings=timings))
+            while pending:
+                results.append(self._collect(pending.pop(0), timings))
+        finally:
+            # return the workers of frames left after an error to the pool
+            for worker in pending:
+                try:
+                    self._collect(worker)
+                except Exception:
+                    pass
+        kps_list, scores_list, template_images, thumbnails = \
+            map(list, zip(*results))
+        _inference_time = time.perf_counter() - start_time
+        return kps_list, scores_list, template_images, thumbnails, \
+            _inference_time
+
+    def close(self):
+        """Stop worker processes and release shared memory."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            self._stop(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,117 @@
+"""Adapt the frame sampling rate of a stream to what happens in it."""
+import logging
+
+log = logging.getLogger(__name__)
+
+IDLE = 'idle'
+PRESENT = 'present'
+ALERT = 'alert'
+
+
+class SamplingSchedule:
+    """Frame sampling intervals driven by fall detection results.
+
+    Samples slowly while nobody is in view, at the nominal rate while
+    a person is present and faster for a while after the body line of
+    the person moved downward, when a fall is most likely to follow.
+    The person has to be gone for idle_after seconds before sampling
+    slows down, so a missed detection or two do not slow it down.
+    """
+
+    def __init__(self,
+                 idle_interval=5.0,
+                 present_interval=1.0,
+                 alert_interval=0.25,
+                 alert_duration=3.0,
+                 idle_after=10.0
+                 ):
+        """
+        :Parameters:
+        ----------
+        idle_interval : float
+            Seconds between samples while no person is in view.
+        present_interval : float
+            Seconds between samples while a person is in view.
+        alert_interval : float
+            Seconds between samples after a downward body motion.
+        alert_duration : float
+            Seconds to sample at the alert interval after
+            a downward body motion.
+        idle_after : float
+            Seconds without a detected person before sampling slows down
+            to the idle interval.
+        :Raises:
+        -------
+        ValueError
+            If an interval or duration is negative or the intervals
+            are out of order.
+        """
+        if not 0 <= alert_interval <= present_interval <= idle_interval:
+            raise ValueError(
+                'Sampling intervals must be 0 <= alert_interval '
+                '<= present_interval <= idle_interval, not '
+                f'{alert_interval}, {present_interval}, {idle_interval}')
+        if alert_duration < 0 or idle_after < 0:
+            raise ValueError(
+                'alert_duration and idle_after must not be negative, not '
+                f'{alert_duration}, {idle_after}')
+        self.intervals = {IDLE: idle_interval,
+                          PRESENT: present_interval,
+                          ALERT: alert_interval}
+        self.alert_duration = alert_duration
+        self.idle_after = idle_after
+        self.state = IDLE
+        self._last_sample_time = None
+        self._last_pose_time = None
+        self._alert_until = None
+
+    @property
+    def interval(self):
+        """Seconds between samples in the current state."""
+        return self.intervals[self.state]
+
+    @property
+    def rate(self):
+        """Samples per second in the current state."""
+        return 1 / self.interval if self.interval else None
+
+    def due(self, now):
+        """Whether a frame at time now is to be sampled."""
+        return self._last_sample_time is None or \
+            now - self._last_sample_time >= self.interval
+
+    def update(self, now, pose=False, downward=False):
+        """Record a sampled frame and pick the state for the next one.
+
+        :Parameters:
+        ----------
+        now : float
+            Frame time in seconds, time.monotonic().
+        pose : bool
+            Whether a person was detected in the frame.
+        downward : bool
+            Whether the body line moved downward since a previous frame.
+        """
+        self._last_sample_time = now
+        if pose:
+            self._last_pose_time = now
+        if downward:
+            self._alert_until = now + self.alert_duration
+        if self._alert_until is not None and now < self._alert_until:
+            state = ALERT
+        elif self._last_pose_time is not None and \
+                now - self._last_pose_time < self.idle_after:
+            state = PRESENT
+        else:
+            state = IDLE
+        if state != self.state:
+            log.debug('Sampling state changed from %s to %s',
+                      self.state, state)
+            self.state = state
+
+    def reset(self):
+        """Start over in the idle state."""
+        self.state = IDLE
+        self._last_sample_time = None
+        self._last_pose_time = None
+        self._alert_until = None
@@ -0,0 +1,125 @@
+"""Test load-adaptive pose model switching."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.adaptive_engine import AdaptivePoseEngine
+from src.pipeline.pose_engine import Keypoint, Pose, KEYPOINTS
+from PIL import Image
+import threading
+import time
+
+
+class _StubPoseEngine:
+    """PoseEngine stand-in with a fixed tensor size and no inference."""
+
+    def __init__(self, tensor_size, delay=0):
+        self.confidence_threshold = 0.15
+        self._tensor_image_width, self._tensor_image_height = tensor_size
+        # seconds of inference per call
+        self.delay = delay
+
+    def detect_poses(self, img, timings=None):
+        time.sleep(self.delay)
+        thumbnail = img.copy()
+        thumbnail.thumbnail((self._tensor_image_width,
+                             self._tensor_image_height))
+        # one keypoint in the center of the thumbnail
+        keypoints = {k: Keypoint(k, [thumbnail.width / 2,
+                                     thumbnail.height / 2], 0.9)
+                     for k in KEYPOINTS}
+        return [Pose(keypoints, 1.0)], thumbnail, 1.0
+
+
+def _adaptive_engine(**kwargs):
+    return AdaptivePoseEngine(fast_engine=_StubPoseEngine((192, 192)),
+                              accurate_engine=_StubPoseEngine((256, 256)),
+                              **kwargs)
+
+
+def _run_frame(engine, latency, queue_depth=0):
+    engine.begin_frame(queue_depth=queue_depth)
+    # inject the frame latency instead of running a model
+    engine._frame_latency = latency
+    return engine.end_frame()
+
+
+def test_switch_on_latency_with_hysteresis():
+    """Expect a switch to the fast model when latency exceeds the budget
+    and back only once the accurate model fits well within it."""
+    engine = _adaptive_engine(latency_budget=0.1, min_dwell_frames=2,
+                              smoothing=1.0)
+    for _ in range(3):
+        meta = _run_frame(engine, 0.05)
+        assert meta['model'] == 'accurate'
+    meta = _run_frame(engine, 0.15)
+    assert meta['model'] == 'accurate'
+    meta = _run_frame(engine, 0.15)
+    assert meta['model'] == 'fast'
+    assert meta['switch'] == {'from': 'accurate', 'to': 'fast',
+                              'reason': 'latency'}
+
+    # 0.06 on the fast model means about 0.1 on the accurate one
+    # going by tensor sizes, above the low watermark
+    for _ in range(5):
+        meta = _run_frame(engine, 0.06)
+        assert meta['model'] == 'fast'
+        assert meta['switch'] is None
+
+    _run_frame(engine, 0.03)
+    meta = _run_frame(engine, 0.03)
+    assert meta['model'] == 'accurate'
+    assert meta['switch']['reason'] == 'recovered'
+    assert meta['switches'] == 2
+
+
+def test_switch_on_queue_depth():
+    """Expect a backlog to force the fast model until it drains."""
+    engine = _adaptive_engine(latency_budget=1.0, min_dwell_frames=1)
+    _run_frame(engine, 0.01)
+    meta = _run_frame(engine, 0.01, queue_depth=2)
+    assert meta['model'] == 'fast'
+    assert meta['switch']['reason'] == 'queue_depth'
+    meta = _run_frame(engine, 0.01, queue_depth=1)
+    assert meta['model'] == 'fast'
+    meta = _run_frame(engine, 0.01, queue_depth=0)
+    assert meta['model'] == 'accurate'
+
+
+def test_keypoints_in_source_coordinates():
+    """Expect keypoints in input image coordinates for both models."""
+    engine = _adaptive_engine(latency_budget=1.0, min_dwell_frames=1)
+    img = Image.new('RGB', (640, 480))
+    for queue_depth in [0, 2]:
+        engine.begin_frame(queue_depth=queue_depth)
+        poses, thumbnail, _ = engine.detect_poses(img)
+        meta = engine.end_frame()
+        assert thumbnail.width == engine._tensor_image_width
+        keypoint = poses[0].keypoints['left hip']
+        assert keypoint.yx.tolist() == [320, 240]
+        assert meta['latency'] > 0
+    assert meta['model'] == 'fast'
+
+
+def test_latency_of_parallel_calls():
+    """Expect the latency of detection calls of a frame made from
+    several threads to add up."""
+    engine = AdaptivePoseEngine(
+        fast_engine=_StubPoseEngine((192, 192), delay=0.002),
+        accurate_engine=_StubPoseEngine((256, 256), delay=0.002))
+    img = Image.new('RGB', (64, 48))
+
+    def detect():
+        for _ in range(10):
+            engine.detect_poses(img)
+
+    engine.begin_frame()
+    threads = [threading.Thread(target=detect) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    meta = engine.end_frame()
+    assert meta['latency'] >= 40 * 0.002
+    assert engine._frame_latency is None
@@ -0,0 +1,143 @@
+"""Test uncompressed frame input."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.array_image import ArrayImage, YuvImage, YUV_FORMATS, \
+    as_image
+from src.pipeline.pose_base import letterbox
+import numpy as np
+import pytest
+from PIL import Image
+
+
+def _random_pixels(shape):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, shape, dtype=np.uint8)
+
+
+def test_array_image():
+    """Expect the same pixels as Image.fromarray."""
+    pixels = _random_pixels((48, 64, 3))
+    frame = ArrayImage(pixels)
+    assert frame.size == (64, 48)
+    assert frame.decode(fit_size=(16, 16)) is frame.image
+    assert np.array_equal(np.asarray(frame.image), pixels)
+
+
+def test_array_image_padded_rows():
+    """Expect padded rows and an unused fourth channel to be skipped."""
+    pixels = _random_pixels((48, 64, 3))
+    buffer = np.zeros((50, 80, 4), np.uint8)
+    buffer[1:49, 3:67, :3] = pixels
+    frame = ArrayImage(buffer[1:49, 3:67])
+    assert np.array_equal(np.asarray(frame.image), pixels)
+    # a copy, the capture buffer can be reused
+    buffer[:] = 0
+    assert np.array_equal(np.asarray(frame.image), pixels)
+
+    rgb = np.zeros((48, 70, 3), np.uint8)
+    rgb[:, :64] = pixels
+    frame = ArrayImage(rgb.tobytes(), size=(64, 48), stride=70 * 3)
+    assert np.array_equal(np.asarray(frame.image), pixels)
+
+    # rows in reverse order
+    assert np.array_equal(np.asarray(as_image(pixels[::-1])),
+                          pixels[::-1])
+
+
+def test_letterbox_array():
+    """Expect the same pixels for an array as for an image."""
+    pixels = _random_pixels((180, 320, 3))
+    out = np.zeros((64, 64, 3), np.uint8)
+    expected = np.zeros((64, 64, 3), np.uint8)
+
+    box = letterbox(image=pixels, out=out)
+    expected_box = letterbox(image=Image.fromarray(pixels), out=expected)
+
+    assert box.thumbnail.size == expected_box.thumbnail.size
+    assert box.scale == expected_box.scale
+    assert np.array_equal(out, expected)
+
+
+def _yuv_frame(image, pixel_format='nv12', stride=None):
+    """Full range YUV 4:2:0 frame buffer of an RGB image."""
+    width, height = image.size
+    stride = stride or width
+    ycbcr = np.asarray(image.convert('YCbCr'))
+    chroma = [np.asarray(Image.fromarray(ycbcr[..., c]).resize(
+        (width // 2, height // 2), Image.BOX)) for c in (1, 2)]
+    y = np.zeros((height, stride), np.uint8)
+    y[:, :width] = ycbcr[..., 0]
+    if pixel_format == 'nv12':
+        uv = np.zeros((height // 2, stride), np.uint8)
+        uv[:, :width] = np.stack(chroma, axis=-1).reshape(height // 2, width)
+        planes = [y, uv]
+    else:
+        planes = [y]
+        for c in chroma:
+            plane = np.zeros((height // 2, stride // 2), np.uint8)
+            plane[:, :width // 2] = c
+            planes.append(plane)
+    return b''.join(plane.tobytes() for plane in planes)
+
+
+def _smooth_image(size, detail=8):
+    """Random image without detail finer than chroma subsampling."""
+    w, h = size
+    pixels = _random_pixels((h // detail, w // detail, 3))
+    return Image.fromarray(pixels).resize(size, Image.BICUBIC)
+
+
+def test_yuv_image():
+    """Expect the RGB image a YUV frame was made from."""
+    image = _smooth_image((160, 96))
+    expected = np.asarray(image, np.int16)
+    for pixel_format in YUV_FORMATS:
+        for stride in [None, 176]:
+            frame = YuvImage(_yuv_frame(image, pixel_format, stride),
+                             size=image.size, pixel_format=pixel_format,
+                             stride=stride, full_range=True)
+            assert frame.size == image.size
+            diff = np.abs(np.asarray(frame.image, np.int16) - expected)
+            assert diff.mean() < 3
+
+
+def test_yuv_image_video_range():
+    """Expect video range frames to be expanded to the full range."""
+    # black, white and mid grey in video range
+    y = np.array([[16, 16, 235, 235, 126, 126]] * 2, np.uint8)
+    uv = np.full((1, 6), 128, np.uint8)
+    frame = YuvImage(y.tobytes() + uv.tobytes(), size=(6, 2))
+    pixels = np.asarray(frame.image)
+    assert pixels[:, :2].max() == 0
+    assert pixels[:, 2:4].min() == 255
+    assert np.all(np.abs(pixels[:, 4:].astype(int) - 128) <= 1)
+
+
+def test_yuv_image_resize_and_decode():
+    """Expect resized frames to match a resized RGB image."""
+    image = _smooth_image((640, 384), detail=32)
+    frame = YuvImage(_yuv_frame(image), size=image.size, full_range=True)
+
+    decoded = frame.decode(fit_size=(80, 48))
+    assert decoded.size == (160, 96)
+    diff = np.abs(np.asarray(decoded, np.int16) -
+                  np.asarray(image.reduce(4), np.int16))
+    assert diff.mean() < 3
+
+    out = np.zeros((64, 64, 3), np.uint8)
+    expected = np.zeros((64, 64, 3), np.uint8)
+    box = letterbox(image=frame, out=out)
+    letterbox(image=image, out=expected)
+    assert box.thumbnail.size == (64, 38)
+    assert box.scale == (64 / 640, 38 / 384)
+    assert np.abs(out[:38].astype(int) - expected[:38]).mean() < 3
+    assert not out[38:].any()
+
+
+def test_yuv_image_unknown_format():
+    """Expect an error for an unsupported pixel format."""
+    with pytest.raises(ValueError):
+        YuvImage(bytes(6 * 4), size=(4, 4), pixel_format='yuyv')
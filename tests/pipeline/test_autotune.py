@@ -0,0 +1,65 @@
+"""Test TFLite CPU runtime autotuning."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline import autotune
+import json
+import time
+import numpy as np
+
+
+class _TimedInterpreter:
+    """Interpreter stand-in whose invoke time depends on thread count."""
+
+    def __init__(self, num_threads):
+        self.num_threads = num_threads
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': (1, 4, 4, 3), 'dtype': np.uint8}]
+
+    def set_tensor(self, index, tensor_data):
+        assert tensor_data.shape == (1, 4, 4, 3)
+
+    def invoke(self):
+        # 2 threads is the sweet spot on this imaginary host
+        time.sleep(0.001 * abs(self.num_threads - 2) + 0.001)
+
+
+def test_default_thread_candidates():
+    candidates = autotune.default_thread_candidates()
+    assert candidates[0] == 1
+    assert candidates == sorted(set(candidates))
+
+
+def test_cpu_signature_stable():
+    assert autotune.cpu_signature() == autotune.cpu_signature()
+
+
+def test_tune_num_threads_cached(tmp_path):
+    """Expect the fastest thread count to be picked and cached."""
+    cache_path = tmp_path / 'autotune.json'
+    created = []
+
+    def create_interpreter(num_threads):
+        created.append(num_threads)
+        return _TimedInterpreter(num_threads)
+
+    best = autotune.tune_num_threads(create_interpreter=create_interpreter,
+                                     model_hash='abc',
+                                     candidates=[1, 2, 4],
+                                     runs=2,
+                                     cache_path=cache_path)
+    assert best == 2
+    assert created == [1, 2, 4]
+    cache = json.loads(cache_path.read_text())
+    assert len(cache) == 1
+
+    # second run is served from the cache without creating interpreters
+    best = autotune.tune_num_threads(create_interpreter=create_interpreter,
+                                     model_hash='abc',
+                                     candidates=[1, 2, 4],
+                                     cache_path=cache_path)
+    assert best == 2
+    assert created == [1, 2, 4]
@@ -0,0 +1,87 @@
+"""Test reduced scale decoding of encoded camera frames."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.encoded_image import EncodedImage, LazySample
+import io
+from PIL import Image
+
+
+def _jpeg_bytes(size=(1920, 1080), format='JPEG'):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color=(200, 100, 50)).save(buf, format=format)
+    return buf.getvalue()
+
+
+def test_reduced_scale_decode():
+    """Expect the smallest DCT scale that covers twice the fit size."""
+    encoded = EncodedImage(_jpeg_bytes())
+    assert encoded.size == (1920, 1080)
+
+    img = encoded.decode(fit_size=(256, 144))
+    assert img.mode == 'RGB'
+    assert img.size == (960, 540)
+    # full resolution is still not decoded
+    assert encoded._image is None
+
+    img = encoded.decode(fit_size=(100, 56))
+    assert img.size == (240, 135)
+    assert encoded.image.size == (1920, 1080)
+
+
+def test_decode_from_path(tmp_path):
+    """Expect file paths to work, and full decode of non-JPEG images."""
+    image_file = tmp_path / 'frame.png'
+    image_file.write_bytes(_jpeg_bytes(size=(640, 480), format='PNG'))
+    encoded = EncodedImage(image_file)
+    img = encoded.decode(fit_size=(256, 192))
+    assert img.size == (640, 480)
+    assert encoded.image is img
+
+
+def test_lazy_sample():
+    """Expect lazy values to be computed once on first access."""
+    calls = []
+
+    def decode():
+        calls.append(1)
+        return 'full image'
+
+    sample = LazySample({'thumbnail': 'thumb'}, lazy={'image': decode})
+    assert 'image' in sample
+    assert not calls
+    assert sample['image'] == 'full image'
+    assert sample.get('image') == 'full image'
+    assert len(calls) == 1
+    assert sample.get('missing') is None
+
+
+def test_lazy_sample_copy():
+    """Expect lazy values in the keys, copies and unpacked samples."""
+    calls = []
+
+    def decode():
+        calls.append(1)
+        return 'full image'
+
+    sample = LazySample({'thumbnail': 'thumb'}, lazy={'image': decode})
+    assert list(sample) == ['thumbnail', 'image']
+    assert set(sample.keys()) == {'thumbnail', 'image'}
+    assert len(sample) == 2
+    assert not calls
+    copy = sample.copy()
+    assert not calls
+
+    def consume(**kwargs):
+        return kwargs
+
+    expected = {'thumbnail': 'thumb', 'image': 'full image'}
+    assert dict(sample) == expected
+    assert consume(**sample) == expected
+    assert dict(sample.items()) == expected
+    assert list(sample.values()) == ['thumb', 'full image']
+    assert len(sample) == 2
+    assert len(calls) == 1
+    assert dict(copy) == expected
@@ -4,8 +4,17 @@ import sys
 import os
 sys.path.append(os.path.abspath('.'))
 
-from src.pipeline.fall_detect import FallDetector
+from src.pipeline.fall_detect import FallDetector, unrotate_transform
+from src.pipeline.process_pool import PoseProcessPool
+from src.pipeline.pose_engine import Pose, KEYPOINTS, KEYPOINT_INDEX
+from src.pipeline.array_image import ArrayImage, YuvImage
+import asyncio
+import io
+import threading
 import time
+import pytest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
 
@@ -591,4 +600,622 @@ def test_fall_detection_2_frame_back_case_3():
 
     process_response(fall_detector.process_sample(image=img_3))
 
-    assert not result
\ No newline at end of file
+    assert not result
+
+
+def test_detect_poses_batch():
+    """Expect batch pose detection to match single frame detection."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(**config)
+    pose_engine = fall_detector._pose_engine
+
+    images = [_get_image(file_name='fall_img_1.png'),
+              _get_image(file_name='fall_img_2.png'),
+              _get_image(file_name='fall_img_3.png')]
+
+    results = pose_engine.detect_poses_batch(images)
+
+    assert len(results) == len(images)
+    for img, (poses, thumbnail, pose_score) in zip(images, results):
+        single_poses, single_thumbnail, single_score = \
+            pose_engine.detect_poses(img)
+        assert thumbnail.size == single_thumbnail.size
+        assert pose_score == single_score
+        for name, keypoint in poses[0].keypoints.items():
+            single_keypoint = single_poses[0].keypoints[name]
+            assert abs(keypoint.yx[0] - single_keypoint.yx[0]) < 1
+            assert abs(keypoint.yx[1] - single_keypoint.yx[1]) < 1
+
+
+def test_warmup():
+    """Expect warm-up to run and report startup timings."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(**config)
+
+    timings = fall_detector.warmup(image_size=(320, 240))
+
+    for stage in ['import', 'allocate', 'init', 'warmup']:
+        assert timings[stage] >= 0
+    assert fall_detector.startup_timings['warmup'] == timings['warmup']
+
+
+def test_inference_meta_timing():
+    """Expect a wall-clock timing breakdown in the result metadata."""
+    config = _fall_detect_config()
+    result = None
+
+    def process_response(response):
+        nonlocal result
+        for res in response:
+            result = res['inference_meta']
+
+    fall_detector = FallDetector(**config)
+
+    img = _get_image(file_name='fall_img_1.png')
+    process_response(fall_detector.process_sample(image=img))
+
+    timing = result['timing']
+    for stage in ['preprocess', 'tensor_write', 'invoke', 'parse_output',
+                  'heuristics', 'total']:
+        assert timing[stage] >= 0
+    assert timing['attempts'][0]['angle'] == 0
+    assert timing['total'] >= timing['invoke']
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+                    reason='requires multiprocessing.shared_memory')
+def test_process_pool():
+    """Expect pose detection in worker processes to match in-process."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(**config)
+    img = _get_image(file_name='fall_img_1.png')
+    poses, _, pose_score = fall_detector._pose_engine.detect_poses(img)
+
+    with PoseProcessPool(workers=2, **config) as pool:
+        pool_detector = FallDetector(process_pool=pool, **config)
+        assert pool_detector._tfengine is None
+        assert pool_detector.startup_timings['allocate'] > 0
+
+        pool_poses, thumbnail, pool_score = \
+            pool_detector._pose_engine.detect_poses(img)
+        assert abs(pool_score - pose_score) < 1e-3
+        for name, keypoint in pool_poses[0].keypoints.items():
+            assert abs(keypoint.yx[0] - poses[0].keypoints[name].yx[0]) < 1
+            assert abs(keypoint.yx[1] - poses[0].keypoints[name].yx[1]) < 1
+
+        results = pool_detector._pose_engine.detect_poses_batch([img] * 3)
+        assert len(results) == 3
+        for batch_poses, batch_thumbnail, batch_score in results:
+            assert batch_thumbnail.size == thumbnail.size
+            assert batch_score == pool_score
+
+
+def test_process_sample_async():
+    """Expect async samples to match sync results in arrival order."""
+    config = _fall_detect_config()
+    images = [_get_image(file_name='fall_img_1.png'),
+              _get_image(file_name='fall_img_2.png')]
+
+    sync_results = []
+    fall_detector = FallDetector(**config)
+    fall_detector.min_time_between_frames = 0
+    for img in images:
+        for res in fall_detector.process_sample(image=img):
+            sync_results.append(res['inference_result'])
+
+    async def process_all(fall_detector):
+        results = []
+
+        async def process(img):
+            async for res in fall_detector.process_sample_async(image=img):
+                results.append(res['inference_result'])
+
+        # both samples are submitted at once, ordering is up to the detector
+        await asyncio.gather(*[process(img) for img in images])
+        return results
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fall_detector = FallDetector(executor=executor, **config)
+        fall_detector.min_time_between_frames = 0
+        async_results = asyncio.run(process_all(fall_detector))
+
+    assert len(async_results) == len(sync_results)
+    for async_result, sync_result in zip(async_results, sync_results):
+        assert len(async_result) == len(sync_result)
+
+
+def test_process_sample_async_cancel():
+    """Expect a cancelled sample to hold back the next sample
+    until its frame is processed, in any event loop."""
+    fall_detector = FallDetector.__new__(FallDetector)
+    fall_detector._async_lock = fall_detector._async_loop = None
+    fall_detector._async_pending = 0
+    events = []
+    release = threading.Event()
+
+    def process_image(image, queue_depth=0):
+        events.append(('start', image))
+        if image == 1:
+            release.wait(timeout=5)
+        events.append(('end', image))
+        return image
+
+    # the detector runs frames with a stand-in for the pose model
+    fall_detector._process_image = process_image
+
+    async def process(image):
+        return [res async for res in
+                fall_detector.process_sample_async(image=image)]
+
+    async def cancel_first():
+        first = asyncio.ensure_future(process(1))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(process(2))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.05)
+        # the frame of the cancelled sample is still running
+        assert events == [('start', 1)]
+        release.set()
+        assert await second == [2]
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    async def process_all():
+        return await asyncio.gather(process(3), process(4))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fall_detector.executor = executor
+        asyncio.run(cancel_first())
+        assert events == [('start', 1), ('end', 1), ('start', 2), ('end', 2)]
+        # a new event loop gets its own lock
+        assert asyncio.run(process_all()) == [[3], [4]]
+
+
+def test_process_sample_async_queue_depth():
+    """Expect a sample to leave the queue once its frame is processed,
+    while the consumer still has its result."""
+    fall_detector = FallDetector.__new__(FallDetector)
+    fall_detector._async_lock = fall_detector._async_loop = None
+    fall_detector._async_pending = 0
+    fall_detector.executor = None
+    depths = []
+
+    def process_image(image, queue_depth=0):
+        depths.append(queue_depth)
+        return image
+
+    fall_detector._process_image = process_image
+
+    async def consume():
+        async for res in fall_detector.process_sample_async(image=1):
+            assert fall_detector._async_pending == 0
+            # the next sample does not wait behind this one
+            async for _ in fall_detector.process_sample_async(image=2):
+                pass
+
+    asyncio.run(consume())
+    assert depths == [0, 0]
+    assert fall_detector._async_pending == 0
+
+
+class _StubTFEngine:
+    """TFInferenceEngine stand-in with the tensors of a MoveNet model."""
+
+    confidence_threshold = 0.11
+    is_quantized = True
+    input_details = [{'index': 0, 'shape': np.array([1, 192, 192, 3]),
+                      'dtype': np.uint8}]
+    output_details = [{'index': 1, 'shape': np.array([1, 1, 17, 3])}]
+
+    def __init__(self, pool_size=1):
+        self.pool_size = pool_size
+
+
+def test_parallel_orientation_search_capacity():
+    """Expect parallel orientation search only with pooled interpreters
+    and its threads to stop on close."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(pool_size=1),
+                                 model_name='movenet',
+                                 orientation_search='parallel')
+    assert fall_detector.orientation_search == 'sequential'
+
+    fall_detector = FallDetector(tfengine=_StubTFEngine(pool_size=3),
+                                 model_name='movenet',
+                                 orientation_search='parallel')
+    assert fall_detector.orientation_search == 'parallel'
+    threads = set()
+
+    def detect_poses(img, timings=None):
+        threads.add(threading.current_thread())
+        return img
+
+    # the orientation threads run a stand-in for pose detection
+    fall_detector._pose_engine.detect_poses = detect_poses
+    assert fall_detector._detect_orientations([1, 2, 3]) == [1, 2, 3]
+    assert threads
+    fall_detector.close()
+    assert fall_detector._orientation_executor is None
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_encoded_image_sample():
+    """Expect JPEG bytes to be detected like decoded images and
+    the full resolution image to be decoded on demand only."""
+    config = _fall_detect_config()
+    img = _get_image(file_name='fall_img_1.png').convert('RGB')
+    img = img.resize((img.width * 4, img.height * 4))
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=95)
+
+    fall_detector = FallDetector(**config)
+    pose_engine = fall_detector._pose_engine
+    poses, thumbnail, _ = pose_engine.detect_poses(
+        Image.open(io.BytesIO(buf.getvalue())))
+
+    for res in fall_detector.process_sample(image=buf.getvalue()):
+        result = res
+
+    assert 'decode' in result['inference_meta']['timing']
+    assert result['thumbnail'].size == thumbnail.size
+    prev_pose = fall_detector._prev_data[-1][fall_detector.POSE_VAL]
+    for name, yx in prev_pose.items():
+        keypoint = poses[0].keypoints[name]
+        assert abs(yx[0] - keypoint.yx[0]) < 2
+        assert abs(yx[1] - keypoint.yx[1]) < 2
+    assert result['image'].size == img.size
+
+
+def test_unrotate_transform():
+    """Expect rotated pixel positions to map back to the original ones."""
+    img = Image.new('L', (40, 30))
+    img.putpixel((7, 5), 255)
+    for angle in [Image.ROTATE_90, Image.ROTATE_270]:
+        rotated = np.asarray(img.transpose(angle))
+        y, x = np.argwhere(rotated == 255)[0]
+        # pixel centers
+        ox, oy, _ = unrotate_transform(angle, img.size) @ (x + .5, y + .5, 1)
+        assert (ox - .5, oy - .5) == (7, 5)
+
+
+def test_orientation_search_batch():
+    """Expect one batched search over all orientations to find
+    a pose at least as good as the sequential search."""
+    config = _fall_detect_config()
+    img = _get_image(file_name='fall_img_2.png')
+
+    fall_detector = FallDetector(**config)
+    _, _, sequential_score, _ = fall_detector.find_keypoints(img)
+
+    for mode in ['batch', 'parallel']:
+        fall_detector = FallDetector(orientation_search=mode, pool_size=3,
+                                     **config)
+        timings = {}
+        pose, thumbnail, score, pose_dix = fall_detector.find_keypoints(
+            img, timings=timings)
+        assert score >= sequential_score
+        assert len(timings['attempts']) == 1
+        assert timings['attempts'][0]['angles'] == [0, 90, 270]
+        fall_detector.close()
+
+
+def _detect_portrait_poses(img, timings=None):
+    """Pose detection stand-in that finds an upright person
+    in portrait images only."""
+    thumbnail = img.copy()
+    thumbnail.thumbnail((192, 192))
+    width, height = thumbnail.size
+    data = np.zeros((len(KEYPOINTS), 3), np.float32)
+    if height > width:
+        data[:] = (width / 2, height / 2, 0.9)
+        for name, (x, y) in {'left shoulder': (0.6, 0.3),
+                             'right shoulder': (0.4, 0.3),
+                             'left hip': (0.6, 0.6),
+                             'right hip': (0.4, 0.6)}.items():
+            data[KEYPOINT_INDEX[name], :2] = (x * width, y * height)
+    return [Pose(data, 0.9)], thumbnail, 0.9
+
+
+def test_orientation_memory():
+    """Expect the orientation of the previous frame pose to be tried first
+    and the number of inferences to be reported."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet')
+    fall_detector.min_time_between_frames = 0
+    fall_detector._pose_engine.detect_poses = _detect_portrait_poses
+    # a person lying on the side, found in a rotated landscape frame only
+    img = Image.new('RGB', (320, 240))
+
+    metas = []
+    for _ in range(2):
+        for res in fall_detector.process_sample(image=img):
+            metas.append(res['inference_meta'])
+
+    first, second = metas
+    assert first['inferences'] == 2
+    assert first['inferences'] == len(first['timing']['attempts'])
+    assert first['orientation'] == 90
+    assert second['orientation'] == 90
+    assert second['inferences'] == 1
+    assert second['timing']['attempts'][0]['angle'] == 90
+
+
+def _box_pose(mask, x_offset=0):
+    """Pose of an upright person in the bright pixels of a mask."""
+    data = np.zeros((len(KEYPOINTS), 3), np.float32)
+    ys, xs = np.nonzero(mask)
+    if len(xs):
+        x0, y0 = xs.min() + x_offset, ys.min()
+        w, h = xs.max() + 1 + x_offset - x0, ys.max() + 1 - y0
+        data[:] = (x0 + w / 2, y0 + h / 2, 0.9)
+        for name, (x, y) in {'nose': (0.5, 0.0),
+                             'left shoulder': (0.75, 0.25),
+                             'right shoulder': (0.25, 0.25),
+                             'left hip': (0.75, 0.6),
+                             'right hip': (0.25, 0.6),
+                             'left ankle': (0.75, 1.0),
+                             'right ankle': (0.25, 1.0)}.items():
+            data[KEYPOINT_INDEX[name], :2] = (x0 + x * w, y0 + y * h)
+    return Pose(data, 0.9)
+
+
+def _detect_box_poses(img, timings=None):
+    """Pose detection stand-in that finds an upright person
+    in the bright part of an image."""
+    thumbnail = img.copy()
+    thumbnail.thumbnail((192, 192))
+    mask = np.asarray(thumbnail.convert('L')) > 128
+    return [_box_pose(mask)], thumbnail, 0.9
+
+
+def _detect_two_box_poses(img, timings=None):
+    """Pose detection stand-in that finds an upright person
+    in the bright part of each half of an image,
+    the person on the right scoring higher."""
+    thumbnail = img.copy()
+    thumbnail.thumbnail((192, 192))
+    mask = np.asarray(thumbnail.convert('L')) > 128
+    half = mask.shape[1] // 2
+    left = _box_pose(mask[:, :half])
+    right = _box_pose(mask[:, half:], x_offset=half)
+    right.score = 0.95
+    return [right, left], thumbnail, 0.95
+
+
+def test_track_crop():
+    """Expect the second frame to be detected in a crop around the person
+    with keypoints in the same coordinates as a whole frame detection."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet', track_crop=True)
+    fall_detector._pose_engine.detect_poses = _detect_box_poses
+    # a person in a small part of a larger frame
+    frame = Image.new('RGB', (1280, 720))
+    frame.paste((255, 255, 255), (600, 200, 760, 600))
+
+    whole_pose, whole_thumbnail, _, _ = fall_detector.find_keypoints(frame)
+    assert fall_detector._crop_box is None
+    assert fall_detector._track_box is not None
+    whole_kps = whole_pose.data.copy()
+
+    pose, thumbnail, _, pose_dix = fall_detector.find_keypoints(frame)
+    x0, y0, x1, y1 = fall_detector._crop_box
+    assert x1 - x0 < frame.width
+    # keypoints are mapped back to the whole frame thumbnail
+    assert thumbnail.size == whole_thumbnail.size
+    assert np.allclose(pose.data, whole_kps, atol=2)
+    assert set(pose_dix) == {'left shoulder', 'right shoulder',
+                             'left hip', 'right hip'}
+    for name, corr in pose_dix.items():
+        assert np.allclose(corr, whole_kps[KEYPOINT_INDEX[name], :2],
+                           atol=2)
+
+
+def test_yuv_sample_not_copied(monkeypatch):
+    """Expect the full resolution image of a YUV frame to be converted
+    from the frame buffer on demand, without a copy of the buffer."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet')
+    fall_detector._pose_engine.detect_poses = _detect_box_poses
+
+    def copy(self):
+        raise AssertionError('YUV frame buffer copied')
+
+    monkeypatch.setattr(YuvImage, 'copy', copy)
+    width, height = 1280, 720
+    buffer = bytearray(width * height * 3 // 2)
+    frame = YuvImage(buffer, size=(width, height))
+    for res in fall_detector.process_sample(image=frame):
+        result = res
+    assert result['thumbnail'].width <= 192
+    assert 'image' in list(result)
+    # copies and unpacked samples convert the full resolution image too
+    assert dict(result)['image'].size == (width, height)
+    assert result['image'].size == (width, height)
+
+
+def test_array_sample_lazy(monkeypatch):
+    """Expect the image of a numpy frame skipped for detection
+    to be read only when a consumer asks for it."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet', sampling={})
+    fall_detector._pose_engine.detect_poses = _detect_box_poses
+    reads = []
+    to_image = ArrayImage._to_image
+
+    def _to_image(self):
+        reads.append(self)
+        return to_image(self)
+
+    monkeypatch.setattr(ArrayImage, '_to_image', _to_image)
+    frame = np.zeros((480, 640, 3), np.uint8)
+    frame[100:400, 280:360] = 255
+    for res in fall_detector.process_sample(image=frame):
+        pass
+    assert len(reads) == 1
+
+    # the next frame is not due for sampling
+    for res in fall_detector.process_sample(image=frame.copy()):
+        result = res
+    assert result['inference_meta']['inferences'] == 0
+    assert len(reads) == 1
+    assert dict(result)['image'].size == (640, 480)
+    assert len(reads) == 2
+
+
+def test_sampling_meta():
+    """Expect the sampling state in the inference meta and a frame
+    sampled sooner than the present interval to be skipped."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet', sampling={})
+    fall_detector._pose_engine.detect_poses = _detect_box_poses
+    frame = Image.new('RGB', (640, 480))
+    frame.paste((255, 255, 255), (280, 100, 360, 400))
+
+    metas = []
+    for _ in range(2):
+        for res in fall_detector.process_sample(image=frame):
+            metas.append(res['inference_meta'])
+
+    first, second = metas
+    assert first['inferences'] == 1
+    assert first['sampling'] == {'state': 'present', 'interval': 1.0,
+                                 'rate': 1.0}
+    assert second['inferences'] == 0
+    assert second['sampling']['state'] == 'present'
+
+
+def test_compare_poses_time_base():
+    """Expect a pose to be compared only with poses at least
+    min_time_between_frames old."""
+    standing = {'left shoulder': (100, 40), 'left hip': (105, 100),
+                'right shoulder': (80, 40), 'right hip': (85, 100)}
+    lying = {'left shoulder': (40, 100), 'left hip': (100, 105),
+             'right shoulder': (40, 120), 'right hip': (100, 125)}
+    thumbnail = Image.new('RGB', (192, 144))
+    for age, fall in ((0.25, False), (1.5, True)):
+        fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                     model_name='movenet', sampling={})
+        now = time.monotonic()
+        fall_detector._save_pose(standing, 0.9, now - age, thumbnail,
+                                 fall_detector._prev_data)
+        result, _ = fall_detector._compare_poses(
+            lying, 0.9, now, thumbnail, fall_detector._prev_data)
+        assert bool(result) == fall
+
+
+def test_track_crop_lost():
+    """Expect a whole frame detection when the person left the crop."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(track_crop=True, **config)
+    fall_detector.min_time_between_frames = 0
+    fall_detector._track_box = (0.4, 0.4, 0.5, 0.6)
+    frame = Image.new('RGB', (1280, 720))
+
+    for res in fall_detector.process_sample(image=frame):
+        meta = res['inference_meta']
+    assert meta['crop'] is None
+    assert 'crop' in meta['timing']
+    assert fall_detector._track_box is None
+
+
+def test_array_sample():
+    """Expect the same result for a numpy frame as for an image."""
+    config = _fall_detect_config()
+    img = _get_image(file_name='fall_img_1.png').convert('RGB')
+    # frame in a capture buffer with padded rows
+    buffer = np.zeros((img.height, img.width + 16, 3), np.uint8)
+    buffer[:, :img.width] = np.asarray(img)
+
+    results = []
+    for image in [img, buffer[:, :img.width]]:
+        fall_detector = FallDetector(**config)
+        for res in fall_detector.process_sample(image=image):
+            results.append(res)
+
+    expected, result = results
+    assert isinstance(result['image'], Image.Image)
+    assert np.array_equal(np.asarray(result['image']), np.asarray(img))
+    assert result['thumbnail'].size == expected['thumbnail'].size
+    assert result['inference_result'] == expected['inference_result']
+
+
+def test_motion_gate():
+    """Expect an unchanged frame to reuse the last detection
+    without running the pose model."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(motion_gate={}, **config)
+    fall_detector.min_time_between_frames = 0
+    img = _get_image(file_name='fall_img_1.png')
+
+    results = []
+    for _ in range(2):
+        for res in fall_detector.process_sample(image=img):
+            results.append(res)
+
+    first, second = results
+    assert first['inference_meta']['inferences'] >= 1
+    assert first['inference_meta']['motion']['skipped'] is False
+    assert second['inference_meta']['inferences'] == 0
+    assert second['inference_meta']['motion'] == {
+        'score': 0.0,
+        'skipped': True,
+        'skipped_frames': 1,
+        'consecutive_skipped': 1,
+    }
+    assert second['thumbnail'] is first['thumbnail']
+    assert not second['inference_result']
+
+
+def test_tracking():
+    """Expect a fall to be detected on the track of the person."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(tracking={}, **config)
+    fall_detector.min_time_between_frames = 0.01
+
+    results = []
+    for file_name in ['fall_img_1.png', 'fall_img_3.png']:
+        for res in fall_detector.process_sample(
+                image=_get_image(file_name=file_name)):
+            results.append(res)
+        time.sleep(fall_detector.min_time_between_frames)
+
+    first, second = results
+    assert first['inference_meta']['tracking'] == {'people': [1],
+                                                   'tracks': 1}
+    assert second['inference_meta']['tracking']['people'] == [1]
+    result = second['inference_result']
+    assert len(result) == 1
+    assert result[0]['label'] == 'FALL'
+    assert result[0]['person'] == 1
+
+
+def test_tracking_max_poses():
+    """Expect PoseNet models to decode the people a tracker follows."""
+    for options, max_poses in (({}, 1),
+                               ({'tracking': {}}, 5),
+                               ({'tracking': {}, 'max_poses': 2}, 2)):
+        fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                     model_name='mobilenet', **options)
+        assert fall_detector._pose_engine._model.max_poses == max_poses
+
+
+def test_tracking_two_people():
+    """Expect a track for each of two people in view."""
+    fall_detector = FallDetector(tfengine=_StubTFEngine(),
+                                 model_name='movenet', tracking={})
+    fall_detector.min_time_between_frames = 0
+    fall_detector._pose_engine.detect_poses = _detect_two_box_poses
+    frame = Image.new('RGB', (640, 480))
+    frame.paste((255, 255, 255), (100, 100, 180, 400))
+    frame.paste((255, 255, 255), (440, 120, 520, 400))
+
+    metas = []
+    for _ in range(2):
+        for res in fall_detector.process_sample(image=frame):
+            metas.append(res['inference_meta'])
+
+    first, second = metas
+    assert first['tracking'] == {'people': [1, 2], 'tracks': 2}
+    assert second['tracking'] == {'people': [1, 2], 'tracks': 2}
+    assert [len(track.history)
+            for track in fall_detector._tracker.tracks] == [2, 2]
@@ -587,4 +587,63 @@ def test_fall_detection_2_frame_back_case_3():
 
     process_response(fall_detector.process_sample(image=img_3))
 
-    assert not result
\ No newline at end of file
+    assert not result
+
+
+def test_detect_poses_batch():
+    """Expect batch pose detection to match single frame detection."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(**config)
+    pose_engine = fall_detector._pose_engine
+
+    images = [_get_image(file_name='fall_img_1.png'),
+              _get_image(file_name='fall_img_2.png'),
+              _get_image(file_name='fall_img_3.png')]
+
+    results = pose_engine.detect_poses_batch(images)
+
+    assert len(results) == len(images)
+    for img, (poses, thumbnail, pose_score) in zip(images, results):
+        single_poses, single_thumbnail, single_score = \
+            pose_engine.detect_poses(img)
+        assert thumbnail.size == single_thumbnail.size
+        assert pose_score == single_score
+        for name, keypoint in poses[0].keypoints.items():
+            single_keypoint = single_poses[0].keypoints[name]
+            assert abs(keypoint.yx[0] - single_keypoint.yx[0]) < 1
+            assert abs(keypoint.yx[1] - single_keypoint.yx[1]) < 1
+
+
+def test_warmup():
+    """Expect warm-up to run and report startup timings."""
+    config = _fall_detect_config()
+    fall_detector = FallDetector(**config)
+
+    timings = fall_detector.warmup(image_size=(320, 240))
+
+    for stage in ['import', 'allocate', 'init', 'warmup']:
+        assert timings[stage] >= 0
+    assert fall_detector.startup_timings['warmup'] == timings['warmup']
+
+
+def test_inference_meta_timing():
+    """Expect a wall-clock timing breakdown in the result metadata."""
+    config = _fall_detect_config()
+    result = None
+
+    def process_response(response):
+        nonlocal result
+        for res in response:
+            result = res['inference_meta']
+
+    fall_detector = FallDetector(**config)
+
+    img = _get_image(file_name='fall_img_1.png')
+    process_response(fall_detector.process_sample(image=img))
+
+    timing = result['timing']
+    for stage in ['preprocess', 'tensor_write', 'invoke', 'parse_output',
+                  'heuristics', 'total']:
+        assert timing[stage] >= 0
+    assert timing['attempts'][0]['angle'] == 0
+    assert timing['total'] >= timing['invoke']
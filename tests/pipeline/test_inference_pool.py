@@ -0,0 +1,117 @@
+"""Test TFLite interpreter pool."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.inference import InterpreterPool, TFInferenceEngine, \
+    _tflite, tflite_import_time
+import threading
+import time
+import pytest
+
+
+def test_checkout_checkin():
+    """Expect each interpreter to be handed out to one caller at a time."""
+    pool = InterpreterPool(['a', 'b'])
+    first = pool.checkout()
+    second = pool.checkout()
+    assert {first, second} == {'a', 'b'}
+    assert pool.stats()['in_use'] == 2
+    pool.checkin(first)
+    pool.checkin(second)
+    stats = pool.stats()
+    assert stats['in_use'] == 0
+    assert stats['peak_in_use'] == 2
+    assert stats['checkouts'] == 2
+
+
+def test_checkout_timeout():
+    """Expect a bounded wait when all interpreters are busy."""
+    pool = InterpreterPool(['a'], timeout=0.01)
+    with pool.interpreter():
+        with pytest.raises(TimeoutError):
+            pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['waits'] == 1
+
+
+def test_concurrent_use():
+    """Expect no interpreter to be used by two threads at once."""
+    pool = InterpreterPool(['a', 'b', 'c'])
+    active = set()
+    errors = []
+
+    def work():
+        for _ in range(20):
+            with pool.interpreter() as interpreter:
+                if interpreter in active:
+                    errors.append(interpreter)
+                active.add(interpreter)
+                time.sleep(0.001)
+                active.discard(interpreter)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    stats = pool.stats()
+    assert stats['checkouts'] == 120
+    assert stats['in_use'] == 0
+    assert 0 < stats['utilization'] <= 1
+
+
+class _StubInterpreter:
+    """TFLite Interpreter stand-in that records its use."""
+
+    def __init__(self):
+        self.tensors = {}
+        self.invokes = 0
+
+    def set_tensor(self, index, data):
+        self.tensors[index] = data
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+    def invoke(self):
+        self.invokes += 1
+
+
+def test_legacy_api_pins_interpreter():
+    """Expect the single threaded API to run on one interpreter
+    of its own, apart from the pooled interpreters."""
+    engine = TFInferenceEngine.__new__(TFInferenceEngine)
+    pooled = _StubInterpreter()
+    engine._pool = InterpreterPool([pooled], timeout=0.01)
+    engine._legacy_interpreter = None
+    engine._legacy_lock = threading.Lock()
+    created = []
+
+    def create_interpreter():
+        created.append(_StubInterpreter())
+        return created[-1]
+
+    engine._create_interpreter = create_interpreter
+
+    # pooled callers do not hold back the single threaded API
+    with engine.interpreter():
+        engine.set_tensor(0, 'input')
+        engine.infer()
+        assert engine.get_tensor(0) == 'input'
+    assert len(created) == 1
+    assert created[0].invokes == 1
+    assert pooled.invokes == 0
+    assert not pooled.tensors
+
+
+def test_tflite_import_time():
+    """Expect the runtime import to be timed once per process."""
+    _tflite()
+    import_time = tflite_import_time()
+    assert import_time > 0
+    _tflite()
+    assert tflite_import_time() == import_time
@@ -0,0 +1,74 @@
+"""Test process-wide AI model registry."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.model_registry import ModelRegistry, get_model_registry
+
+
+def _model_file(tmp_path, content=b'TFL3 model bytes'):
+    model_file = tmp_path / 'model.tflite'
+    model_file.write_bytes(content)
+    return str(model_file)
+
+
+def test_model_loaded_once(tmp_path):
+    """Expect the same in-memory buffer for every request of a model."""
+    registry = ModelRegistry()
+    model_path = _model_file(tmp_path)
+    first = registry.get_model_content(model_path)
+    # a different spelling of the same path maps to the same model
+    second = registry.get_model_content(
+        os.path.join(os.path.dirname(model_path), '.', 'model.tflite'))
+    assert first is second
+    stats = registry.stats()
+    assert stats['models'] == 1
+    assert stats['loads'] == 1
+    assert stats['hits'] == 1
+    assert stats['bytes'] == len(first)
+
+
+def test_model_keyed_by_delegate(tmp_path):
+    """Expect separate entries for CPU and delegate models
+    sharing one copy of the model content."""
+    registry = ModelRegistry()
+    model_path = _model_file(tmp_path)
+    cpu_model = registry.get(model_path)
+    tpu_model = registry.get(model_path, delegate='edgetpu')
+    assert cpu_model is not tpu_model
+    assert tpu_model.delegate == 'edgetpu'
+    assert cpu_model.sha256 == tpu_model.sha256
+    assert cpu_model.content is tpu_model.content
+    stats = registry.stats()
+    assert stats['models'] == 2
+    assert stats['contents'] == 1
+    assert stats['bytes'] == cpu_model.size
+    registry.evict(model_path, delegate='edgetpu')
+    assert registry.stats()['models'] == 1
+    assert registry.stats()['contents'] == 1
+    registry.clear()
+    assert registry.stats()['models'] == 0
+    assert registry.stats()['bytes'] == 0
+
+
+def test_same_content_shared(tmp_path):
+    """Expect copies of a model file to share one content buffer
+    until the last of them is evicted."""
+    registry = ModelRegistry()
+    model_path = _model_file(tmp_path)
+    copy_path = str(tmp_path / 'copy.tflite')
+    with open(copy_path, 'wb') as copy_file:
+        copy_file.write(b'TFL3 model bytes')
+    assert registry.get_model_content(model_path) is \
+        registry.get_model_content(copy_path)
+    assert registry.stats()['contents'] == 1
+    registry.evict(model_path)
+    assert registry.stats()['contents'] == 1
+    registry.evict(copy_path)
+    assert registry.stats()['contents'] == 0
+
+
+def test_process_wide_registry():
+    """Expect one shared registry per process."""
+    assert get_model_registry() is get_model_registry()
@@ -0,0 +1,80 @@
+"""Test motion gated pose detection."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.motion_gate import MotionGate
+from src.pipeline.encoded_image import EncodedImage
+import io
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def _scene(box=None, noise=0, seed=0):
+    """Gray room with an optional white box, plus sensor noise."""
+    img = Image.new('RGB', (640, 480), (90, 90, 90))
+    if box:
+        ImageDraw.Draw(img).rectangle(box, fill=(250, 250, 250))
+    if noise:
+        rng = np.random.default_rng(seed)
+        pixels = np.asarray(img, np.int16) + \
+            rng.integers(-noise, noise + 1, (480, 640, 3))
+        img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return img
+
+
+def test_skip_static_frames():
+    """Expect noisy frames of a static scene to be skipped
+    and a moving object to be detected."""
+    gate = MotionGate()
+    box = (100, 100, 160, 300)
+    assert gate.check(_scene(box), now=0.0)
+    assert gate.score is None
+    for i in range(1, 4):
+        assert not gate.check(_scene(box, noise=8, seed=i), now=i * 0.5)
+    assert gate.skipped == 3
+    assert gate.consecutive_skipped == 3
+
+    assert gate.check(_scene((300, 100, 360, 300)), now=2.0)
+    assert gate.score > gate.threshold
+    assert gate.consecutive_skipped == 0
+    assert gate.skipped == 3
+
+
+def test_compare_with_last_detected_frame():
+    """Expect slow changes to add up until they count as motion."""
+    gate = MotionGate(threshold=0.02)
+    gate.check(_scene((100, 100, 120, 300)), now=0.0)
+    changed = [gate.check(_scene((100, 100, 120 + 5 * i, 300)), now=i)
+               for i in range(1, 8)]
+    # each frame only differs from the previous one by a few pixels
+    assert changed[0] is False
+    assert True in changed
+
+
+def test_max_skip_interval():
+    """Expect detection to run at least every max_skip_interval."""
+    gate = MotionGate(max_skip_interval=2.0)
+    assert gate.check(_scene(), now=0.0)
+    assert not gate.check(_scene(), now=1.0)
+    assert gate.check(_scene(), now=2.0)
+    assert not gate.check(_scene(), now=3.0)
+    gate.reset()
+    assert gate.check(_scene(), now=3.5)
+
+
+def test_encoded_frames():
+    """Expect encoded frames to be compared at reduced scale."""
+    def jpeg(img):
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG')
+        return EncodedImage(buffer.getvalue())
+
+    gate = MotionGate()
+    assert gate.check(jpeg(_scene()), now=0.0)
+    frame = jpeg(_scene())
+    assert not gate.check(frame, now=0.1)
+    # the full resolution image is not decoded for the test
+    assert frame._image is None
+    assert gate.check(jpeg(_scene((0, 0, 320, 480))), now=0.2)
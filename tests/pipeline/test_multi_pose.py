@@ -0,0 +1,134 @@
+"""Test multi-person pose decoding."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.movenet_model import Movenet
+from src.pipeline.pose_engine import PoseEngine, KEYPOINTS
+import numpy as np
+from PIL import Image
+
+
+class _StubEngine:
+    """TFInferenceEngine stand-in with the tensor details of a model."""
+
+    confidence_threshold = 0.3
+
+    def __init__(self, input_shape, output_shape):
+        self.input_details = [{'index': 0, 'shape': np.array(input_shape),
+                               'dtype': np.uint8}]
+        self.output_details = [{'index': 1,
+                                'shape': np.array(output_shape)}]
+        self.tensors = {}
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+
+def _multipose_output(people):
+    """MoveNet MultiPose output of (y, x) nose positions and scores."""
+    detections = np.zeros((1, 6, 56), np.float32)
+    for i, ((y, x), score) in enumerate(people):
+        kps = np.tile([y, x, 0.8], (17, 1))
+        kps[:, 0] += np.linspace(0, 0.3, 17)
+        detections[0, i, :51] = kps.reshape(-1)
+        detections[0, i, 55] = score
+    return detections
+
+
+def test_movenet_multipose():
+    """Expect one row of keypoints per detected person,
+    best scoring first, in input tensor coordinates."""
+    engine = _StubEngine((1, 256, 320, 3), (1, 6, 56))
+    model = Movenet(engine)
+    engine.tensors[1] = _multipose_output(
+        [((0.1, 0.25), 0.5), ((0.2, 0.75), 0.9), ((0.3, 0.5), 0.1)])
+    (kps, scores), = model.decode_output(engine)
+    assert kps.shape == (2, 17, 3)
+    assert np.allclose(scores, [0.9, 0.5])
+    assert np.allclose(kps[0, 0], [0.2 * 256, 0.75 * 320, 0.8])
+    assert np.allclose(kps[1, 0], [0.1 * 256, 0.25 * 320, 0.8])
+
+    engine.tensors[1] = _multipose_output([])
+    (kps, scores), = model.decode_output(engine)
+    assert kps.shape == (0, 17, 3)
+
+
+def test_movenet_single_pose():
+    """Expect single pose models to detect one person."""
+    engine = _StubEngine((1, 192, 192, 3), (1, 1, 17, 3))
+    model = Movenet(engine)
+    output = np.zeros((1, 1, 17, 3), np.float32)
+    output[..., 2] = 0.5
+    engine.tensors[1] = output
+    (kps, scores), = model.decode_output(engine)
+    assert kps.shape == (1, 17, 3)
+    assert np.allclose(scores, [0.5])
+
+
+class _StubModel:
+    """Pose model stand-in returning fixed keypoints."""
+
+    confidence_threshold = 0.3
+    _tensor_image_width = _tensor_image_height = 256
+
+    def __init__(self, kps, scores):
+        self.kps = np.asarray(kps, np.float32)
+        self.scores = np.asarray(scores, np.float32)
+
+    def execute_model(self, img, timings=None):
+        return self.kps, self.scores, img, img, 0.0
+
+
+def test_detect_poses():
+    """Expect a Pose per person and an empty pose without people."""
+    kps = np.zeros((2, 17, 3), np.float32)
+    kps[0] = [100, 50, 0.9]
+    kps[1] = [120, 200, 0.2]
+    kps[1, 0, 2] = 0.8
+    engine = PoseEngine(model=_StubModel(kps, [0.9, 0.4]))
+    img = Image.new('RGB', (256, 256))
+
+    poses, _, pose_score = engine.detect_poses(img)
+    assert len(poses) == 2
+    assert [pose.score for pose in poses] == [np.float32(0.9),
+                                              np.float32(0.4)]
+    assert pose_score == 1.0
+    assert poses[0].keypoints['nose'].yx.tolist() == [50, 100]
+    assert poses[1].keypoints['nose'].score == np.float32(0.8)
+    # keypoints under the confidence threshold do not count
+    assert poses[1].keypoints['left eye'].score == 0
+
+    found, scores, _ = engine.detect_keypoints(img)
+    assert np.array_equal(found, kps)
+
+    engine = PoseEngine(model=_StubModel(np.zeros((0, 17, 3)), []))
+    poses, _, pose_score = engine.detect_poses(img)
+    assert len(poses) == 1
+    assert pose_score == 0
+    assert len(poses[0].keypoints) == len(KEYPOINTS)
+    assert all(keypoint.score == 0
+               for keypoint in poses[0].keypoints.values())
+
+
+class _StubThumbnailModel(_StubModel):
+    """Pose model stand-in that returns no input tensor sized image."""
+
+    def execute_model(self, img, timings=None):
+        return self.kps, self.scores, None, img, 0.0
+
+
+def test_template_image_on_demand():
+    """Expect the model input image to be padded from the thumbnail
+    when a consumer draws on it."""
+    kps = np.zeros((1, 17, 3), np.float32)
+    kps[0] = [100, 50, 0.9]
+    engine = PoseEngine(model=_StubThumbnailModel(kps, [0.9]))
+    thumbnail = Image.new('RGB', (256, 144), 'white')
+
+    poses, _, pose_score = engine.detect_poses(thumbnail)
+    assert pose_score == 1.0
+    _, output_img, _, _ = engine.get_result(thumbnail)
+    assert output_img.size == (256, 256)
+    assert output_img.getpixel((200, 200)) == (0, 0, 0)
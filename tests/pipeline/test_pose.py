@@ -0,0 +1,60 @@
+"""Test the array backed pose representation."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.pose_engine import Keypoint, Pose, KEYPOINTS, \
+    KEYPOINT_INDEX
+import numpy as np
+
+
+def _pose():
+    data = np.zeros((len(KEYPOINTS), 3), np.float32)
+    data[:, 0] = np.arange(len(KEYPOINTS))
+    data[:, 1] = 10
+    data[:, 2] = 0.5
+    return Pose(data, 0.9)
+
+
+def test_named_views():
+    """Expect named keypoints to read and write the pose array."""
+    pose = _pose()
+    index = KEYPOINT_INDEX['left hip']
+    keypoint = pose.keypoints['left hip']
+    assert keypoint.k == 'left hip'
+    assert keypoint.yx.tolist() == [index, 10]
+    assert keypoint.score == 0.5
+    assert list(pose.keypoints) == list(KEYPOINTS)
+
+    keypoint.yx[0] = 100
+    keypoint.score = 0.25
+    assert pose.data[index].tolist() == [100, 10, 0.25]
+    pose.keypoints['nose'].yx = [1, 2]
+    assert pose.data[KEYPOINT_INDEX['nose'], :2].tolist() == [1, 2]
+
+
+def test_from_keypoint_dict():
+    """Expect a dict of Keypoint objects to be packed into an array."""
+    keypoints = {k: Keypoint(k, [i, 2 * i], 0.1 * i)
+                 for i, k in enumerate(KEYPOINTS)}
+    pose = Pose(keypoints, 1.0)
+    assert pose.data.dtype == np.float32
+    assert pose.data.shape == (len(KEYPOINTS), 3)
+    assert pose.keypoints['right ankle'].yx.tolist() == [16, 32]
+
+
+def test_transform():
+    """Expect a transform to map all keypoints and their views."""
+    pose = _pose()
+    yx = pose.keypoints['left shoulder'].yx
+    # rotation by 90 degrees clockwise in a 100 pixel high image
+    pose.transform(np.array([[0., -1., 100.],
+                             [1., 0., 0.],
+                             [0., 0., 1.]]))
+    index = KEYPOINT_INDEX['left shoulder']
+    assert yx.tolist() == [90, index]
+    assert np.allclose(pose.data[:, 0], 90)
+    assert np.allclose(pose.data[:, 1], np.arange(len(KEYPOINTS)))
+    # scores are not transformed
+    assert np.allclose(pose.data[:, 2], 0.5)
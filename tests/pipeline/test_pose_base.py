@@ -0,0 +1,59 @@
+"""Test pose model input preprocessing."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.pose_base import fit_size, letterbox, pad_to_size
+import numpy as np
+from PIL import Image, ImageOps
+
+
+def _random_image(size):
+    rng = np.random.default_rng(0)
+    w, h = size
+    return Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8))
+
+
+def test_fit_size_matches_thumbnail():
+    """Expect the same size as PIL.Image.thumbnail."""
+    for size in [(640, 480), (1920, 1080), (480, 640), (1000, 10),
+                 (100, 80), (257, 257)]:
+        thumb = Image.new('RGB', size)
+        thumb.thumbnail((257, 257))
+        assert fit_size(size, (257, 257)) == thumb.size
+
+
+def test_letterbox_matches_thumbnail_and_padding():
+    """Expect the same pixels as a thumbnail padded to tensor size."""
+    img = _random_image((1280, 720))
+    out = np.full((256, 256, 3), 255, np.uint8)
+
+    box = letterbox(image=img, out=out)
+
+    thumb = img.copy()
+    thumb.thumbnail((256, 256))
+    expected = ImageOps.expand(thumb, (0, 0, 256 - thumb.width,
+                                       256 - thumb.height))
+    assert box.thumbnail.size == thumb.size
+    assert np.array_equal(out, np.asarray(expected))
+    assert box.offset == (0, 0)
+    assert box.scale == (256 / 1280, 144 / 720)
+
+
+def test_letterbox_reused_buffer():
+    """Expect stale pixels of a previous frame to be cleared."""
+    out = np.zeros((192, 192, 3), np.uint8)
+    letterbox(image=_random_image((192, 192)), out=out)
+    box = letterbox(image=_random_image((640, 240)), out=out,
+                    resample=Image.NEAREST)
+    assert box.thumbnail.size == (192, 72)
+    assert not out[72:].any()
+
+
+def test_pad_to_size():
+    """Expect the model input pixels of a letterbox."""
+    out = np.zeros((256, 256, 3), np.uint8)
+    box = letterbox(image=_random_image((1280, 720)), out=out)
+    template_image = pad_to_size(box.thumbnail, (256, 256))
+    assert np.array_equal(np.asarray(template_image), out)
@@ -0,0 +1,97 @@
+"""Test following people across frames."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.pose_tracker import PoseTracker, match_cost, \
+    keypoint_boxes
+import numpy as np
+
+
+def _standing(x, y=50, height=200):
+    """(x, y, score) keypoints of an upright person."""
+    kps = np.zeros((17, 3), np.float32)
+    kps[:, 0] = x + np.linspace(-20, 20, 17)
+    kps[:, 1] = y + np.linspace(0, height, 17)
+    kps[:, 2] = 0.9
+    return kps
+
+
+def _lying(x, y=250, length=200):
+    """(x, y, score) keypoints of a person lying on the floor."""
+    kps = np.zeros((17, 3), np.float32)
+    kps[:, 0] = x + np.linspace(-length, 0, 17)
+    kps[:, 1] = y + np.linspace(-20, 20, 17)
+    kps[:, 2] = 0.9
+    return kps
+
+
+def test_keypoint_boxes():
+    """Expect boxes around the found keypoints only."""
+    kps = _standing(100)[np.newaxis].repeat(2, axis=0)
+    kps[0, 0] = [0, 0, 0]
+    kps[1, :, 2] = 0
+    boxes = keypoint_boxes(kps)
+    assert np.allclose(boxes[0], [80 + 40 / 16, 50 + 200 / 16, 120, 250])
+    assert not boxes[1].any()
+
+
+def test_match_cost():
+    """Expect the same person to cost less than someone else."""
+    cost = match_cost(np.stack([_standing(100), _standing(400)]),
+                      np.stack([_standing(410), _standing(105)]))
+    assert cost.shape == (2, 2)
+    assert cost[0, 1] < 0.25 and cost[1, 0] < 0.25
+    assert cost[0, 0] == 1 and cost[1, 1] == 1
+
+
+def test_stable_ids():
+    """Expect people to keep their track IDs in any detection order."""
+    tracker = PoseTracker()
+    first = tracker.update(np.stack([_standing(100), _standing(400)]), 0.0)
+    assert [track.id for track in first] == [1, 2]
+    second = tracker.update(np.stack([_standing(390), _standing(110)]), 1.0)
+    assert [track.id for track in second] == [2, 1]
+    assert second[1] is first[0]
+    assert len(tracker.tracks) == 2
+
+
+def test_fall_keeps_track():
+    """Expect a person who fell to stay on their track
+    rather than take over another person's."""
+    tracker = PoseTracker()
+    resident, caregiver = tracker.update(
+        np.stack([_standing(100), _standing(450)]), 0.0)
+    tracked = tracker.update(
+        np.stack([_standing(450), _lying(220)]), 1.0)
+    assert tracked == [caregiver, resident]
+
+
+def test_new_people_and_limits():
+    """Expect new tracks for new people up to max_people
+    and tracks to be dropped after max_age."""
+    tracker = PoseTracker(max_people=2, max_age=5.0)
+    tracker.update(_standing(100)[np.newaxis], 0.0)
+    tracked = tracker.update(
+        np.stack([_standing(100), _standing(300), _standing(500)]), 1.0)
+    # people past max_people are not tracked
+    assert [track.id for track in tracked] == [1, 2]
+    tracker.update(_standing(300)[np.newaxis], 2.0)
+    # an unmatched person replaces the track seen longest ago
+    tracked = tracker.update(_standing(500)[np.newaxis], 3.0)
+    assert tracked[0].id == 3
+    assert sorted(track.id for track in tracker.tracks) == [2, 3]
+    tracker.update(np.zeros((0, 17, 3)), 10.0)
+    assert not tracker.tracks
+    tracker.reset()
+    assert tracker.update(_standing(100)[np.newaxis], 11.0)[0].id == 1
+
+
+def test_history():
+    """Expect a fixed size history per track."""
+    tracker = PoseTracker(history_size=2)
+    for now in range(4):
+        track, = tracker.update(_standing(100)[np.newaxis], float(now))
+        track.history.append(now)
+    assert list(track.history) == [2, 3]
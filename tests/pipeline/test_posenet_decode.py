@@ -0,0 +1,219 @@
+"""Test PoseNet heatmap decoding."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.posenet_model import decode_heatmaps, output_stride, \
+    decode_multiple_poses, POSE_CHAIN
+import numpy as np
+
+
+def _outputs(shape, seed=0):
+    """Random heatmap logits and offsets of shape (..., h, w, joints)."""
+    rng = np.random.default_rng(seed)
+    heatmaps = rng.normal(0, 4, shape).astype(np.float32)
+    offsets = rng.normal(0, 8, shape[:-1] + (2 * shape[-1],)) \
+        .astype(np.float32)
+    return heatmaps, offsets
+
+
+def _decode_joint_by_joint(heatmaps, offsets, stride):
+    joints = heatmaps.shape[-1]
+    kps = np.zeros((joints, 3), np.float32)
+    for i in range(joints):
+        y, x = np.unravel_index(np.argmax(heatmaps[..., i]),
+                                heatmaps.shape[:2])
+        kps[i] = [y * stride[0] + offsets[y, x, i],
+                  x * stride[1] + offsets[y, x, i + joints],
+                  1 / (1 + np.exp(-heatmaps[y, x, i]))]
+    return kps
+
+
+def test_output_stride():
+    """Expect the strides of the PoseNet input sizes."""
+    assert output_stride(257, 9) == 32
+    assert output_stride(513, 33) == 16
+    assert output_stride(481, 61) == 8
+
+
+def test_decode_heatmaps():
+    """Expect the same keypoints as a joint by joint decoder."""
+    for shape, stride in [((9, 9, 17), (32, 32)),
+                          ((17, 23, 17), (16, 16)),
+                          ((33, 45, 17), (8, 8))]:
+        heatmaps, offsets = _outputs(shape)
+        kps = decode_heatmaps(heatmaps, offsets, stride)
+        assert kps.shape == (17, 3)
+        assert kps.dtype == np.float32
+        expected = _decode_joint_by_joint(heatmaps, offsets, stride)
+        assert np.allclose(kps, expected, atol=1e-4)
+
+
+def test_decode_heatmaps_batch():
+    """Expect a batch to decode like its frames one at a time."""
+    heatmaps, offsets = _outputs((3, 9, 9, 17))
+    kps = decode_heatmaps(heatmaps, offsets, (32, 32))
+    assert kps.shape == (3, 17, 3)
+    for i in range(3):
+        assert np.array_equal(
+            kps[i], decode_heatmaps(heatmaps[i], offsets[i], (32, 32)))
+
+
+def test_decode_heatmaps_ties():
+    """Expect the first of equal maxima and saturated scores
+    without overflow."""
+    heatmaps = np.zeros((9, 9, 17), np.float32)
+    heatmaps[2, 3] = heatmaps[6, 7] = 200
+    heatmaps[..., 0] = -200
+    offsets = np.zeros((9, 9, 34), np.float32)
+    with np.errstate(over='raise'):
+        kps = decode_heatmaps(heatmaps, offsets, (32, 32))
+    assert np.array_equal(kps[1:, :2], [[64, 96]] * 16)
+    assert np.all(kps[1:, 2] == 1)
+    assert kps[0, 2] == 0
+
+
+def _multi_pose_outputs(people, stride=32, grid=(9, 9)):
+    """Multi-pose model outputs of people given as (17, 2) arrays of
+    (y, x) keypoints in input pixels, with the offsets and displacements
+    of the heatmap cells the keypoints are in."""
+    joints, edges = 17, len(POSE_CHAIN)
+    heatmaps = np.full(grid + (joints,), -8, np.float32)
+    offsets = np.zeros(grid + (2, joints), np.float32)
+    fwd = np.zeros(grid + (2, edges), np.float32)
+    bwd = np.zeros(grid + (2, edges), np.float32)
+    for person, logit in people:
+        cells = np.round(person / stride).astype(int)
+        for joint, (y, x) in enumerate(cells):
+            heatmaps[y, x, joint] = logit
+            offsets[y, x, :, joint] = person[joint] - cells[joint] * stride
+        for edge, (parent, child) in enumerate(POSE_CHAIN):
+            y, x = cells[parent]
+            fwd[y, x, :, edge] = person[child] - person[parent]
+            y, x = cells[child]
+            bwd[y, x, :, edge] = person[parent] - person[child]
+    return (heatmaps, offsets.reshape(grid + (-1,)),
+            fwd.reshape(grid + (-1,)), bwd.reshape(grid + (-1,)))
+
+
+def _skeleton(y, x):
+    """Keypoints of a small upright person with the nose at y, x."""
+    rows = [0, -1, -1, 0, 0, 1, 1, 2, 2, 3, 3, 3, 3, 4, 4, 5, 5]
+    cols = [0, -0.5, 0.5, -0.5, 0.5, -1, 1, -1, 1, -1, 1,
+            -0.5, 0.5, -0.5, 0.5, -0.5, 0.5]
+    return np.stack([y + np.array(rows) * 32.0,
+                     x + np.array(cols) * 64.0], axis=-1)
+
+
+def test_decode_multiple_poses():
+    """Expect each person of a multi-pose output, best scoring first."""
+    people = [(_skeleton(40, 70), 2.0), (_skeleton(45, 200), 4.0)]
+    outputs = _multi_pose_outputs(people)
+    kps, scores = decode_multiple_poses(*outputs, stride=(32, 32))
+    assert kps.shape == (2, 17, 3)
+    assert scores[0] > scores[1] > 0
+    assert np.allclose(kps[0, :, :2], people[1][0], atol=1e-3)
+    assert np.allclose(kps[1, :, :2], people[0][0], atol=1e-3)
+    assert np.allclose(kps[0, :, 2], 1 / (1 + np.exp(-4.0)))
+
+    kps, scores = decode_multiple_poses(*outputs, stride=(32, 32),
+                                        max_poses=1)
+    assert np.allclose(kps[0, :, :2], people[1][0], atol=1e-3)
+
+    # nobody scores over the threshold
+    kps, scores = decode_multiple_poses(*_multi_pose_outputs([]),
+                                        stride=(32, 32))
+    assert kps.shape == (0, 17, 3)
+    assert scores.shape == (0,)
+
+
+class _StubOutputEngine:
+    """Engine with multi-pose output tensors of a 257x257 model."""
+
+    confidence_threshold = 0.5
+    input_details = [{'shape': np.array([1, 257, 257, 3])}]
+
+    def __init__(self, outputs):
+        self.output_details = [{'index': i, 'shape': np.array(output.shape)}
+                               for i, output in enumerate(outputs)]
+        self.tensors = [output[np.newaxis] for output in outputs]
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+
+def test_decode_output_max_poses():
+    """Expect the heatmap maxima of one person by default
+    and each person with more poses."""
+    from src.pipeline.pose_engine import create_pose_model
+    people = [(_skeleton(40, 70), 2.0), (_skeleton(45, 200), 4.0)]
+    outputs = _multi_pose_outputs(people)
+    engine = _StubOutputEngine(outputs)
+    model = create_pose_model(engine, 'mobilenet')
+
+    (kps, scores), = model.decode_output(engine)
+    expected = decode_heatmaps(outputs[0], outputs[1], (32, 32))
+    assert kps.shape == (1, 17, 3)
+    assert np.array_equal(kps[0], expected)
+    assert np.allclose(scores, expected[:, 2].mean())
+
+    model = create_pose_model(engine, 'mobilenet', max_poses=10)
+    (kps, scores), = model.decode_output(engine)
+    assert kps.shape == (2, 17, 3)
+    assert np.allclose(kps[0, :, :2], people[1][0], atol=1e-3)
+
+
+class _StubEngine:
+    """Engine with the tensor details of a model and settable outputs."""
+
+    confidence_threshold = 0.5
+
+    def __init__(self, model):
+        import tflite_runtime.interpreter as tflite
+        # the custom ops are only needed to allocate tensors
+        interpreter = tflite.Interpreter(model_path=model)
+        self.input_details = interpreter.get_input_details()
+        self.output_details = interpreter.get_output_details()
+        self.tensors = {}
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+
+def test_decoder_outputs():
+    """Expect the best scoring pose of the decoder output tensors."""
+    from src.pipeline.posenet_model import Posenet_MobileNet_Decoder, \
+        has_decoder_outputs
+    _dir = os.path.dirname(os.path.abspath(__file__))
+    engine = _StubEngine(os.path.join(
+        _dir, 'posenet_mobilenet_v1_075_721_1281_quant_decoder_edgetpu.tflite'))
+    assert has_decoder_outputs(engine.output_details)
+    model = Posenet_MobileNet_Decoder(engine)
+
+    rng = np.random.default_rng(0)
+    poses = rng.uniform(0, 721, (1, 10, 17, 2)).astype(np.float32)
+    keypoint_scores = rng.uniform(0, 1, (1, 10, 17)).astype(np.float32)
+    pose_scores = np.array([[0.3, 0.6, 0.9] + [0.0] * 7], np.float32)
+    for details, tensor in zip(engine.output_details,
+                               [poses, keypoint_scores, pose_scores,
+                                np.array(2, np.float32)]):
+        engine.tensors[details['index']] = tensor
+
+    (kps, scores), = model.decode_output(engine)
+    # the third pose scores higher but is past the number of poses
+    assert kps.shape == (2, 17, 3)
+    assert np.allclose(scores, [0.6, 0.3])
+    assert np.array_equal(kps[0, :, :2], poses[0, 1])
+    assert np.array_equal(kps[0, :, 2], keypoint_scores[0, 1])
+    assert np.array_equal(kps[1, :, :2], poses[0, 0])
+
+    model.max_poses = 1
+    (kps, scores), = model.decode_output(engine)
+    assert np.allclose(scores, [0.6])
+
+    engine.tensors[engine.output_details[3]['index']] = \
+        np.array(0, np.float32)
+    (kps, scores), = model.decode_output(engine)
+    assert kps.shape == (0, 17, 3)
+    assert scores.shape == (0,)
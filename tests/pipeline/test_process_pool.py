@@ -0,0 +1,87 @@
+"""Test pose worker process failure handling."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.process_pool import PoseProcessPool, _Worker
+import multiprocessing
+import queue
+import threading
+import time
+import pytest
+
+
+def _crash(conn):
+    """Worker that exits without a reply, like after a native crash."""
+    os._exit(1)
+
+
+def _stall(conn):
+    """Worker that never replies."""
+    time.sleep(60)
+
+
+def _worker(target):
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=target, args=(child_conn,),
+                              daemon=True)
+    process.start()
+    child_conn.close()
+    return _Worker(process, parent_conn)
+
+
+def _pool(worker, replacement, timeout=None):
+    """Pool with one busy worker and a stub replacement worker."""
+    pool = PoseProcessPool.__new__(PoseProcessPool)
+    pool._timeout = timeout
+    pool._lock = threading.Lock()
+    pool._workers = [worker]
+    pool._idle = queue.Queue()
+
+    def spawn(core=None):
+        if replacement is None:
+            raise RuntimeError('model failed to load')
+        return replacement
+
+    pool._spawn = spawn
+    pool._attach = lambda worker: None
+    return pool
+
+
+def test_crashed_worker_replaced():
+    """Expect an error and a new worker instead of the crashed one."""
+    worker = _worker(_crash)
+    replacement = _worker(_stall)
+    pool = _pool(worker, replacement)
+    with pytest.raises(RuntimeError):
+        pool._collect(worker)
+    assert pool._workers == [replacement]
+    assert pool._idle.get_nowait() is replacement
+    assert pool._idle.empty()
+    pool._stop(replacement)
+
+
+def test_stalled_worker_replaced():
+    """Expect a bounded wait for the result of a stalled worker."""
+    worker = _worker(_stall)
+    replacement = _worker(_stall)
+    pool = _pool(worker, replacement, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        pool._collect(worker)
+    assert not worker.process.is_alive()
+    assert pool._idle.get_nowait() is replacement
+    pool._stop(replacement)
+
+
+def test_failed_restart():
+    """Expect the pool to shrink if a worker cannot be restarted."""
+    worker = _worker(_crash)
+    pool = _pool(worker, None)
+    with pytest.raises(RuntimeError):
+        pool._collect(worker)
+    assert pool.workers == 0
+    assert pool._idle.empty()
+    with pytest.raises(RuntimeError):
+        pool._submit(None)
@@ -0,0 +1,75 @@
+"""Test person presence adaptive frame sampling."""
+
+import sys
+import os
+sys.path.append(os.path.abspath('.'))
+
+from src.pipeline.sampling_schedule import SamplingSchedule, \
+    IDLE, PRESENT, ALERT
+import pytest
+
+
+def test_idle_until_person_detected():
+    """Expect slow sampling until a person is detected."""
+    schedule = SamplingSchedule()
+    assert schedule.state == IDLE
+    assert schedule.due(now=0.0)
+    schedule.update(now=0.0)
+    assert schedule.state == IDLE
+    assert not schedule.due(now=4.9)
+    assert schedule.due(now=5.0)
+
+    schedule.update(now=5.0, pose=True)
+    assert schedule.state == PRESENT
+    assert schedule.interval == 1.0
+    assert schedule.rate == 1.0
+    assert not schedule.due(now=5.9)
+    assert schedule.due(now=6.0)
+
+
+def test_idle_after_person_gone():
+    """Expect missed detections not to slow sampling down right away."""
+    schedule = SamplingSchedule(idle_after=3.0)
+    schedule.update(now=0.0, pose=True)
+    for now in (1.0, 2.0):
+        schedule.update(now=now, pose=False)
+        assert schedule.state == PRESENT
+    schedule.update(now=3.0, pose=False)
+    assert schedule.state == IDLE
+
+
+def test_alert_after_downward_motion():
+    """Expect fast sampling for alert_duration after a downward motion."""
+    schedule = SamplingSchedule(alert_duration=1.0)
+    schedule.update(now=0.0, pose=True)
+    schedule.update(now=1.0, pose=True, downward=True)
+    assert schedule.state == ALERT
+    assert schedule.rate == 4.0
+    assert schedule.due(now=1.25)
+    schedule.update(now=1.5, pose=True)
+    assert schedule.state == ALERT
+    schedule.update(now=2.0, pose=True)
+    assert schedule.state == PRESENT
+    # the person may not be detected after a fall
+    schedule.update(now=3.0, pose=True, downward=True)
+    schedule.update(now=3.25, pose=False)
+    assert schedule.state == ALERT
+
+
+def test_reset():
+    """Expect a reset schedule to sample the next frame."""
+    schedule = SamplingSchedule()
+    schedule.update(now=0.0, pose=True, downward=True)
+    schedule.reset()
+    assert schedule.state == IDLE
+    assert schedule.due(now=0.1)
+
+
+def test_invalid_config():
+    """Expect an error for intervals out of order or negative values."""
+    with pytest.raises(ValueError):
+        SamplingSchedule(present_interval=10.0)
+    with pytest.raises(ValueError):
+        SamplingSchedule(alert_interval=-1.0)
+    with pytest.raises(ValueError):
+        SamplingSchedule(idle_after=-1.0)